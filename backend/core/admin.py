@@ -80,6 +80,7 @@ admin.site.register(Notification)
 admin.site.register(OrderHistory)
 admin.site.register(CancelledOrder)
 admin.site.register(ActivityLog)
+admin.site.register(ActivityDailyCount)
 admin.site.register(Municipality)
 admin.site.register(Barangay)
 admin.site.register(Address)
@@ -87,3 +88,8 @@ admin.site.register(WalkInOrder)
 admin.site.register(Route, RouteAdmin)
 admin.site.register(Vehicle)
 admin.site.register(Deployment, DeploymentAdmin)
+admin.site.register(DailySales)
+admin.site.register(CustomerSales)
+admin.site.register(DeploymentStockMovement)
+admin.site.register(DeliveryStatusChange)
+admin.site.register(IdempotencyRecord)
@@ -235,5 +235,5 @@ class ChangePasswordView(APIView):
             )
         
         request.user.set_password(new)
-        request.user.save()
+        request.user.save(update_fields=['password'])
         return Response({'status': 'Password changed successfully'})
\ No newline at end of file
@@ -0,0 +1,134 @@
+"""
+JWT authentication that trusts the token's claims instead of loading the user.
+
+Access tokens issued by MyTokenObtainPairSerializer carry the user's role and profile
+id. ClaimsJWTAuthentication turns those into a User and a Profile that behave like ones
+loaded with .only(): the Profile has its id and role, the User the PRINCIPAL_COLUMNS
+(flags, username, names, email) and every other field is deferred and read from the
+database on first access. request.user.profile.role, IsRole, str(request.user) and
+filters such as .filter(customer=request.user.profile) therefore cost no queries. Tokens
+issued before the claims existed fall back to the normal lookup.
+
+The flags never come from the token: the PRINCIPAL_COLUMNS row is read at most once per
+JWT_REVOCATION_CACHE_SECONDS per process (saving the User or Profile drops it right away
+in this process), inactive users are rejected, and with JWT_CLAIMS_REVOCATION_CHECK (on
+by default) so is a token whose role or profile no longer match.
+
+The principal is not a full User: save() needs update_fields naming what
+changed (a plain save() would write the cached columns back), and views that edit the
+account through serializers load it with load_user()/load_profile() first.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from core.models import User, Profile
+
+ROLE_CLAIM = 'role'
+PROFILE_CLAIM = 'profile_id'
+# User columns read with the revocation check and loaded on request.user
+PRINCIPAL_COLUMNS = ('is_active', 'is_superuser', 'is_staff', 'username', 'first_name', 'last_name', 'email')
+
+
+class RevocationCache:
+    """user id -> (checked at, {PRINCIPAL_COLUMNS..., 'role', 'profile_id'} or None), refreshed after a TTL"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def ttl(self):
+        return getattr(settings, 'JWT_REVOCATION_CACHE_SECONDS', 60)
+
+    def get(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is None or time.monotonic() - entry[0] > self.ttl():
+            row = User.objects.filter(pk=user_id).values(
+                *PRINCIPAL_COLUMNS, role=F('profile__role'), profile_id=F('profile__id'),
+            ).first()
+            entry = (time.monotonic(), row)
+            with self._lock:
+                self._entries[user_id] = entry
+        return entry[1]
+
+    def forget(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+revocations = RevocationCache()
+
+
+def _partial_instance(model, **values):
+    """Instance with only `values` loaded (from_db wants them in field order); the rest is deferred"""
+    attnames = [f.attname for f in model._meta.concrete_fields if f.attname in values]
+    return model.from_db(DEFAULT_DB_ALIAS, attnames, [values[name] for name in attnames])
+
+
+def _save_with_update_fields(instance):
+    """save() that refuses to write every loaded (cached) column back"""
+    save = instance.save
+
+    def guarded_save(*args, update_fields=None, **kwargs):
+        if not update_fields:
+            raise TypeError(
+                f'{type(instance).__name__} built from token claims: pass update_fields, '
+                f'or load it with load_user()/load_profile() to save it whole'
+            )
+        return save(*args, update_fields=update_fields, **kwargs)
+    instance.save = guarded_save
+
+
+def principal_from_claims(user_id, role, profile_id, row):
+    """User and Profile instances built from token claims and the revocation row, other fields deferred"""
+    user = _partial_instance(User, id=user_id, **{name: row[name] for name in PRINCIPAL_COLUMNS})
+    profile = _partial_instance(Profile, id=profile_id, user_id=user_id, role=role)
+    user._state.fields_cache['profile'] = profile
+    profile._state.fields_cache['user'] = user
+    _save_with_update_fields(user)
+    _save_with_update_fields(profile)
+    user.from_claims = True
+    return user
+
+
+def load_user(user):
+    """The full User behind request.user (itself if it wasn't built from claims)"""
+    if not getattr(user, 'from_claims', False):
+        return user
+    return User.objects.select_related('profile').get(pk=user.pk)
+
+
+def load_profile(user, queryset=None):
+    """The full Profile of request.user, from `queryset` (e.g. with a prefetch plan) if given"""
+    if not getattr(user, 'from_claims', False):
+        return user.profile
+    return (queryset if queryset is not None else Profile.objects.select_related('user')).get(pk=user.profile.pk)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if ROLE_CLAIM not in validated_token or PROFILE_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        try:
+            user_id = int(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, TypeError, ValueError):
+            return super().get_user(validated_token)
+        role = validated_token[ROLE_CLAIM]
+        profile_id = validated_token[PROFILE_CLAIM]
+
+        row = revocations.get(user_id)
+        if row is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if not row['is_active']:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if getattr(settings, 'JWT_CLAIMS_REVOCATION_CHECK', True) and (
+                row['role'] != role or row['profile_id'] != profile_id):
+            # Role changed or profile replaced since the token was issued: log in again
+            raise AuthenticationFailed(_('Token is no longer valid'), code='token_not_valid')
+
+        return principal_from_claims(user_id, role, profile_id, row)
@@ -0,0 +1,118 @@
+"""
+Several API reads in one HTTP request: POST /api/batch/.
+
+Pages that load many small lists at once (products, routes, vehicles, drivers,
+deployments) can send them together, which saves a round trip and an authentication per
+list on slow mobile connections:
+
+  POST /api/batch/
+  {"requests": [{"id": "products", "path": "/api/products/"},
+                {"id": "routes", "path": "/api/routes/?page=2",
+                 "headers": {"If-None-Match": "\\"...\\""}}]}
+
+  {"responses": [{"id": "products", "status": 200, "body": {...}, "headers": {...}},
+                 {"id": "routes", "status": 304, "body": null, "headers": {"ETag": ...}}]}
+
+Each sub-request goes through the normal view dispatch (permissions, filters, pagination,
+error responses) as the user who sent the batch, without authenticating again, and
+runs one after another on the request's database connection. Every sub-request has its
+own status; one failing does not fail the batch, and each is held to its own endpoint's
+query budget (core.api.query_budget). Only GETs of API views are accepted, at
+most BATCH_MAX_REQUESTS per batch.
+"""
+import copy
+
+from django.conf import settings
+from django.http import QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework import status, views
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from .query_budget import get_setting, subrequest_budget, view_budget
+
+# Request headers a sub-request may set; the rest come from the batch request
+FORWARDED_HEADERS = ('If-None-Match', 'Accept-Language')
+# Response headers returned with each sub-response
+RETURNED_HEADERS = ('ETag', 'Cache-Control', 'Allow')
+
+
+def _max_requests():
+    return getattr(settings, 'BATCH_MAX_REQUESTS', 20)
+
+
+def _error(item_id, code, message):
+    return {'id': item_id, 'status': code, 'body': {'error': message}, 'headers': {}}
+
+
+def subrequest(request, path, query='', headers=None):
+    """
+    GET `path` as the already authenticated user of `request` (a DRF Request), without
+    authenticating again. `headers` may set FORWARDED_HEADERS. Also used by the dashboard.
+    """
+    headers = headers or {}
+    http = copy.copy(request._request)
+    http.method = 'GET'
+    http.path = http.path_info = path
+    http.META = {**http.META, 'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query,
+                 'CONTENT_LENGTH': '0'}
+    http.META.pop('HTTP_IF_NONE_MATCH', None)
+    for name in FORWARDED_HEADERS:
+        if name in headers:
+            http.META['HTTP_' + name.upper().replace('-', '_')] = str(headers[name])
+    http.GET = QueryDict(query)
+    # DRF's Request authenticates with these instead of the authentication classes
+    http._force_auth_user = request.user
+    http._force_auth_token = request.auth
+    return http
+
+
+def run_subrequest(request, item):
+    item_id = item.get('id')
+    method = str(item.get('method', 'GET')).upper()
+    if method != 'GET':
+        return _error(item_id, status.HTTP_405_METHOD_NOT_ALLOWED, 'Only GET requests can be batched')
+    path, _, query = str(item.get('path', '')).partition('?')
+    if not path.startswith('/api/'):
+        return _error(item_id, status.HTTP_400_BAD_REQUEST, 'path must be an /api/ URL')
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return _error(item_id, status.HTTP_404_NOT_FOUND, f'No endpoint at {path}')
+    view_class = getattr(match.func, 'cls', None)
+    if view_class is None or view_class is BatchView:
+        return _error(item_id, status.HTTP_400_BAD_REQUEST, f'{path} cannot be batched')
+
+    http = subrequest(request, path, query, item.get('headers'))
+    http.resolver_match = match
+    budget, name = view_budget(match.func, 'GET')
+    endpoint = f'GET {path} ({name}) in batch'
+    with subrequest_budget(endpoint, get_setting('MAX_QUERIES') if budget is None else budget):
+        try:
+            response = match.func(http, *match.args, **match.kwargs)
+        except Exception as e:
+            print(f"Error in batch sub-request {path}: {e}")
+            return _error(item_id, status.HTTP_500_INTERNAL_SERVER_ERROR, str(e))
+    if not isinstance(response, Response):
+        return _error(item_id, status.HTTP_400_BAD_REQUEST, f'{path} does not return JSON')
+    return {
+        'id': item_id,
+        'status': response.status_code,
+        'body': response.data,
+        'headers': {name: response[name] for name in RETURNED_HEADERS if response.has_header(name)},
+    }
+
+
+class BatchView(views.APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        items = request.data.get('requests') if isinstance(request.data, dict) else None
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return Response({'error': 'requests must be a list of {"path": ...} objects'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > _max_requests():
+            return Response({'error': f'At most {_max_requests()} requests per batch'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        # Each sub-request is checked against its own view's query budget in run_subrequest
+        request._request._query_budget = None
+        return Response({'responses': [run_subrequest(request, item) for item in items]})
@@ -0,0 +1,53 @@
+"""
+ETags and cached responses for reference data endpoints (see core.services.refdata).
+
+A view opts in with `reference_models`, the models its representation reads. list and
+retrieve then answer from the versioned cache: the ETag is computed from the model
+versions and the URL alone, so a matching If-None-Match gets 304 Not Modified after one
+small version query, and a miss is served from the cache until one of the models changes.
+"""
+from django.conf import settings
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from core.services import refdata
+
+
+class ReferenceCacheMixin:
+    reference_models = ()
+
+    def _reference_etag(self, request):
+        version = refdata.versions(self.reference_models)
+        variant = f'{request.build_absolute_uri()}|{request.accepted_media_type}'
+        return refdata.etag(f'{type(self).__name__}.{self.action}', version, variant)
+
+    def _cache_control(self):
+        public = all(isinstance(permission, AllowAny) for permission in self.get_permissions())
+        max_age = getattr(settings, 'REFDATA_MAX_AGE', 0)
+        freshness = f'max-age={max_age}' if max_age else 'no-cache'
+        return f"{'public' if public else 'private'}, {freshness}"
+
+    def _cached(self, request, build):
+        tag = self._reference_etag(request)
+        headers = {'ETag': tag, 'Cache-Control': self._cache_control()}
+        if tag in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        response = None
+
+        def fetch():
+            nonlocal response
+            response = build()
+            return response.data if response.status_code == status.HTTP_200_OK else None
+
+        data = refdata.get_or_build(tag, fetch)
+        if data is None:
+            return response
+        return Response(data, headers=headers)
+
+    def list(self, request, *args, **kwargs):
+        return self._cached(request, lambda: super(ReferenceCacheMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached(request, lambda: super(ReferenceCacheMixin, self).retrieve(request, *args, **kwargs))
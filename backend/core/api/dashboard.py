@@ -0,0 +1,181 @@
+"""
+One request for a whole dashboard: GET /api/dashboard/.
+
+The dashboards used to load each of their lists from its own endpoint, and every request
+paid JWT authentication, the profile lookup and the permission checks again. This view
+authenticates once and runs the same view code for each section of the caller's role
+(so the data is exactly what the separate endpoints return) on a sub-request that reuses
+the authenticated user:
+
+  {"role": "admin", "sections": {"reports": {...}, "products": {...}, ...}, "errors": {}}
+
+A section that fails (a driver without a deployment, say) is left out of `sections` and
+reported under `errors` as {"status": 404, "detail": ...}.
+
+Sections are cached for their TTL (DASHBOARD_TTLS, seconds; 0 = not cached, e.g. for the
+caller's own deliveries, which change with their actions). Sections that are not cached
+run concurrently on a small thread pool (DASHBOARD_WORKERS; 0 runs them in the request
+thread). Each worker thread uses its own database connection, so tests that keep their
+data in an open transaction should set DASHBOARD_WORKERS = 0.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from rest_framework import status, views
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
+from rest_framework.response import Response
+from .batch import subrequest
+
+CACHE_KEY = 'dashboard:{}:{}'
+
+DEFAULT_TTLS = {
+    'reports': 60,
+    'deliveries': 10,
+    'drivers': 30,
+    'products': 0,  # reference data: already cached per version (core.services.refdata)
+    'routes': 0,
+    'me': 0,
+    'my_deliveries': 0,
+    'deployment': 0,
+    'deployments': 30,
+}
+
+
+class Section:
+    def __init__(self, name, view, path, action=None, shared=False):
+        self.name = name
+        self.view = view
+        self.path = path
+        self.action = action
+        # Same data for everyone with the role (cached once), or per user
+        self.shared = shared
+
+    def ttl(self):
+        ttls = {**DEFAULT_TTLS, **getattr(settings, 'DASHBOARD_TTLS', {})}
+        return ttls.get(self.name, 0)
+
+    def cache_key(self, role, user):
+        return CACHE_KEY.format(self.name, role if self.shared else f'user-{user.pk}')
+
+
+def _sections():
+    from core.api import views as v
+    products = Section('products', v.ProductViewSet, '/api/products/', 'list', shared=True)
+    return {
+        'admin': [
+            Section('reports', v.ReportViewSet, '/api/reports/', shared=True),
+            products,
+            Section('deliveries', v.DeliveryViewSet, '/api/deliveries/', 'list'),
+        ],
+        'staff': [
+            Section('deliveries', v.DeliveryViewSet, '/api/deliveries/', 'list'),
+            products,
+            Section('drivers', v.DriverViewSet, '/api/drivers/', 'list', shared=True),
+            Section('routes', v.RouteViewSet, '/api/routes/', 'list', shared=True),
+        ],
+        'driver': [
+            Section('my_deliveries', v.DeliveryViewSet, '/api/deliveries/my-deliveries/', 'my_deliveries'),
+            Section('deployment', v.DeploymentViewSet, '/api/deployments/my-deployment/', 'my_deployment'),
+        ],
+        'customer': [
+            Section('me', v.MeView, '/api/me/'),
+            Section('my_deliveries', v.DeliveryViewSet, '/api/deliveries/my-deliveries/', 'my_deliveries'),
+            products,
+            Section('deployments', v.DeploymentViewSet, '/api/deployments/by-customer-barangay/',
+                    'by_customer_barangay'),
+        ],
+    }
+
+
+def _subrequest(request, path):
+    sub = Request(subrequest(request, path), parsers=request.parsers, negotiator=request.negotiator)
+    sub.accepted_renderer = request.accepted_renderer
+    sub.accepted_media_type = request.accepted_media_type
+    return sub
+
+
+def run_section(section, request):
+    """(status code, data) of one section's view"""
+    sub = _subrequest(request, section.path)
+    view = section.view()
+    view.request = sub
+    view.args = ()
+    view.kwargs = {}
+    view.format_kwarg = None
+    view.headers = {}
+    if section.action:
+        view.action = section.action
+    try:
+        view.check_permissions(sub)
+        response = getattr(view, section.action or 'get')(sub)
+    except APIException as exc:
+        return exc.status_code, {'detail': exc.detail}
+    return response.status_code, response.data
+
+
+def _run_in_worker(section, request):
+    close_old_connections()
+    try:
+        return run_section(section, request)
+    finally:
+        close_old_connections()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(getattr(settings, 'DASHBOARD_WORKERS', 4),
+                                       thread_name_prefix='dashboard')
+        return _pool
+
+
+class DashboardView(views.APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if not hasattr(request.user, 'profile'):
+            return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+        role = request.user.profile.role
+        sections = _sections().get(role)
+        if sections is None:
+            return Response({'error': f'No dashboard for role {role}'}, status=status.HTTP_404_NOT_FOUND)
+
+        results = {}
+        pending = []
+        for section in sections:
+            cached = cache.get(section.cache_key(role, request.user)) if section.ttl() else None
+            if cached is not None:
+                results[section.name] = cached
+            else:
+                pending.append(section)
+
+        if len(pending) > 1 and getattr(settings, 'DASHBOARD_WORKERS', 4):
+            futures = [(section, _executor().submit(_run_in_worker, section, request)) for section in pending]
+            fetched = [(section, future.result()) for section, future in futures]
+        else:
+            fetched = [(section, run_section(section, request)) for section in pending]
+
+        for section, result in fetched:
+            if result[0] == status.HTTP_200_OK and section.ttl():
+                cache.set(section.cache_key(role, request.user), result, section.ttl())
+            results[section.name] = result
+
+        document = {'role': role, 'sections': {}, 'errors': {}}
+        for section in sections:
+            code, data = results[section.name]
+            if code == status.HTTP_200_OK:
+                document['sections'][section.name] = data
+            else:
+                detail = data.get('error') or data.get('detail') if isinstance(data, dict) else data
+                document['errors'][section.name] = {'status': code, 'detail': detail}
+        return Response(document)
@@ -0,0 +1,74 @@
+"""
+Server-Sent Events stream of delivery, deployment and order changes.
+
+GET /api/events/?token=<access token> (EventSource cannot send an Authorization
+header, so the JWT may come in the query string; the header works too). Each change is
+sent as
+
+    id: <n>
+    event: <delivery|deployment|order>
+    data: {"kind": ..., "action": "created|updated|deleted", "object_id": ..., "status": ...}
+
+filtered to what the user's role may see. Clients refetch or invalidate the affected
+queries instead of polling. This is an async view: serve the project through
+waterstation.asgi (uvicorn, daphne) so each open stream does not hold a worker thread.
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from core.api.authentication import ClaimsJWTAuthentication
+from core.services import events
+
+KEEPALIVE_SECONDS = 15
+RETRY_MILLISECONDS = 3000
+
+
+def _principal(request):
+    """(role, profile id) for the request's JWT, or None"""
+    auth = ClaimsJWTAuthentication()
+    header = auth.get_header(request)
+    raw = auth.get_raw_token(header) if header is not None else request.GET.get('token', '').encode() or None
+    if raw is None:
+        return None
+    try:
+        user = auth.get_user(auth.get_validated_token(raw))
+    except (AuthenticationFailed, InvalidToken, TokenError):
+        return None
+    profile = getattr(user, 'profile', None)
+    if profile is None:
+        return None
+    return profile.role, profile.id
+
+
+def _format(event):
+    data = {k: v for k, v in event.items() if k not in ('driver_id', 'customer_id', 'previous_driver_id', 'id')}
+    return f"id: {event['id']}\nevent: {event['kind']}\ndata: {json.dumps(data)}\n\n"
+
+
+async def event_stream(request):
+    principal = await sync_to_async(_principal)(request)
+    if principal is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided or are invalid.'}, status=401)
+    role, profile_id = principal
+    subscription = events.get_broker().subscribe(asyncio.get_running_loop())
+
+    async def stream():
+        try:
+            yield f'retry: {RETRY_MILLISECONDS}\n\n'
+            while True:
+                event = await subscription.get(timeout=KEEPALIVE_SECONDS)
+                if event is None:
+                    # Comment line: keeps proxies from closing an idle connection
+                    yield ': keepalive\n\n'
+                elif events.visible_to(event, role, profile_id):
+                    yield _format(event)
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: don't buffer the stream
+    return response
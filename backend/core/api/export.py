@@ -1,27 +1,84 @@
 import csv
-from django.http import HttpResponse
-from core.models import Profile, Product
+from django.http import StreamingHttpResponse
+from rest_framework.decorators import api_view
+from rest_framework.exceptions import PermissionDenied
+from core.models import Profile, Product, Order
 
-def export_customers(request):
-    resp = HttpResponse(content_type='text/csv')
-    resp['Content-Disposition'] = 'attachment; filename=customers.csv'
-    w = csv.writer(resp); w.writerow(['username','email','phone','address'])
-    for c in Profile.objects.filter(role='customer'):
-        w.writerow([c.user.username, c.user.email, c.phone, c.address])
+# Rows are fetched from the database cursor in chunks of this size
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """Pseudo-buffer for csv.writer: hands each written line straight back"""
+    def write(self, value):
+        return value
+
+
+def stream_csv(filename, header, rows):
+    """Build a StreamingHttpResponse that writes `header` then every row of the `rows` iterable"""
+    writer = csv.writer(Echo())
+
+    def lines():
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+    resp = StreamingHttpResponse(lines(), content_type='text/csv')
+    resp['Content-Disposition'] = f'attachment; filename={filename}'
     return resp
 
+
+def _profile_rows(role):
+    profiles = Profile.objects.filter(role=role).order_by('id').values_list(
+        'user__username', 'user__email', 'phone',
+        'address__full_address', 'address__barangay__name', 'address__barangay__municipality__name',
+    )
+    for username, email, phone, full_address, barangay, municipality in profiles.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        # Same text as str(Address): "<full address>, <barangay>, <municipality>"
+        address = f"{full_address}, {barangay}, {municipality}" if full_address is not None else ''
+        yield [username, email, phone, address]
+
+
+def export_customers(request):
+    return stream_csv('customers.csv', ['username','email','phone','address'], _profile_rows('customer'))
+
 def export_staff(request):
-    resp = HttpResponse(content_type='text/csv')
-    resp['Content-Disposition'] = 'attachment; filename=staff.csv'
-    w = csv.writer(resp); w.writerow(['username','email','phone','address'])
-    for s in Profile.objects.filter(role='staff'):
-        w.writerow([s.user.username, s.user.email, s.phone, s.address])
-    return resp
+    return stream_csv('staff.csv', ['username','email','phone','address'], _profile_rows('staff'))
 
 def export_products(request):
-    resp = HttpResponse(content_type='text/csv')
-    resp['Content-Disposition'] = 'attachment; filename=products.csv'
-    w = csv.writer(resp); w.writerow(['name','sku','price'])
-    for p in Product.objects.all():
-        w.writerow([p.name,p.sku,p.price])
-    return resp
+    products = Product.objects.order_by('name').values_list('name', 'liters', 'price')
+    return stream_csv('products.csv', ['name','liters','price'], products.iterator(chunk_size=EXPORT_CHUNK_SIZE))
+
+
+def delivered_order_rows():
+    orders = Order.objects.filter(delivery__status='delivered').order_by('id').values_list(
+        'id', 'customer__first_name', 'customer__last_name', 'customer__user__username',
+        'product__name', 'quantity', 'product__price', 'created_at',
+    )
+    for order_id, first_name, last_name, username, product_name, quantity, price, created_at in orders.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        customer_name = f"{first_name or ''} {last_name or ''}".strip() or username or ''
+        yield [
+            order_id,
+            customer_name,
+            product_name if product_name is not None else 'N/A',
+            quantity,
+            float(price) if price is not None else 0,
+            float(price * quantity) if price is not None else 0,
+            created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        ]
+
+
+def export_delivered_orders_response():
+    return stream_csv(
+        '"delivered_orders.csv"',
+        ['Order ID', 'Customer', 'Product', 'Quantity', 'Price', 'Total', 'Date'],
+        delivered_order_rows(),
+    )
+
+
+@api_view(['GET'])
+def export_delivered_orders(request):
+    """Export delivered orders to CSV (admin only)"""
+    if not hasattr(request.user, 'profile') or request.user.profile.role != 'admin':
+        raise PermissionDenied('Only admin can export data')
+    return export_delivered_orders_response()
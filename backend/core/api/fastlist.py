@@ -0,0 +1,213 @@
+"""
+Fast list serialization: response dicts built straight from .values() rows.
+
+A list view with FastListMixin and `fast_list = True` skips model instances and
+serializer.to_representation(): the serializer is compiled once (per ?fields= selection)
+into a RowMapper, a list of steps that each turn one .values() row into one output key,
+with the same DRF field's to_representation() and the same rules for missing relations
+(default, allow_null -> None, read-only -> key left out), so the output is identical.
+
+What a serializer can't express as sources needs a row-level twin of its method:
+
+  SerializerMethodField `foo`       values_foo(self, row); the row has the paths declared in
+                                    Meta.read_paths['foo'] and the id of every FK on the way
+  overridden to_representation()    values_to_representation(self, row, representation)
+
+Paths through a many-to-many relation (route__municipalities__name) come back as a list per
+row, loaded with the same prefetch query the instance path runs. A serializer with a field
+the mapper can't compile (nested serializers, properties, method fields without a twin)
+keeps the normal path. FAST_LISTS = False turns the fast path off everywhere; the
+check_fast_lists command compares both paths byte for byte and times them.
+"""
+import functools
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import prefetch_related_objects
+from rest_framework import serializers
+from rest_framework.fields import empty
+from rest_framework.relations import PKOnlyObject
+from rest_framework.response import Response
+
+SKIP = object()
+
+
+class Unsupported(Exception):
+    pass
+
+
+def _resolve(model, path):
+    """(intermediate FK paths, many-relation split or None) for an ORM path, checking every step"""
+    parts = path.split('__')
+    fks = []
+    for i, part in enumerate(parts):
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            raise Unsupported(f'{model.__name__}.{part} is not a model field')
+        prefix = '__'.join(parts[:i + 1])
+        if not field.is_relation:
+            if i != len(parts) - 1:
+                raise Unsupported(f'{path} goes through {part}, which is not a relation')
+            return fks, None
+        if field.many_to_many or field.one_to_many:
+            rest = '__'.join(parts[i + 1:])
+            if not rest:
+                raise Unsupported(f'{path} reads a whole related manager')
+            owner = '__'.join(parts[:i])
+            _resolve(field.related_model, rest)  # must be plain from there on
+            return fks, (owner, part, rest, model)
+        if not field.concrete:
+            raise Unsupported(f'{path} follows a reverse one-to-one')
+        if i == len(parts) - 1:
+            return fks, None  # the FK column itself: the related id
+        fks.append(prefix)
+        model = field.related_model
+    return fks, None
+
+
+class RowMapper:
+    def __init__(self, serializer_class, fields=None):
+        kwargs = {'fields': fields} if fields is not None else {}
+        serializer = serializer_class(context={}, **kwargs)
+        self.model = serializer.Meta.model
+        self.paths = {self.model._meta.pk.name}
+        self.many = {}  # path -> (owner path, relation, rest, owner model)
+        self.steps = []
+        read_paths = getattr(serializer.Meta, 'read_paths', {})
+
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            hook = getattr(serializer_class, f'values_{name}', None)
+            if hook is not None:
+                if name not in read_paths:
+                    raise Unsupported(f'{serializer_class.__name__}.values_{name} has no read_paths')
+                for path in read_paths[name]:
+                    self._add(path)
+                self.steps.append((name, hook))
+                continue
+            if (isinstance(field, (serializers.SerializerMethodField, serializers.BaseSerializer,
+                                   serializers.ManyRelatedField)) or field.source == '*'):
+                raise Unsupported(f'{serializer_class.__name__}.{name} has no values_{name}')
+            path = '__'.join(field.source_attrs)
+            fks = self._add(path)
+            if path in self.many:
+                raise Unsupported(f'{serializer_class.__name__}.{name} reads a list')
+            related = isinstance(field, serializers.RelatedField)
+            if related and not (isinstance(field, serializers.PrimaryKeyRelatedField)
+                                and field.use_pk_only_optimization()):
+                raise Unsupported(f'{serializer_class.__name__}.{name} reads a related object')
+            self.steps.append((name, self._field_step(field, path, fks, pk_only=related)))
+
+        overridden = type(serializer).to_representation is not serializers.Serializer.to_representation
+        self.finish = getattr(serializer_class, 'values_to_representation', None)
+        if overridden and self.finish is None:
+            raise Unsupported(f'{serializer_class.__name__}.to_representation has no values_to_representation')
+        for path in read_paths.get('to_representation', ()):
+            self._add(path)
+
+    def _add(self, path):
+        fks, many = _resolve(self.model, path)
+        self.paths.update(fks)
+        if many is None:
+            self.paths.add(path)
+        else:
+            owner = many[0] or self.model._meta.pk.name
+            self.paths.add(owner)
+            self.many[path] = many
+        return fks
+
+    @staticmethod
+    def _field_step(field, path, fks, pk_only=False):
+        """Field.get_attribute() + to_representation() on a values() row"""
+        def step(serializer, row):
+            if any(row[fk] is None for fk in fks):
+                # Instance path: AttributeError on None.<attr>, see Field.get_attribute()
+                if field.default is not empty:
+                    value = field.get_default()
+                elif field.allow_null:
+                    return None
+                elif not field.required:
+                    return SKIP
+                else:
+                    raise AttributeError(f"'NoneType' object has no attribute '{path}'")
+            else:
+                value = row[path]
+                if pk_only and value is not None:
+                    value = PKOnlyObject(pk=value)  # what RelatedField.get_attribute() returns
+            return None if value is None else field.to_representation(value)
+        return step
+
+    def _fill_many(self, rows):
+        """Put the list for each many-relation path in the rows, with the instance path's prefetch query"""
+        for path, (owner_path, relation, rest, owner_model) in self.many.items():
+            key = owner_path or self.model._meta.pk.name
+            owners = {}
+            for row in rows:
+                if row[key] is not None and row[key] not in owners:
+                    owners[row[key]] = owner_model(pk=row[key])
+            prefetch_related_objects(list(owners.values()), relation)
+            attrs = rest.split('__')
+            values = {}
+            for pk, owner in owners.items():
+                items = []
+                for item in getattr(owner, relation).all():
+                    for attr in attrs:
+                        item = getattr(item, attr) if item is not None else None
+                    items.append(item)
+                values[pk] = items
+            for row in rows:
+                row[path] = values.get(row[key])
+
+    def values(self, queryset, extra_columns=()):
+        return queryset.prefetch_related(None).values(*sorted(self.paths | set(extra_columns)))
+
+    def represent(self, serializer, rows):
+        rows = [dict(row) for row in rows]
+        self._fill_many(rows)
+        data = []
+        for row in rows:
+            representation = {}
+            for name, step in self.steps:
+                value = step(serializer, row)
+                if value is not SKIP:
+                    representation[name] = value
+            if self.finish is not None:
+                self.finish(serializer, row, representation)
+            data.append(representation)
+        return data
+
+
+@functools.lru_cache(maxsize=256)
+def mapper_for(serializer_class, fields=None):
+    """RowMapper for serializer_class (and a ?fields= frozenset), or None if it can't be compiled"""
+    try:
+        return RowMapper(serializer_class, fields)
+    except Unsupported as e:
+        print(f"Fast list serialization unavailable for {serializer_class.__name__}: {e}")
+        return None
+
+
+class FastListMixin:
+    """list() from .values() rows when the view sets `fast_list = True` (use with PrefetchPlanMixin)"""
+    fast_list = False
+
+    def fast_mapper(self):
+        if not (self.fast_list and getattr(settings, 'FAST_LISTS', True)):
+            return None
+        return mapper_for(self.get_serializer_class(), self.sparse_fields())
+
+    def list(self, request, *args, **kwargs):
+        mapper = self.fast_mapper()
+        if mapper is None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = mapper.values(queryset, extra_columns=getattr(self, 'keyset_fields', None) or ())
+        # Page numbers: COUNT(*) the model queryset, without the joins values() added
+        rows.count = queryset.count
+        serializer = self.get_serializer()
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(mapper.represent(serializer, page))
+        return Response(mapper.represent(serializer, rows))
@@ -0,0 +1,93 @@
+"""
+Idempotency-Key support for POST endpoints.
+
+A client that may retry a POST sends a unique Idempotency-Key header. The first request
+with that key (per user) runs normally and its response is stored for
+IDEMPOTENCY_KEY_TTL_HOURS. Retries get the stored response, marked with an
+Idempotent-Replayed header, without the view (or the signals behind its writes) running
+again. Reusing a key for a different request body is rejected with 422, and a retry
+that arrives while the first request is still running gets 409.
+
+Server errors (5xx) are not stored, so those requests can be retried for real.
+"""
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from core.models import IdempotencyRecord
+
+HEADER = 'Idempotency-Key'
+KEY_TTL = timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 24))
+# A request still marked as running after this long is assumed to have died with its worker
+STALE_AFTER = timedelta(seconds=60)
+
+
+def _request_hash(request):
+    body = json.dumps(request.data, cls=JSONEncoder, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+def _claim(request, key, request_hash):
+    """Returns (record, None) when this request should run, or (None, response) to answer at once"""
+    now = timezone.now()
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                return IdempotencyRecord.objects.create(
+                    user=request.user, key=key, method=request.method, path=request.path[:255],
+                    request_hash=request_hash, expires_at=now + KEY_TTL,
+                ), None
+        except IntegrityError:
+            pass
+        record = IdempotencyRecord.objects.filter(user=request.user, key=key).first()
+        if record is None:
+            continue
+        if record.expires_at <= now or (record.status_code is None and record.created_at <= now - STALE_AFTER):
+            record.delete()
+            continue
+        if record.request_hash != request_hash:
+            return None, Response(
+                {'error': f'{HEADER} was already used for a different request'}, status=422
+            )
+        if record.status_code is None:
+            return None, Response({'error': 'A request with this idempotency key is still in progress'}, status=409)
+        replay = Response(record.response_body, status=record.status_code)
+        replay['Idempotent-Replayed'] = 'true'
+        return None, replay
+    return None, Response({'error': 'A request with this idempotency key is still in progress'}, status=409)
+
+
+def idempotent(view_method):
+    """Decorator for view(set) methods handling POSTs; see the module docstring"""
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or not request.user.is_authenticated:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({'error': f'{HEADER} must be at most 255 characters'}, status=400)
+
+        record, response = _claim(request, key, _request_hash(request))
+        if response is not None:
+            return response
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+        if response.status_code >= 500 or not isinstance(response, Response):
+            record.delete()
+            return response
+        record.status_code = response.status_code
+        record.response_body = json.loads(json.dumps(response.data, cls=JSONEncoder))
+        record.save(update_fields=['status_code', 'response_body'])
+        # Drop expired keys as we go
+        IdempotencyRecord.objects.filter(expires_at__lt=timezone.now()).delete()
+        return response
+    return wrapper
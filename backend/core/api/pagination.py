@@ -0,0 +1,109 @@
+import base64
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_position(ts, pk):
+    """Opaque token for a (datetime, id) position"""
+    return base64.urlsafe_b64encode(f'{ts.isoformat()}|{pk}'.encode()).decode().rstrip('=')
+
+
+def decode_position(token):
+    """(datetime, id) from encode_position(); raises ValueError for malformed tokens"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+    except UnicodeDecodeError:
+        raise ValueError(token)
+    ts, pk = raw.rsplit('|', 1)
+    ts = parse_datetime(ts)
+    if ts is None:
+        raise ValueError(token)
+    return ts, int(pk)
+
+
+class KeysetPagination:
+    """
+    Keyset ("seek") pagination over a (datetime, id) pair, newest first.
+
+    The cursor encodes the last row of the page, and the next page is the rows strictly
+    before it: WHERE (ts < c_ts) OR (ts = c_ts AND id < c_id) ORDER BY ts DESC, id DESC.
+    With a matching (ts DESC, id DESC) index every page is an index range scan, no
+    matter how deep, and no COUNT(*) is run.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def __init__(self, fields, page_size):
+        self.time_field, self.id_field = fields
+        self.page_size = page_size
+
+    def encode_cursor(self, row):
+        if isinstance(row, dict):  # .values() rows (core.api.fastlist)
+            return encode_position(row[self.time_field], row[self.id_field])
+        return encode_position(getattr(row, self.time_field), getattr(row, self.id_field))
+
+    def decode_cursor(self, cursor):
+        try:
+            return decode_position(cursor)
+        except ValueError:
+            raise NotFound('Invalid cursor')
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def filter_after(self, queryset, cursor):
+        """Rows strictly after `cursor` in newest-first order"""
+        ts, pk = self.decode_cursor(cursor)
+        return queryset.filter(
+            Q(**{f'{self.time_field}__lt': ts}) | Q(**{self.time_field: ts, f'{self.id_field}__lt': pk})
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        size = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        queryset = queryset.order_by(f'-{self.time_field}', f'-{self.id_field}')
+        if cursor:
+            queryset = self.filter_after(queryset, cursor)
+        rows = list(queryset[:size + 1])
+        self.has_next = len(rows) > size
+        self.page = rows[:size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+
+class HybridPagination(PageNumberPagination):
+    """
+    The project-wide page-number pagination, switching to KeysetPagination when the view
+    declares `keyset_fields` and the request asks for it with a `cursor` parameter
+    (an empty ?cursor= starts from the newest row).
+    """
+    def paginate_queryset(self, queryset, request, view=None):
+        fields = getattr(view, 'keyset_fields', None)
+        if fields and KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination(fields, self.get_page_size(request) or self.page_size)
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,260 @@
+"""
+select_related / prefetch_related / only() plans derived from serializer declarations.
+
+plan_for(SerializerClass) walks the serializer's readable fields and follows each
+`source` through the model:
+
+  forward FK / one-to-one  -> select_related (unless only its id is read: then the FK column)
+  many-to-many / reverse FK -> prefetch_related, and anything read below it is prefetched too
+  plain model field         -> a column for only()
+
+Nested serializers are walked with their source as prefix. SerializerMethodFields and
+overridden to_representation() methods can't be read this way, so a serializer declares
+the ORM paths they touch in Meta.read_paths:
+
+    class Meta:
+        read_paths = {
+            'customer_address': ['order__customer__address__full_address',
+                                 'order__customer__address__barangay__municipality__name'],
+            'to_representation': ['product__name'],
+        }
+
+When a method field or to_representation override has no declaration, or a source isn't
+a model field (a property), the plan still joins and prefetches what it found but skips
+only(), which would otherwise turn every undeclared attribute read into a query.
+
+PrefetchPlanMixin applies the plan in filter_queryset(), so list/retrieve/update and
+anything built on get_object() get it whatever get_queryset() returns; only() is used for
+list and retrieve. GET /api/debug/prefetch-plans/ (admin) shows the plan of every
+registered ViewSet.
+
+Sparse fieldsets: on GET, ?fields=id,status,driver_first_name is passed to serializers with
+SparseFieldsMixin, and plan_for(serializer_class, fields) walks only those fields and their
+read_paths (plus 'to_representation'), so unselected relations are neither joined nor
+loaded.
+"""
+import functools
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers, views
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from .permissions import IsRole
+from .serializers import SparseFieldsMixin
+
+READ_ACTIONS = ('list', 'retrieve')
+
+
+class QueryPlan:
+    def __init__(self, model):
+        self.model = model
+        self.select_related = set()
+        self.prefetch_related = set()
+        self.columns = {model._meta.pk.name}
+        self.opaque = []  # why only() can't be used
+
+    @property
+    def only(self):
+        return None if self.opaque else sorted(self.columns)
+
+    def as_dict(self):
+        return {
+            'model': self.model.__name__,
+            'select_related': _deepest(self.select_related),
+            'prefetch_related': _deepest(self.prefetch_related),
+            'only': self.only,
+            'only_skipped_because': self.opaque,
+        }
+
+
+def _deepest(paths):
+    """Drop paths that another path extends ('order' is implied by 'order__product')"""
+    return sorted(p for p in paths if not any(other.startswith(p + '__') for other in paths))
+
+
+def _add_path(plan, model, parts, prefix='', prefetched=False, needs_object=True, reads_object=False):
+    """
+    Record what reading `parts` (attribute names) from `model` needs. Returns the model at
+    the end of the path and whether it is reached through a prefetch, or (None, ...) if the
+    path leaves the model's fields. needs_object=False: a relation at the end is only read
+    for its id; reads_object=True: it is read whole (str()), not through a nested serializer.
+    """
+    path = prefix
+    for i, part in enumerate(parts):
+        last = i == len(parts) - 1
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            plan.opaque.append(f'{model.__name__}.{part} is not a model field')
+            return None, prefetched
+        path = f'{path}__{field.name}' if path else field.name
+        if not field.is_relation:
+            if not prefetched:
+                plan.columns.add(path)
+            return model, prefetched
+        related = field.related_model
+        if field.many_to_many or field.one_to_many:
+            plan.prefetch_related.add(path)
+            prefetched = True
+        elif field.concrete and (
+            (last and not needs_object)
+            or (not last and parts[i + 1] in (related._meta.pk.name, 'pk') and i + 2 == len(parts))
+        ):
+            # Only the id is read (a PK field or `source='driver.id'`): the FK column is enough
+            if not prefetched:
+                plan.columns.add(path)
+            return model, prefetched
+        elif prefetched:
+            plan.prefetch_related.add(path)
+        elif last and reads_object:
+            plan.select_related.add(path)
+            plan.opaque.append(f'{model.__name__}.{part} is read as a whole object')
+        else:
+            plan.select_related.add(path)
+            if field.concrete:
+                plan.columns.add(path)
+            plan.columns.add(f'{path}__{related._meta.pk.name}')
+        model = related
+    return model, prefetched
+
+
+def _walk(plan, serializer, model, prefix='', prefetched=False, selected=None):
+    meta = getattr(serializer, 'Meta', None)
+    read_paths = getattr(meta, 'read_paths', {})
+
+    for name, paths in read_paths.items():
+        if selected is not None and name != 'to_representation' and name not in selected:
+            continue
+        for declared in paths:
+            _add_path(plan, model, declared.split('__'), prefix, prefetched)
+    if (type(serializer).to_representation is not serializers.Serializer.to_representation
+            and 'to_representation' not in read_paths):
+        plan.opaque.append(f'{type(serializer).__name__}.to_representation is overridden without read_paths')
+
+    for name, field in serializer.fields.items():
+        if selected is not None and name not in selected:
+            continue
+        if field.write_only or name in read_paths:
+            continue  # declared paths replace what the field's source would say
+        if isinstance(field, serializers.SerializerMethodField):
+            plan.opaque.append(f'{type(serializer).__name__}.{name} has no read_paths')
+            continue
+        if field.source == '*':
+            if isinstance(field, serializers.BaseSerializer):
+                _walk(plan, field, model, prefix, prefetched)
+            else:
+                plan.opaque.append(f"{type(serializer).__name__}.{name} reads source='*'")
+            continue
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        if isinstance(nested, serializers.BaseSerializer):
+            target, through_prefetch = _add_path(plan, model, field.source_attrs, prefix, prefetched)
+            if target is not None:
+                nested_prefix = '__'.join([prefix, *field.source_attrs] if prefix else field.source_attrs)
+                _walk(plan, nested, target, nested_prefix, through_prefetch)
+            continue
+        needs_object = not isinstance(field, (serializers.PrimaryKeyRelatedField, serializers.ManyRelatedField))
+        _add_path(plan, model, field.source_attrs, prefix, prefetched,
+                  needs_object=needs_object, reads_object=needs_object)
+
+
+@functools.lru_cache(maxsize=1024)
+def plan_for(serializer_class, fields=None):
+    """QueryPlan for serializing instances of serializer_class.Meta.model (only `fields`: a frozenset)"""
+    serializer = serializer_class(context={})
+    plan = QueryPlan(serializer.Meta.model)
+    _walk(plan, serializer, plan.model, selected=fields)
+    return plan
+
+
+def apply_plan(queryset, plan, load_only=False, extra_columns=()):
+    if queryset.model is not plan.model or queryset._fields is not None:
+        return queryset  # values() querysets or a different model: nothing to plan
+    select = _deepest(plan.select_related)
+    if select and queryset.query.select_related is not True:
+        queryset = queryset.select_related(*select)
+    prefetch = [p for p in _deepest(plan.prefetch_related) if p not in queryset._prefetch_related_lookups]
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    deferred, is_defer = queryset.query.deferred_loading
+    if load_only and plan.only is not None and not deferred and is_defer:
+        queryset = queryset.only(*plan.only, *extra_columns, *_relation_columns(queryset))
+    return queryset
+
+
+def _relation_columns(queryset):
+    """
+    Columns the queryset's own select_related/prefetch_related need loaded: a view may join
+    more than a sparse fieldset's plan, and a deferred FK can't be followed without a query
+    """
+    columns = []
+
+    def leaves(tree, prefix):
+        for name, below in tree.items():
+            path = f'{prefix}__{name}' if prefix else name
+            if below:
+                leaves(below, path)
+            else:
+                columns.append(path)
+
+    if isinstance(queryset.query.select_related, dict):
+        leaves(queryset.query.select_related, '')
+    for lookup in queryset._prefetch_related_lookups:
+        first = getattr(lookup, 'prefetch_through', lookup).split('__')[0]
+        try:
+            field = queryset.model._meta.get_field(first)
+        except FieldDoesNotExist:
+            continue
+        if field.concrete and field.is_relation and not field.many_to_many:
+            columns.append(first)
+    return columns
+
+
+class PrefetchPlanMixin:
+    """Applies the serializer's QueryPlan to the view's querysets"""
+
+    def sparse_fields(self):
+        """The ?fields= selection of a GET request, as a frozenset (None: all fields)"""
+        request = getattr(self, 'request', None)
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return None
+        if not issubclass(self.get_serializer_class(), SparseFieldsMixin):
+            return None
+        names = request.query_params.get('fields')
+        if not names:
+            return None
+        return frozenset(name.strip() for name in names.split(',') if name.strip())
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.sparse_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
+
+    def plan_queryset(self, queryset, load_only=True, extra_columns=()):
+        return apply_plan(
+            queryset, plan_for(self.get_serializer_class(), self.sparse_fields()), load_only=load_only,
+            extra_columns=(*(getattr(self, 'keyset_fields', None) or ()), *extra_columns),
+        )
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return self.plan_queryset(queryset, load_only=self.action in READ_ACTIONS)
+
+
+class PrefetchPlanView(views.APIView):
+    """The derived plan of every registered ViewSet (admin only)"""
+    def get_permissions(self):
+        return [IsAuthenticated(), IsRole('admin')]
+
+    def get(self, request):
+        from core.urls import router
+        plans = {}
+        for prefix, viewset, basename in router.registry:
+            serializer_class = getattr(viewset, 'serializer_class', None)
+            if serializer_class is None:
+                continue
+            plan = plan_for(serializer_class).as_dict()
+            plan['applied'] = issubclass(viewset, PrefetchPlanMixin)
+            plan['extra_columns'] = list(getattr(viewset, 'keyset_fields', None) or ())
+            plans[f'{viewset.__name__} (/api/{prefix}/)'] = plan
+        return Response(plans)
@@ -0,0 +1,238 @@
+"""
+Per-request query counting and N+1 detection.
+
+QueryRecorder hooks the database connection (connection.execute_wrapper, so it works
+with DEBUG off) and groups the statements of a request by SQL shape: the statement
+with its parameters left out and IN lists collapsed. A shape run N_PLUS_ONE_THRESHOLD
+times or more is reported as an N+1, together with the serializer field that issued
+it, found by walking the Python stack (e.g. "DeliverySerializer.customer_address").
+
+Walking the stack is the expensive part, so outside DEBUG and tests the middleware only
+does it for statements that are already a problem: a shape's repeats from the
+threshold on, and every statement past the budget. The fields of an N+1 then count
+those repeats only. CAPTURE_STACKS = True walks it for every statement.
+
+QueryBudgetMiddleware records every request and checks it against the view's
+`query_budget` attribute (or MAX_QUERIES). Settings, all optional:
+
+    QUERY_BUDGET = {
+        'MODE': 'log',               # 'log': warn on the core.api.query_budget logger,
+                                     # 'raise': raise QueryBudgetExceeded (tests), 'off'
+        'MAX_QUERIES': 50,
+        'N_PLUS_ONE_THRESHOLD': 5,
+        'HEADER': False,             # add X-Query-Count to responses
+        'CAPTURE_STACKS': None,      # attribute every statement (None: when DEBUG)
+    }
+
+In tests, wrap a block in `with query_budget(10):` to fail on more than 10 queries or
+any N+1, independent of the middleware. Batched sub-requests (core.api.batch) are each
+checked against their own view's budget with subrequest_budget().
+"""
+import logging
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'MODE': 'log',
+    'MAX_QUERIES': 50,
+    'N_PLUS_ONE_THRESHOLD': 5,
+    'HEADER': False,
+    'CAPTURE_STACKS': None,
+}
+
+IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def get_setting(name):
+    return getattr(settings, 'QUERY_BUDGET', {}).get(name, DEFAULTS[name])
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def sql_shape(sql):
+    """The statement with literals and IN-list lengths taken out"""
+    return LITERAL_RE.sub('?', IN_LIST_RE.sub('IN (...)', sql))
+
+
+def serializer_field(frame):
+    """'Serializer.field' for the innermost serializer code on the stack, or None"""
+    while frame is not None:
+        owner = frame.f_locals.get('self')
+        if isinstance(owner, BaseSerializer):
+            name = frame.f_code.co_name
+            if name == 'to_representation' and 'field' in frame.f_locals:
+                return f"{type(owner).__name__}.{frame.f_locals['field'].field_name}"
+            if name.startswith('get_') and name != 'get_attribute':
+                return f"{type(owner).__name__}.{name[4:]}"  # SerializerMethodField
+            if name == 'to_representation' and type(owner).to_representation is not BaseSerializer.to_representation:
+                return f"{type(owner).__name__}.to_representation"
+        frame = frame.f_back
+    return None
+
+
+class QueryRecorder:
+    """
+    Records the statements run on every database connection while active. With
+    capture_stacks=False, only statements past `budget` (a number or a callable returning
+    one) or repeated `threshold` times are attributed to serializer fields.
+    """
+    def __init__(self, capture_stacks=True, budget=None, threshold=None):
+        self.capture_stacks = capture_stacks
+        self.budget = budget
+        self.threshold = threshold or get_setting('N_PLUS_ONE_THRESHOLD')
+        self.stack_walks = 0
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+        self.fields = defaultdict(Counter)  # shape -> Counter of serializer fields
+        self._contexts = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            shape = sql_shape(sql)
+            self.shapes[shape] += 1
+            if self._wants_stack(shape):
+                self.stack_walks += 1
+                field = serializer_field(sys._getframe(1))
+                if field:
+                    self.fields[shape][field] += 1
+
+    def _wants_stack(self, shape):
+        if self.capture_stacks or self.shapes[shape] >= self.threshold:
+            return True
+        budget = self.budget() if callable(self.budget) else self.budget
+        return budget is not None and self.count > budget
+
+    def __enter__(self):
+        for alias in connections:
+            context = connections[alias].execute_wrapper(self)
+            context.__enter__()
+            self._contexts.append(context)
+        return self
+
+    def __exit__(self, *exc):
+        while self._contexts:
+            self._contexts.pop().__exit__(*exc)
+
+    def n_plus_one(self, threshold=None):
+        threshold = threshold or get_setting('N_PLUS_ONE_THRESHOLD')
+        return [
+            {'sql': shape, 'count': count, 'fields': dict(self.fields.get(shape, {}))}
+            for shape, count in self.shapes.most_common() if count >= threshold
+        ]
+
+    def report(self, endpoint, budget, threshold=None):
+        """Dict describing the request, with 'problems' empty when it is within budget"""
+        problems = []
+        if budget is not None and self.count > budget:
+            problems.append(f'{self.count} queries (budget {budget})')
+        repeated = self.n_plus_one(threshold)
+        for item in repeated:
+            where = ', '.join(f'{field} x{n}' for field, n in item['fields'].items()) or 'outside serializers'
+            problems.append(f"N+1: {item['count']}x from {where}: {item['sql'][:200]}")
+        return {
+            'endpoint': endpoint,
+            'queries': self.count,
+            'duration_ms': round(self.duration * 1000, 1),
+            'budget': budget,
+            'n_plus_one': repeated,
+            'problems': problems,
+        }
+
+
+def _emit(report, mode):
+    if not report['problems'] or mode == 'off':
+        return
+    message = f"Query budget exceeded on {report['endpoint']}: " + '; '.join(report['problems'])
+    if mode == 'raise':
+        raise QueryBudgetExceeded(message)
+    logger.warning(message, extra={'query_report': report})
+
+
+def _capture_stacks():
+    capture = get_setting('CAPTURE_STACKS')
+    return settings.DEBUG if capture is None else capture
+
+
+def view_budget(view_func, method):
+    """(the view's `query_budget` or None, 'ViewClass.action') for a resolved view function"""
+    # DRF views carry their class on the view function; viewsets also their actions
+    view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    if view_class is None:
+        return None, None
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower())
+    return getattr(view_class, 'query_budget', None), f'{view_class.__name__}.{action}' if action else view_class.__name__
+
+
+@contextmanager
+def subrequest_budget(endpoint, budget):
+    """Record a sub-request run inside another request and check it as the middleware would"""
+    mode = get_setting('MODE')
+    if mode == 'off':
+        yield None
+        return
+    with QueryRecorder(capture_stacks=_capture_stacks(), budget=budget) as recorder:
+        yield recorder
+    _emit(recorder.report(endpoint, budget), mode)
+
+
+@contextmanager
+def query_budget(max_queries=None, n_plus_one_threshold=None, mode='raise', label='block'):
+    """
+    Test helper: fail (mode='raise') or warn (mode='log') when the block runs more than
+    max_queries statements or repeats one shape n_plus_one_threshold times.
+    Yields the QueryRecorder.
+    """
+    with QueryRecorder() as recorder:
+        yield recorder
+    _emit(recorder.report(label, max_queries, n_plus_one_threshold), mode)
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = get_setting('MODE')
+        if mode == 'off':
+            return self.get_response(request)
+        request._query_budget = get_setting('MAX_QUERIES')
+        request._query_endpoint = f'{request.method} {request.path}'
+        recorder = QueryRecorder(
+            capture_stacks=_capture_stacks(),
+            budget=lambda: request._query_budget,  # views and batches may change it
+        )
+        with recorder:
+            response = self.get_response(request)
+        report = recorder.report(request._query_endpoint, request._query_budget)
+        if get_setting('HEADER'):
+            response['X-Query-Count'] = str(recorder.count)
+        _emit(report, mode)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        budget, name = view_budget(view_func, request.method)
+        if name is None:
+            return None
+        if budget is not None:
+            request._query_budget = budget
+        request._query_endpoint = f'{request.method} {request.path} ({name})'
+        return None
@@ -6,13 +6,32 @@ from core.models import ActivityLog, Municipality, Barangay, Address, WalkInOrde
 from core.models import User
 import re
 
+
+class SparseFieldsMixin:
+    """
+    Sparse fieldsets: `fields=` (the view passes ?fields=id,status on GET requests) keeps
+    only those fields in the representation. Names that aren't fields are ignored; the view's
+    query plan is pruned to the same selection (core.api.prefetch). to_representation()
+    overrides check wants() before computing a key.
+    """
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.selected_fields = frozenset(fields) if fields is not None else None
+        if self.selected_fields is not None:
+            for name in set(self.fields) - self.selected_fields:
+                self.fields.pop(name)
+
+    def wants(self, name):
+        return self.selected_fields is None or name in self.selected_fields
+
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
         token = super().get_token(user)
-        # Add custom claims
+        # Add custom claims (core.api.authentication builds request.user from these)
         if hasattr(user, 'profile'):
             token['role'] = user.profile.role
+            token['profile_id'] = user.profile.id
         else:
             token['role'] = user.role if hasattr(user, 'role') else 'customer'
         return token
@@ -52,21 +71,24 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
         data = super().validate(attrs)
         return data
 
-class AddressSerializer(serializers.ModelSerializer):
+class AddressSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     barangay_name = serializers.CharField(source='barangay.name', read_only=True)
     municipality_name = serializers.CharField(source='barangay.municipality.name', read_only=True)
     
     class Meta:
         model = Address
         fields = '__all__'
+        read_paths = {'to_representation': []}  # only re-reads the *_name fields' sources
         
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        representation['barangay_name'] = instance.barangay.name
-        representation['municipality_name'] = instance.barangay.municipality.name
+        if self.wants('barangay_name'):
+            representation['barangay_name'] = instance.barangay.name
+        if self.wants('municipality_name'):
+            representation['municipality_name'] = instance.barangay.municipality.name
         return representation
 
-class ProfileSerializer(serializers.ModelSerializer):
+class ProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     username = serializers.CharField(required=False)
     email = serializers.EmailField(source='user.email', required=False, allow_blank=True)
     address_detail = AddressSerializer(source='address', read_only=True)
@@ -84,6 +106,14 @@ class ProfileSerializer(serializers.ModelSerializer):
             'municipality','barangay','address_details'
         ]
         read_only_fields = ['role']  # Role should only be changed by admin
+        # ORM paths read outside declared sources (core.api.prefetch)
+        read_paths = {
+            'username': ['user__username'],
+            'address': [
+                'address__full_address', 'address__barangay__name', 'address__barangay__municipality__name',
+            ],
+            'to_representation': [],  # reads what username and address declare
+        }
         extra_kwargs = {
             'first_name': {'required': False, 'allow_blank': True},
             'last_name': {'required': False, 'allow_blank': True},
@@ -103,8 +133,10 @@ class ProfileSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         # Add username from user object
-        if hasattr(instance, 'user') and instance.user:
+        if self.wants('username') and hasattr(instance, 'user') and instance.user:
             representation['username'] = instance.user.username
+        if not self.wants('address'):
+            return representation
         # Include the full address information in the representation
         if instance.address:
             representation['address'] = {
@@ -343,7 +375,7 @@ class ProfileSerializer(serializers.ModelSerializer):
         
         return profile
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = '__all__'
@@ -354,24 +386,26 @@ class ProductSerializer(serializers.ModelSerializer):
         return value
     
 
-class MunicipalitySerializer(serializers.ModelSerializer):
+class MunicipalitySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Municipality
         fields = '__all__'
 
-class BarangaySerializer(serializers.ModelSerializer):
+class BarangaySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     municipality_name = serializers.CharField(source='municipality.name', read_only=True)
     
     class Meta:
         model = Barangay
         fields = '__all__'
+        read_paths = {'to_representation': []}  # only re-reads municipality_name's source
         
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        representation['municipality_name'] = instance.municipality.name
+        if self.wants('municipality_name'):
+            representation['municipality_name'] = instance.municipality.name
         return representation
 
-class WalkInOrderSerializer(serializers.ModelSerializer):
+class WalkInOrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     total_quantity = serializers.SerializerMethodField(read_only=True)
     
@@ -379,26 +413,35 @@ class WalkInOrderSerializer(serializers.ModelSerializer):
         model = WalkInOrder
         fields = '__all__'
         read_only_fields = ['free_items', 'total_quantity']
+        read_paths = {
+            'total_quantity': ['quantity', 'free_items'],
+            'to_representation': [],  # re-reads product_name and total_quantity
+        }
     
     def get_total_quantity(self, obj):
         return obj.quantity + obj.free_items
     
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        representation['product_name'] = instance.product.name
-        representation['total_quantity'] = instance.total_quantity
+        if self.wants('product_name'):
+            representation['product_name'] = instance.product.name
+        if self.wants('total_quantity'):
+            representation['total_quantity'] = instance.total_quantity
         return representation
 
-class RouteSerializer(serializers.ModelSerializer):
+class RouteSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     municipalities_detail = MunicipalitySerializer(source='municipalities', many=True, read_only=True)
     barangays_detail = BarangaySerializer(source='barangays', many=True, read_only=True)
     
     class Meta:
         model = Route
         fields = '__all__'
+        read_paths = {'municipality_names': ['municipalities__name'], 'to_representation': []}
         
     def to_representation(self, instance):
         representation = super().to_representation(instance)
+        if not self.wants('municipality_names'):
+            return representation
         # Add municipality names as a comma-separated string
         try:
             municipalities = instance.municipalities.all()
@@ -407,12 +450,12 @@ class RouteSerializer(serializers.ModelSerializer):
             representation['municipality_names'] = 'N/A'
         return representation
 
-class VehicleSerializer(serializers.ModelSerializer):
+class VehicleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Vehicle
         fields = '__all__'
 
-class DeploymentSerializer(serializers.ModelSerializer):
+class DeploymentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     driver_first_name = serializers.CharField(source='driver.first_name', read_only=True)
     driver_last_name = serializers.CharField(source='driver.last_name', read_only=True)
     driver_phone = serializers.CharField(source='driver.phone', read_only=True, allow_null=True)
@@ -430,6 +473,11 @@ class DeploymentSerializer(serializers.ModelSerializer):
         model = Deployment
         fields = '__all__'
         read_only_fields = ['created_at', 'returned_at']
+        read_paths = {
+            'municipality_names': ['route__municipalities__name'],
+            'barangay_names': ['route__barangays__name'],
+            'to_representation': [],  # re-reads the driver, vehicle, route and product fields' sources
+        }
         
     def get_municipality_names(self, obj):
         # Return comma-separated list of municipality names
@@ -452,6 +500,26 @@ class DeploymentSerializer(serializers.ModelSerializer):
         except Exception as e:
             print(f"Error in get_barangay_names: {e}")
             return 'N/A'
+
+    # .values() row versions of the method fields and to_representation (core.api.fastlist)
+    def values_municipality_names(self, row):
+        if row['route'] is None:
+            return 'N/A'
+        return ", ".join(row['route__municipalities__name'])
+
+    def values_barangay_names(self, row):
+        if row['route'] is None:
+            return 'N/A'
+        return ", ".join(row['route__barangays__name'])
+
+    def values_to_representation(self, row, representation):
+        for relation, name, attr in (
+            ('driver', 'driver_first_name', 'first_name'), ('driver', 'driver_last_name', 'last_name'),
+            ('vehicle', 'vehicle_name', 'name'), ('vehicle', 'vehicle_plate_number', 'plate_number'),
+            ('route', 'route_number', 'route_number'), ('product', 'product_name', 'name'),
+        ):
+            if self.wants(name):
+                representation[name] = row[f'{relation}__{attr}'] if row[relation] is not None else 'N/A'
     
     def validate(self, data):
         # Validate stock against vehicle limit
@@ -539,42 +607,28 @@ class DeploymentSerializer(serializers.ModelSerializer):
         
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        try:
-            representation['driver_first_name'] = instance.driver.first_name if instance.driver else 'N/A'
-            representation['driver_last_name'] = instance.driver.last_name if instance.driver else 'N/A'
-        except Exception as e:
-            print(f"Error getting driver info: {e}")
-            representation['driver_first_name'] = 'N/A'
-            representation['driver_last_name'] = 'N/A'
-        
-        try:
-            representation['vehicle_name'] = instance.vehicle.name if instance.vehicle else 'N/A'
-            representation['vehicle_plate_number'] = instance.vehicle.plate_number if instance.vehicle else 'N/A'
-        except Exception as e:
-            print(f"Error getting vehicle info: {e}")
-            representation['vehicle_name'] = 'N/A'
-            representation['vehicle_plate_number'] = 'N/A'
-        
-        try:
-            representation['route_number'] = instance.route.route_number if instance.route else 'N/A'
-            representation['municipality_names'] = self.get_municipality_names(instance)
-            representation['barangay_names'] = self.get_barangay_names(instance)
-        except Exception as e:
-            print(f"Error getting route info: {e}")
-            representation['route_number'] = 'N/A'
-            representation['municipality_names'] = 'N/A'
-            representation['barangay_names'] = 'N/A'
-        
-        try:
-            representation['product_name'] = instance.product.name if instance.product else 'N/A'
-        except Exception as e:
-            print(f"Error getting product info: {e}")
-            representation['product_name'] = 'N/A'
+        # The method fields were already computed by super(); the rest get 'N/A' when unset
+        derived = {
+            'driver_first_name': lambda: instance.driver.first_name if instance.driver else 'N/A',
+            'driver_last_name': lambda: instance.driver.last_name if instance.driver else 'N/A',
+            'vehicle_name': lambda: instance.vehicle.name if instance.vehicle else 'N/A',
+            'vehicle_plate_number': lambda: instance.vehicle.plate_number if instance.vehicle else 'N/A',
+            'route_number': lambda: instance.route.route_number if instance.route else 'N/A',
+            'product_name': lambda: instance.product.name if instance.product else 'N/A',
+        }
+        for name, value in derived.items():
+            if not self.wants(name):
+                continue
+            try:
+                representation[name] = value()
+            except Exception as e:
+                print(f"Error getting {name}: {e}")
+                representation[name] = 'N/A'
         
         return representation
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     product_price = serializers.DecimalField(source='product.price', max_digits=10, decimal_places=2, read_only=True)
     customer_name = serializers.CharField(source='customer.user.username', read_only=True)
@@ -590,6 +644,10 @@ class OrderSerializer(serializers.ModelSerializer):
             'created_at','quantity','free_items','total_quantity','total_amount'
         ]
         read_only_fields = ['created_at', 'free_items', 'total_quantity', 'total_amount']
+        read_paths = {
+            'total_quantity': ['quantity', 'free_items'],
+            'total_amount': ['product__price', 'quantity'],
+        }
         extra_kwargs = {
             'customer': {'required': False}
         }
@@ -602,6 +660,15 @@ class OrderSerializer(serializers.ModelSerializer):
             return float(obj.product.price) * obj.quantity
         return 0.0
 
+    # .values() row versions of the method fields (core.api.fastlist)
+    def values_total_quantity(self, row):
+        return row['quantity'] + row['free_items']
+
+    def values_total_amount(self, row):
+        if row['product'] is not None and row['product__price']:
+            return float(row['product__price']) * row['quantity']
+        return 0.0
+
     def create(self, validated_data):
         customer = validated_data.get('customer')
         product = validated_data.get('product')
@@ -618,7 +685,7 @@ class OrderSerializer(serializers.ModelSerializer):
         
         return order
 
-class DeliverySerializer(serializers.ModelSerializer):
+class DeliverySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     def is_valid(self, raise_exception=False):
         print(f"Serializer is_valid called with data: {self.initial_data}")
         result = super().is_valid(raise_exception=raise_exception)
@@ -666,6 +733,25 @@ class DeliverySerializer(serializers.ModelSerializer):
             parts = [full_address, barangay, municipality]
             return ', '.join([part for part in parts if part])
         return None
+
+    # .values() row versions of the method fields (core.api.fastlist)
+    def values_order_total_quantity(self, row):
+        return row['order__quantity'] + row['order__free_items']
+
+    def values_order_total_amount(self, row):
+        if row['order__product'] is not None and row['order__product__price']:
+            return float(row['order__product__price']) * row['order__quantity']
+        return 0.0
+
+    def values_customer_address(self, row):
+        if row['order__customer'] is None or row['order__customer__address'] is None:
+            return None
+        parts = [
+            row['order__customer__address__full_address'],
+            row['order__customer__address__barangay__name'] or '',
+            row['order__customer__address__barangay__municipality__name'] or '',
+        ]
+        return ', '.join([part for part in parts if part])
     
     def update(self, instance, validated_data):
         # Handle delivered quantity update
@@ -690,16 +776,36 @@ class DeliverySerializer(serializers.ModelSerializer):
     class Meta:
         model = Delivery
         fields = [
-            'id','order','order_id','order_product_name','order_product_price','order_quantity','order_free_items','order_total_quantity','order_total_amount','driver','driver_username','driver_first_name','driver_last_name','driver_phone','vehicle','vehicle_name','route','route_number','status','customer_first_name','customer_last_name','customer_address','customer_phone','delivered_quantity','returned_containers','delivered_at','created_at','updated_at'
+            'id','order','order_id','order_product_name','order_product_price','order_quantity','order_free_items','order_total_quantity','order_total_amount','driver','driver_username','driver_first_name','driver_last_name','driver_phone','vehicle','vehicle_name','route','route_number','status','customer_first_name','customer_last_name','customer_address','customer_phone','delivered_quantity','returned_containers','stop_sequence','delivered_at','created_at','updated_at'
         ]
-        read_only_fields = ['delivered_at','created_at','updated_at']
+        read_only_fields = ['stop_sequence','delivered_at','created_at','updated_at']
+        read_paths = {
+            'order_total_quantity': ['order__quantity', 'order__free_items'],
+            'order_total_amount': ['order__product__price', 'order__quantity'],
+            'customer_address': [
+                'order__customer__address__full_address',
+                'order__customer__address__barangay__name',
+                'order__customer__address__barangay__municipality__name',
+            ],
+        }
     
     def validate_eta_minutes(self, value):
         if value < 0:
             raise serializers.ValidationError("ETA cannot be negative.")
         return value
 
-class CancelledOrderSerializer(serializers.ModelSerializer):
+class DeliveryStatusChangeSerializer(serializers.Serializer):
+    """One queued status change in a bulk delivery sync request"""
+    key = serializers.CharField(max_length=64)
+    delivery = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=Delivery.STATUS_CHOICES)
+    delivered_quantity = serializers.IntegerField(required=False, allow_null=True, min_value=0)
+    returned_containers = serializers.IntegerField(required=False, allow_null=True, min_value=0)
+    # When the change was made on the device, and the delivery's updated_at the device last saw
+    captured_at = serializers.DateTimeField(required=False, allow_null=True)
+    base_updated_at = serializers.DateTimeField(required=False, allow_null=True)
+
+class CancelledOrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     order_id = serializers.IntegerField(source='order.id', read_only=True)
     customer_name = serializers.CharField(source='order.customer.user.username', read_only=True)
     total_amount = serializers.DecimalField(source='order.total_amount', max_digits=10, decimal_places=2, read_only=True)
@@ -709,7 +815,7 @@ class CancelledOrderSerializer(serializers.ModelSerializer):
         fields = ['id', 'order', 'order_id', 'customer_name', 'total_amount', 'reason', 'cancelled_at', 'cancelled_by']
         read_only_fields = ['cancelled_at']
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user_username = serializers.CharField(source='user.user.username', read_only=True)
     
     class Meta:
@@ -717,7 +823,7 @@ class NotificationSerializer(serializers.ModelSerializer):
         fields = ['id','user','user_username','type','message','sent_at']
         read_only_fields = ['sent_at']
 
-class OrderHistorySerializer(serializers.ModelSerializer):
+class OrderHistorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     updated_by_name = serializers.CharField(source='updated_by.user.username', read_only=True)
     
     class Meta:
@@ -725,7 +831,7 @@ class OrderHistorySerializer(serializers.ModelSerializer):
         fields = ['id', 'order', 'status', 'timestamp', 'updated_by', 'updated_by_name']
         read_only_fields = ['timestamp']
 
-class ActivityLogSerializer(serializers.ModelSerializer):
+class ActivityLogSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     actor_username = serializers.CharField(source='actor.user.username', read_only=True)
     actor_first_name = serializers.CharField(source='actor.first_name', read_only=True, allow_blank=True, allow_null=True)
     actor_last_name = serializers.CharField(source='actor.last_name', read_only=True, allow_blank=True, allow_null=True)
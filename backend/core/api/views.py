@@ -2,25 +2,35 @@ from rest_framework import viewsets, views, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework.exceptions import PermissionDenied, NotFound
-from django.db.models import Sum, Count, F, Q
+from rest_framework.exceptions import APIException, PermissionDenied, NotFound
+from django.db import transaction
+from django.db.models import Sum, Q
 from django.utils import timezone
 from datetime import timedelta
 from core.models import Product, Order, Delivery, Profile, Notification, OrderHistory, CancelledOrder
 from core.models import ActivityLog, Municipality, Barangay, Address, WalkInOrder, Route, Vehicle, Deployment, User
+from core.models import DailySales, CustomerSales, SyncTombstone
 from .serializers import (
     ProductSerializer, OrderSerializer, DeliverySerializer, ProfileSerializer, NotificationSerializer,
     ActivityLogSerializer, OrderHistorySerializer, CancelledOrderSerializer,
     MunicipalitySerializer, BarangaySerializer, AddressSerializer, WalkInOrderSerializer, RouteSerializer, VehicleSerializer, DeploymentSerializer
 )
 from .permissions import IsRole
+from core.services import inventory, activity
+from .sync import SETTLE_SECONDS, is_delta_request, delta_response
+from .idempotency import idempotent
+from .prefetch import PrefetchPlanMixin, apply_plan, plan_for
+from .authentication import load_profile
+from .caching import ReferenceCacheMixin
+from .fastlist import FastListMixin
 
 
 
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ReferenceCacheMixin, PrefetchPlanMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all().order_by('name')
+    reference_models = (Product,)
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated]
     
@@ -30,8 +40,9 @@ class ProductViewSet(viewsets.ModelViewSet):
             return [IsAuthenticated(), IsRole('admin')]
         return [IsAuthenticated()]
 
-class MunicipalityViewSet(viewsets.ModelViewSet):
+class MunicipalityViewSet(ReferenceCacheMixin, PrefetchPlanMixin, viewsets.ModelViewSet):
     queryset = Municipality.objects.all().order_by('name')
+    reference_models = (Municipality,)
     serializer_class = MunicipalitySerializer
     permission_classes = [IsAuthenticated]
     
@@ -44,8 +55,9 @@ class MunicipalityViewSet(viewsets.ModelViewSet):
             return [IsAuthenticated(), IsRole('admin')]
         return [IsAuthenticated()]
 
-class BarangayViewSet(viewsets.ModelViewSet):
+class BarangayViewSet(ReferenceCacheMixin, PrefetchPlanMixin, viewsets.ModelViewSet):
     queryset = Barangay.objects.select_related('municipality').all().order_by('name')
+    reference_models = (Barangay, Municipality)
     serializer_class = BarangaySerializer
     permission_classes = [IsAuthenticated]
     pagination_class = None  # Disable pagination for barangays
@@ -66,7 +78,7 @@ class BarangayViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(municipality=municipality)
         return queryset
 
-class AddressViewSet(viewsets.ModelViewSet):
+class AddressViewSet(PrefetchPlanMixin, viewsets.ModelViewSet):
     queryset = Address.objects.select_related('barangay', 'barangay__municipality').all()
     serializer_class = AddressSerializer
     permission_classes = [IsAuthenticated]
@@ -77,7 +89,7 @@ class AddressViewSet(viewsets.ModelViewSet):
             return [IsAuthenticated(), IsRole('admin')]
         return [IsAuthenticated()]
 
-class WalkInOrderViewSet(viewsets.ModelViewSet):
+class WalkInOrderViewSet(PrefetchPlanMixin, viewsets.ModelViewSet):
     queryset = WalkInOrder.objects.select_related('product').all().order_by('-created_at')
     serializer_class = WalkInOrderSerializer
     permission_classes = [IsAuthenticated]
@@ -88,12 +100,17 @@ class WalkInOrderViewSet(viewsets.ModelViewSet):
             return [IsAuthenticated(), IsRole('admin', 'staff')]
         return [IsAuthenticated()]
     
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+    
     def perform_create(self, serializer):
         # Auto-set the date to now
         serializer.save()
 
-class RouteViewSet(viewsets.ModelViewSet):
-    queryset = Route.objects.prefetch_related('municipalities', 'barangays').all().order_by('route_number')
+class RouteViewSet(ReferenceCacheMixin, PrefetchPlanMixin, viewsets.ModelViewSet):
+    queryset = Route.objects.all().order_by('route_number')  # prefetches come from the serializer's plan
+    reference_models = (Route, Route.municipalities.through, Route.barangays.through, Municipality, Barangay)
     serializer_class = RouteSerializer
     permission_classes = [IsAuthenticated]
     
@@ -135,8 +152,9 @@ class RouteViewSet(viewsets.ModelViewSet):
         if barangays:
             route.barangays.set(barangays)
 
-class VehicleViewSet(viewsets.ModelViewSet):
+class VehicleViewSet(ReferenceCacheMixin, PrefetchPlanMixin, viewsets.ModelViewSet):
     queryset = Vehicle.objects.all().order_by('name')
+    reference_models = (Vehicle,)
     serializer_class = VehicleSerializer
     permission_classes = [IsAuthenticated]
     
@@ -146,7 +164,7 @@ class VehicleViewSet(viewsets.ModelViewSet):
             return [IsAuthenticated(), IsRole('admin')]
         return [IsAuthenticated()]
 
-class CustomerViewSet(viewsets.ModelViewSet):
+class CustomerViewSet(PrefetchPlanMixin, viewsets.ModelViewSet):
     queryset = Profile.objects.filter(role='customer')
     serializer_class = ProfileSerializer
     permission_classes = [IsAuthenticated]
@@ -164,6 +182,7 @@ class CustomerViewSet(viewsets.ModelViewSet):
         # Admin and staff can see all customers
         return queryset
     
+    @idempotent
     def create(self, request, *args, **kwargs):
         # Validate required fields
         username = request.data.get('username', '').strip()
@@ -380,6 +399,7 @@ class CustomerViewSet(viewsets.ModelViewSet):
         })
     
     @action(detail=False, methods=['post'])
+    @idempotent
     def return_containers(self, request):
         """Allow customers to return outstanding containers"""
         if not hasattr(request.user, 'profile') or request.user.profile.role != 'customer':
@@ -436,8 +456,7 @@ class CustomerViewSet(viewsets.ModelViewSet):
             
             # Log the container return
             try:
-                from core.models import ActivityLog
-                ActivityLog.objects.create(
+                activity.log(
                     actor=customer,
                     action="container_return",
                     entity="customer",
@@ -455,7 +474,7 @@ class CustomerViewSet(viewsets.ModelViewSet):
         })
 
 
-class StaffViewSet(viewsets.ModelViewSet):
+class StaffViewSet(PrefetchPlanMixin, viewsets.ModelViewSet):
     queryset = Profile.objects.select_related('user').filter(role='staff')
     serializer_class = ProfileSerializer
     permission_classes = [IsAuthenticated]
@@ -471,6 +490,7 @@ class StaffViewSet(viewsets.ModelViewSet):
             return Profile.objects.all()
         return Profile.objects.select_related('user').filter(role='staff')
     
+    @idempotent
     def create(self, request, *args, **kwargs):
         print(f"DEBUG: StaffViewSet.create called with request.data: {request.data}")
         print(f"DEBUG: Request data type: {type(request.data)}")
@@ -516,7 +536,7 @@ class StaffViewSet(viewsets.ModelViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class DriverViewSet(viewsets.ModelViewSet):
+class DriverViewSet(PrefetchPlanMixin, viewsets.ModelViewSet):
     queryset = Profile.objects.select_related('user').filter(role='driver')
     serializer_class = ProfileSerializer
     permission_classes = [IsAuthenticated]
@@ -538,6 +558,7 @@ class DriverViewSet(viewsets.ModelViewSet):
             return Profile.objects.all()
         return Profile.objects.select_related('user').filter(role='driver')
     
+    @idempotent
     def create(self, request, *args, **kwargs):
         # Prepare data for serializer - don't modify the data directly
         serializer_data = request.data.dict() if hasattr(request.data, 'dict') else dict(request.data)
@@ -571,10 +592,12 @@ class DriverViewSet(viewsets.ModelViewSet):
         
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(FastListMixin, PrefetchPlanMixin, viewsets.ModelViewSet):
     queryset = Order.objects.select_related('product', 'customer__user').all()
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    keyset_fields = ('created_at', 'id')  # ?cursor= switches to keyset pagination
+    fast_list = True  # list from .values() rows (core.api.fastlist)
     
     def get_permissions(self):
         # Admin can manage everything; staff can create/view/update orders; customers can only view their own orders
@@ -600,6 +623,10 @@ class OrderViewSet(viewsets.ModelViewSet):
         # Staff and admin can see all orders
         return Order.objects.all()
     
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+    
     def perform_create(self, serializer):
         # If customer is not specified and user is customer, auto-assign
         customer_id = self.request.data.get('customer')
@@ -616,13 +643,21 @@ class OrderViewSet(viewsets.ModelViewSet):
             # Save without customer (will be associated with current user)
             serializer.save()
 
-class ActivityLogViewSet(viewsets.ReadOnlyModelViewSet):
+class ActivityLogViewSet(PrefetchPlanMixin, viewsets.ReadOnlyModelViewSet):
     queryset = ActivityLog.objects.select_related('actor__user').order_by('-timestamp')
     serializer_class = ActivityLogSerializer
     permission_classes = [IsAuthenticated]
+    keyset_fields = ('timestamp', 'id')  # ?cursor= switches to keyset pagination
     
     def get_queryset(self):
         queryset = super().get_queryset()
+        # ?days=N bounds the time range, so PostgreSQL only scans the recent monthly partitions
+        days = self.request.query_params.get('days')
+        if days is not None and self.action != 'retrieve':
+            try:
+                queryset = queryset.filter(timestamp__gte=timezone.now() - timedelta(days=max(int(days), 1)))
+            except ValueError:
+                pass
         # Admin can see all activity logs
         if hasattr(self.request.user, 'profile') and self.request.user.profile.role == 'admin':
             return queryset
@@ -638,18 +673,36 @@ class ActivityLogViewSet(viewsets.ReadOnlyModelViewSet):
     
     @action(detail=False, methods=['get'])
     def my_logs(self, request):
-        """Get activity logs for the current user"""
+        """
+        Get activity logs for the current user, paginated.
+        With ?since=<token> only logs written since the last sync are returned (see core.api.sync).
+        """
         if not hasattr(request.user, 'profile'):
             return Response({'error': 'User profile not found'}, status=404)
         
         logs = self.get_queryset().filter(actor=request.user.profile)
-        serializer = self.get_serializer(logs, many=True)
-        return Response(serializer.data)
+        if is_delta_request(request):
+            # Logs are timestamped when the event happens but written by the buffered writer,
+            # so hold back one flush interval on top of the usual settle time
+            settle = activity.writer.flush_interval + SETTLE_SECONDS
+            return delta_response(self, request, logs, ('timestamp', 'id'), settle_seconds=settle)
+        
+        page = self.paginate_queryset(logs)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
-class OrderHistoryViewSet(viewsets.ReadOnlyModelViewSet):
+    @action(detail=False, methods=['get'], url_path='writer-stats')
+    def writer_stats(self, request):
+        """Counters of the background activity log writer (admin only)"""
+        if not hasattr(request.user, 'profile') or request.user.profile.role != 'admin':
+            raise PermissionDenied('Only admin can view writer stats')
+        return Response(activity.writer.stats())
+
+class OrderHistoryViewSet(PrefetchPlanMixin, viewsets.ReadOnlyModelViewSet):
     queryset = OrderHistory.objects.select_related('order', 'updated_by__user')
     serializer_class = OrderHistorySerializer
     permission_classes = [IsAuthenticated]
+    keyset_fields = ('timestamp', 'id')  # ?cursor= switches to keyset pagination
     
     def get_permissions(self):
         return [IsAuthenticated(), IsRole('admin')]
@@ -667,10 +720,12 @@ class OrderHistoryViewSet(viewsets.ReadOnlyModelViewSet):
             
         return queryset
 
-class DeliveryViewSet(viewsets.ModelViewSet):
-    queryset = Delivery.objects.select_related('order','driver','vehicle','route')
+class DeliveryViewSet(FastListMixin, PrefetchPlanMixin, viewsets.ModelViewSet):
+    queryset = Delivery.objects.all()  # joins come from the serializer's plan
     serializer_class = DeliverySerializer
     permission_classes = [IsAuthenticated]
+    keyset_fields = ('created_at', 'id')  # ?cursor= switches to keyset pagination
+    fast_list = True  # list from .values() rows (core.api.fastlist)
     
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -704,7 +759,7 @@ class DeliveryViewSet(viewsets.ModelViewSet):
             # Print details of all deliveries for this driver
             all_driver_deliveries = queryset.filter(driver=driver_profile)
             for delivery in all_driver_deliveries:
-                print(f"Delivery ID: {delivery.id}, Status: {delivery.status}, Order ID: {delivery.order.id}")
+                print(f"Delivery ID: {delivery.id}, Status: {delivery.status}, Order ID: {delivery.order_id}")
             
             return result
         # Staff can see all deliveries that are not queued
@@ -728,7 +783,10 @@ class DeliveryViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'], url_path='my-deliveries')
     def my_deliveries(self, request):
-        """Get deliveries for the current user (customer or driver)"""
+        """
+        Get deliveries for the current user (customer or driver), paginated.
+        With ?since=<token> only deliveries changed since the last sync are returned (see core.api.sync).
+        """
         if not hasattr(request.user, 'profile'):
             return Response({'error': 'User profile not found'}, status=404)
         
@@ -736,30 +794,32 @@ class DeliveryViewSet(viewsets.ModelViewSet):
             # Handle customer requests
             if request.user.profile.role == 'customer':
                 # Get deliveries for orders placed by this customer
-                deliveries = Delivery.objects.select_related(
-                    'order', 'order__product', 'driver', 'vehicle', 'route'
-                ).filter(
+                deliveries = Delivery.objects.filter(
                     order__customer=request.user.profile
                 ).order_by('-created_at')
-                
-                serializer = self.get_serializer(deliveries, many=True)
-                return Response(serializer.data)
             
             # Handle driver requests
             elif request.user.profile.role == 'driver':
                 # Get deliveries assigned to this driver (including completed ones)
-                deliveries = Delivery.objects.select_related(
-                    'order', 'order__product', 'order__customer', 'order__customer__user', 'vehicle', 'route'
-                ).filter(
+                deliveries = Delivery.objects.filter(
                     driver=request.user.profile
                 ).order_by('-created_at')
-                
-                serializer = self.get_serializer(deliveries, many=True)
-                return Response(serializer.data)
             
             else:
                 return Response({'error': 'Only customers and drivers can access their deliveries'}, status=403)
+            
+            # Joins and columns come from DeliverySerializer's plan (core.api.prefetch)
+            deliveries = self.plan_queryset(deliveries, extra_columns=('updated_at',))
+            if is_delta_request(request):
+                removed = SyncTombstone.objects.filter(profile=request.user.profile, entity='delivery')
+                return delta_response(self, request, deliveries, ('updated_at', 'id'), tombstones=removed)
+            
+            page = self.paginate_queryset(deliveries)
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
                 
+        except APIException:
+            raise
         except Exception as e:
             return Response({'error': str(e)}, status=500)
     
@@ -904,17 +964,65 @@ class DeliveryViewSet(viewsets.ModelViewSet):
             traceback.print_exc()
             raise
     
+    @action(detail=False, methods=['post'])
+    def sync(self, request):
+        """
+        Apply a driver's queued offline status changes in one transaction:
+        {"changes": [{"key", "delivery", "status", "delivered_quantity", "returned_containers",
+        "captured_at", "base_updated_at"}, ...]}. Returns a result per change plus the current
+        state of every delivery involved (see core.services.delivery_sync).
+        """
+        from core.services import delivery_sync
+        from .serializers import DeliveryStatusChangeSerializer
+        
+        if not hasattr(request.user, 'profile') or request.user.profile.role not in ['admin', 'driver']:
+            raise PermissionDenied('Only drivers and admins can sync deliveries')
+        
+        changes = request.data.get('changes') if isinstance(request.data, dict) else None
+        if not isinstance(changes, list):
+            return Response({'error': 'changes must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(changes) > delivery_sync.MAX_BATCH_SIZE:
+            return Response(
+                {'error': f'At most {delivery_sync.MAX_BATCH_SIZE} changes per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Validate each change on its own so one malformed entry doesn't reject the batch
+        valid, invalid = [], {}
+        for index, item in enumerate(changes):
+            serializer = DeliveryStatusChangeSerializer(data=item)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                invalid[index] = serializer.errors
+        
+        applied, deliveries = delivery_sync.apply_changes(request.user.profile, [change for _, change in valid])
+        results = [None] * len(changes)
+        for (index, _), result in zip(valid, applied):
+            results[index] = result
+        for index, errors in invalid.items():
+            item = changes[index] if isinstance(changes[index], dict) else {}
+            results[index] = {'key': item.get('key'), 'delivery': item.get('delivery'), 'result': 'invalid', 'errors': errors}
+        
+        profile = request.user.profile
+        touched = sorted(
+            pk for pk in {r['delivery'] for r in applied}
+            if pk in deliveries and (profile.role == 'admin' or deliveries[pk].driver_id == profile.id)
+        )
+        return Response({
+            'results': results,
+            'deliveries': self.get_serializer([deliveries[pk] for pk in touched], many=True).data,
+        })
+    
     @action(detail=False, methods=['post'])
     def auto_dispatch(self, request):
         if not hasattr(request.user, 'profile') or request.user.profile.role != 'admin':
             raise PermissionDenied('Only admins can auto-dispatch deliveries')
         
-        deliveries = Delivery.objects.filter(status='queued').select_related('order__customer')
-        for idx, d in enumerate(deliveries.order_by('order__customer__address')):
-            d.route_index = idx
-            d.status = 'assigned'
-            d.save()
-        return Response({'assigned': deliveries.count()})
+        # Group open deliveries by route, load them onto the route's deployed vehicles
+        # and store each vehicle's stop order
+        from core.services import routing
+        return Response(routing.auto_dispatch())
 
 class ReportViewSet(views.APIView):
     permission_classes = [IsAuthenticated]
@@ -923,108 +1031,51 @@ class ReportViewSet(views.APIView):
         return [IsAuthenticated(), IsRole('admin')]
     
     def get(self, request):
-        # Only include delivered orders in sales data
-        # Note: Orders don't have a status field, so we need to join with Delivery
-        delivered_orders = Delivery.objects.filter(status='delivered').select_related('order')
-        order_ids = [delivery.order.id for delivery in delivered_orders]
-        
-        # Get sales data from regular orders
-        order_sales = Order.objects.filter(
-            id__in=order_ids
-        ).values('created_at__date').annotate(
-            total=Sum(F('product__price') * F('quantity')), orders=Count('id')
-        ).order_by('-created_at__date')[:30]
-        
-        # Get sales data from walk-in orders
-        walkin_sales = WalkInOrder.objects.values('created_at__date').annotate(
-            total=Sum(F('product__price') * F('quantity')), orders=Count('id')
-        ).order_by('-created_at__date')[:30]
-        
-        # Combine sales data from both regular orders and walk-in orders
-        combined_sales = {}
-        
-        # Add regular order sales
-        for s in order_sales:
-            date_val = s.get('created_at__date')
-            date_key = date_val.isoformat() if date_val else None
-            if date_key:
-                if date_key not in combined_sales:
-                    combined_sales[date_key] = {'total': 0, 'orders': 0}
-                combined_sales[date_key]['total'] += float(s.get('total') or 0)
-                combined_sales[date_key]['orders'] += int(s.get('orders') or 0)
-        
-        # Add walk-in order sales
-        for s in walkin_sales:
-            date_val = s.get('created_at__date')
-            date_key = date_val.isoformat() if date_val else None
-            if date_key:
-                if date_key not in combined_sales:
-                    combined_sales[date_key] = {'total': 0, 'orders': 0}
-                combined_sales[date_key]['total'] += float(s.get('total') or 0)
-                combined_sales[date_key]['orders'] += int(s.get('orders') or 0)
-        
-        # Convert combined sales to list format for frontend
+        # Sales figures come from the DailySales/CustomerSales rollups, which are
+        # maintained as deliveries are completed and walk-in orders are saved
+        today = timezone.localdate()
+        start_of_week = today - timedelta(days=today.weekday())
+        start_of_month = today.replace(day=1)
+        
+        # Last 30 days with sales, both channels combined
         sales_list = []
-        for date_key, data in combined_sales.items():
+        for s in DailySales.objects.values('date').annotate(
+            day_total=Sum('total'), day_orders=Sum('orders')
+        ).filter(day_orders__gt=0).order_by('-date')[:30]:
             sales_list.append({
-                'created_at__date': date_key,
-                'total': data['total'],
-                'orders': data['orders']
+                'created_at__date': s['date'].isoformat(),
+                'total': float(s['day_total'] or 0),
+                'orders': int(s['day_orders'] or 0)
             })
-        
-        # Sort by date descending and limit to 30
-        sales_list.sort(key=lambda x: x['created_at__date'], reverse=True)
-        sales_list = sales_list[:30]
 
         # Get products with outstanding container returns
         # This query finds products where delivered containers > returned containers
         to_be_returned = []
         # Since we don't have container tracking in the current model, we'll skip this for now
         
-        # Note: Orders don't have a status field, so we need to join with Delivery
-        delivered_orders = Delivery.objects.filter(status='delivered').select_related('order')
-        order_ids = [delivery.order.id for delivery in delivered_orders]
-        
-        top_customers = Order.objects.filter(
-            id__in=order_ids
-        ).values(
-            'customer__user__username',
-            'customer__first_name',
-            'customer__last_name'
-        ).annotate(spend=Sum(F('product__price') * F('quantity'))).order_by('-spend')[:10]
-        today = timezone.now().date()
-        start_of_week = today - timedelta(days=today.weekday())
-        start_of_month = today.replace(day=1)
-
-        def aggregate_total(start_date):
-            # Note: Orders don't have a status field, so we need to join with Delivery
-            delivered_orders = Delivery.objects.filter(status='delivered', order__created_at__date__gte=start_date).select_related('order')
-            order_ids = [delivery.order.id for delivery in delivered_orders]
-            
-            # Calculate revenue from regular orders
-            order_revenue = Order.objects.filter(id__in=order_ids).aggregate(total=Sum(F('product__price') * F('quantity')))['total'] or 0
-            
-            # Calculate revenue from walk-in orders
-            walkin_revenue = WalkInOrder.objects.filter(created_at__date__gte=start_date).aggregate(total=Sum(F('product__price') * F('quantity')))['total'] or 0
-            
-            return float(order_revenue) + float(walkin_revenue)
+        top_customers = [
+            {
+                'customer__user__username': c.customer.user.username,
+                'customer__first_name': c.customer.first_name,
+                'customer__last_name': c.customer.last_name,
+                'spend': c.spend
+            }
+            for c in CustomerSales.objects.select_related('customer__user').filter(orders__gt=0).order_by('-spend')[:10]
+        ]
 
-        # Note: Orders don't have a status field, so we need to join with Delivery
-        delivered_today_orders = Delivery.objects.filter(status='delivered', order__created_at__date=today).select_related('order')
-        today_order_ids = [delivery.order.id for delivery in delivered_today_orders]
+        def aggregate_total(start_date, end_date=None, channel=None, field='total'):
+            rows = DailySales.objects.filter(date__gte=start_date)
+            if end_date:
+                rows = rows.filter(date__lte=end_date)
+            if channel:
+                rows = rows.filter(channel=channel)
+            return rows.aggregate(value=Sum(field))['value'] or 0
         
-        # Calculate today's revenue including walk-in orders
-        today_order_revenue = Order.objects.filter(id__in=today_order_ids).aggregate(total=Sum(F('product__price') * F('quantity')))['total'] or 0
-        today_walkin_revenue = WalkInOrder.objects.filter(created_at__date=today).aggregate(total=Sum(F('product__price') * F('quantity')))['total'] or 0
-        today_total_revenue = float(today_order_revenue) + float(today_walkin_revenue)
-        
-        # Get total orders for the current week
-        delivered_week_orders = Delivery.objects.filter(status='delivered', order__created_at__date__gte=start_of_week).select_related('order')
-        week_order_ids = [delivery.order.id for delivery in delivered_week_orders]
-        total_orders = Order.objects.filter(id__in=week_order_ids).count()
+        # Get total delivered orders for the current week
+        total_orders = int(aggregate_total(start_of_week, channel='delivery', field='orders'))
         
         revenue_summary = {
-            'today': today_total_revenue,
+            'today': float(aggregate_total(today, today)),
             'week': float(aggregate_total(start_of_week)),
             'month': float(aggregate_total(start_of_month)),
         }
@@ -1033,7 +1084,7 @@ class ReportViewSet(views.APIView):
         recent_deliveries = Delivery.objects.filter(
             status='delivered'
         ).select_related(
-            'order', 'driver', 'vehicle'
+            'order', 'driver__user', 'vehicle'
         ).order_by('-order__created_at')[:10]
         
         recent_deliveries_data = []
@@ -1063,49 +1114,12 @@ class ReportViewSet(views.APIView):
         if not hasattr(request.user, 'profile') or request.user.profile.role != 'admin':
             raise PermissionDenied('Only admin can export data')
         
-        # Get delivered orders
-        delivered_orders = Order.objects.filter(status='delivered').select_related(
-            'customer__user', 'product'
-        )
-        
-        # Prepare data for CSV
-        csv_data = []
-        csv_data.append([
-            'Order ID', 'Customer', 'Product', 'Quantity', 'Price', 'Total', 'Date'
-        ])
-        
-        for order in delivered_orders:
-            customer_name = f"{order.customer.first_name} {order.customer.last_name}".strip()
-            if not customer_name:
-                customer_name = order.customer.user.username
-            
-            csv_data.append([
-                order.id,
-                customer_name,
-                order.product.name if order.product else 'N/A',
-                order.quantity,
-                float(order.product.price) if order.product else 0,
-                float(order.product.price * order.quantity) if order.product else 0,
-                order.created_at.strftime('%Y-%m-%d %H:%M:%S')
-            ])
-        
-        # Convert to CSV string
-        import csv
-        import io
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerows(csv_data)
-        csv_string = output.getvalue()
-        output.close()
-        
-        # Return CSV as response
-        from django.http import HttpResponse
-        response = HttpResponse(csv_string, content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="delivered_orders.csv"'
-        return response
+        # Stream the CSV straight from the database cursor
+        from .export import export_delivered_orders_response
+        return export_delivered_orders_response()
 
 
-class CancelledOrderViewSet(viewsets.ReadOnlyModelViewSet):
+class CancelledOrderViewSet(PrefetchPlanMixin, viewsets.ReadOnlyModelViewSet):
     queryset = CancelledOrder.objects.select_related('order', 'order__customer__user', 'cancelled_by__user')
     serializer_class = CancelledOrderSerializer
     permission_classes = [IsAuthenticated]
@@ -1113,7 +1127,7 @@ class CancelledOrderViewSet(viewsets.ReadOnlyModelViewSet):
     def get_permissions(self):
         return [IsAuthenticated(), IsRole('admin')]
 
-class ProfileViewSet(viewsets.ReadOnlyModelViewSet):
+class ProfileViewSet(PrefetchPlanMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Profile.objects.all()
     serializer_class = ProfileSerializer
     permission_classes = [IsAuthenticated]
@@ -1125,6 +1139,7 @@ class ProfileViewSet(viewsets.ReadOnlyModelViewSet):
 class UsersViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
     
+    @idempotent
     def create(self, request):
         # Determine the appropriate endpoint based on the role in the request data
         # Handle both DRF Request objects and standard Django HttpRequest objects
@@ -1227,7 +1242,7 @@ class UsersViewSet(viewsets.ViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
+class NotificationViewSet(PrefetchPlanMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Notification.objects.all().order_by('-sent_at')
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
@@ -1247,7 +1262,8 @@ class MeView(views.APIView):
                 {'error': 'Profile not found'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
-        return Response(ProfileSerializer(request.user.profile).data)
+        queryset = apply_plan(Profile.objects.all(), plan_for(ProfileSerializer), load_only=True)
+        return Response(ProfileSerializer(load_profile(request.user, queryset)).data)
 
     def patch(self, request):
         if not hasattr(request.user, 'profile'):
@@ -1255,15 +1271,16 @@ class MeView(views.APIView):
                 {'error': 'Profile not found'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
-        profile = request.user.profile
+        profile = load_profile(request.user)  # saved whole, with its user
         serializer = ProfileSerializer(profile, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
         serializer.save()
         return Response(serializer.data)
 
-class DeploymentViewSet(viewsets.ModelViewSet):
-    queryset = Deployment.objects.select_related('driver', 'vehicle', 'route', 'product').prefetch_related('route__municipalities').order_by('-created_at')
+class DeploymentViewSet(FastListMixin, PrefetchPlanMixin, viewsets.ModelViewSet):
+    queryset = Deployment.objects.order_by('-created_at')  # joins come from the serializer's plan
     serializer_class = DeploymentSerializer
+    fast_list = True  # list from .values() rows (core.api.fastlist)
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
@@ -1284,6 +1301,7 @@ class DeploymentViewSet(viewsets.ModelViewSet):
             return [IsAuthenticated(), IsRole('admin', 'staff')]
         return [IsAuthenticated()]
     
+    @idempotent
     def create(self, request, *args, **kwargs):
         try:
             print(f"Deployment create request data: {request.data}")
@@ -1323,7 +1341,7 @@ class DeploymentViewSet(viewsets.ModelViewSet):
             routes_with_barangay = Route.objects.filter(barangays=customer_barangay)
             
             # Get deployments for these routes (exclude returned and completed)
-            deployments = Deployment.objects.select_related('driver', 'vehicle', 'route', 'product').filter(route__in=routes_with_barangay).exclude(status__in=['returned', 'completed']).order_by('-created_at')
+            deployments = Deployment.objects.select_related('driver', 'vehicle', 'route', 'product').prefetch_related('route__municipalities', 'route__barangays').filter(route__in=routes_with_barangay).exclude(status__in=['returned', 'completed']).order_by('-created_at')
             
             serializer = self.get_serializer(deployments, many=True)
             return Response({
@@ -1346,7 +1364,6 @@ class DeploymentViewSet(viewsets.ModelViewSet):
         
         # Create activity log
         try:
-            from core.models import ActivityLog
             user_profile = getattr(self.request.user, 'profile', None)
             print(f"User profile for activity log: {user_profile}")
             if user_profile:
@@ -1366,13 +1383,12 @@ class DeploymentViewSet(viewsets.ModelViewSet):
                     meta_data["product_id"] = getattr(deployment.product, 'id', None)
                 
                 print(f"Creating activity log with meta: {meta_data}")
-                activity_log = ActivityLog.objects.create(
+                activity.log(
                     actor=user_profile,
                     action="deployment_created",
                     entity="deployment",
                     meta=meta_data
                 )
-                print(f"Activity log created successfully: {activity_log.id}")
             else:
                 print("No user profile found, skipping activity log creation")
         except Exception as e:
@@ -1381,18 +1397,27 @@ class DeploymentViewSet(viewsets.ModelViewSet):
             traceback.print_exc()
     
     def perform_update(self, serializer):
-        # Save the deployment
-        deployment = serializer.save()
-        
-        # Automatically change status to completed when stock reaches zero
-        # This ensures deployments with zero stock appear in history
-        if deployment.stock == 0 and deployment.status == 'active':
-            deployment.status = 'completed'
-            deployment.save()
+        user_profile = getattr(self.request.user, 'profile', None)
+        with transaction.atomic():
+            # Lock the row so a delivery completing at the same time can't be overwritten,
+            # and apply the changes to the freshly locked copy (only changed columns are written)
+            serializer.instance = Deployment.objects.select_for_update().get(pk=serializer.instance.pk)
+            stock_before = serializer.instance.stock
+            
+            # Save the deployment
+            deployment = serializer.save()
+            
+            # Automatically change status to completed when stock reaches zero
+            # This ensures deployments with zero stock appear in history
+            if deployment.stock == 0 and deployment.status == 'active':
+                deployment.status = 'completed'
+                deployment.save(update_fields=['status'])
+            
+            if deployment.stock != stock_before:
+                inventory.record_adjustment(deployment, deployment.stock - stock_before, user_profile)
         
         # Create activity log
         try:
-            from core.models import ActivityLog
             user_profile = getattr(self.request.user, 'profile', None)
             if user_profile:
                 meta_data = {
@@ -1411,7 +1436,7 @@ class DeploymentViewSet(viewsets.ModelViewSet):
                 if hasattr(deployment, 'product') and deployment.product:
                     meta_data["product_id"] = getattr(deployment.product, 'id', None)
                 
-                ActivityLog.objects.create(
+                activity.log(
                     actor=user_profile,
                     action="deployment_updated",
                     entity="deployment",
@@ -1423,7 +1448,6 @@ class DeploymentViewSet(viewsets.ModelViewSet):
     def perform_destroy(self, instance):
         # Create activity log before deleting
         try:
-            from core.models import ActivityLog
             user_profile = getattr(self.request.user, 'profile', None)
             if user_profile:
                 meta_data = {
@@ -1441,7 +1465,7 @@ class DeploymentViewSet(viewsets.ModelViewSet):
                 if hasattr(instance, 'product') and instance.product:
                     meta_data["product_id"] = getattr(instance.product, 'id', None)
                 
-                ActivityLog.objects.create(
+                activity.log(
                     actor=user_profile,
                     action="deployment_deleted",
                     entity="deployment",
@@ -1495,7 +1519,7 @@ class DeploymentViewSet(viewsets.ModelViewSet):
             routes_with_barangay = Route.objects.filter(barangays=customer_barangay)
             
             # Get deployments for these routes (exclude returned and completed)
-            deployments = Deployment.objects.select_related('driver', 'vehicle', 'route', 'product').filter(route__in=routes_with_barangay).exclude(status__in=['returned', 'completed']).order_by('-created_at')
+            deployments = Deployment.objects.select_related('driver', 'vehicle', 'route', 'product').prefetch_related('route__municipalities', 'route__barangays').filter(route__in=routes_with_barangay).exclude(status__in=['returned', 'completed']).order_by('-created_at')
             
             serializer = self.get_serializer(deployments, many=True)
             return Response({
@@ -1517,14 +1541,15 @@ class DeploymentViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Only drivers can access their deployment'}, status=status.HTTP_403_FORBIDDEN)
         
         try:
-            # Get the most recent deployment for this driver (exclude returned and completed)
-            deployment = Deployment.objects.select_related('driver', 'vehicle', 'route', 'product').prefetch_related('route__municipalities', 'route__barangays').filter(driver=request.user.profile).exclude(status__in=['returned', 'completed']).latest('created_at')
+            # Get the most recent active deployment for this driver (not returned or completed)
+            deployment = Deployment.objects.select_related('driver', 'vehicle', 'route', 'product').prefetch_related('route__municipalities', 'route__barangays').filter(driver=request.user.profile, status='active').latest('created_at')
             serializer = self.get_serializer(deployment)
             return Response(serializer.data)
         except Deployment.DoesNotExist:
             return Response({'error': 'No deployment found for this driver'}, status=status.HTTP_404_NOT_FOUND)
     
     @action(detail=True, methods=['post'], url_path='return')
+    @idempotent
     def return_deployment(self, request, pk=None):
         """Mark a deployment as returned"""
         try:
@@ -1561,7 +1586,6 @@ class DeploymentViewSet(viewsets.ModelViewSet):
             print(f"DEBUG: Deployment after save - returned_containers: {deployment.returned_containers}")            
             # Create activity log
             try:
-                from core.models import ActivityLog
                 meta_data = {
                     "deployment_id": deployment.id,
                     "stock": deployment.stock,
@@ -1582,7 +1606,7 @@ class DeploymentViewSet(viewsets.ModelViewSet):
                 if hasattr(deployment, 'product') and deployment.product:
                     meta_data["product_id"] = getattr(deployment.product, 'id', None)
                 
-                ActivityLog.objects.create(
+                activity.log(
                     actor=user_profile,
                     action="deployment_returned",
                     entity="deployment",
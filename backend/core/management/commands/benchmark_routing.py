@@ -0,0 +1,68 @@
+import random
+import time
+from collections import defaultdict
+from django.core.management.base import BaseCommand
+from core.services import routing
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the route planner on a synthetic day of deliveries (no database needed)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--deliveries', type=int, default=5000)
+        parser.add_argument('--routes', type=int, default=20)
+        parser.add_argument('--barangays-per-route', type=int, default=25)
+        parser.add_argument('--vehicles-per-route', type=int, default=3)
+        parser.add_argument('--stock-limit', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        routes = options['routes']
+        per_route = options['barangays_per_route']
+
+        # Barangays scattered around one municipality centre per route
+        barangays = {}
+        route_barangays = defaultdict(list)
+        for r in range(routes):
+            centre_lat, centre_lng = 14.5 + rng.uniform(-0.3, 0.3), 121.0 + rng.uniform(-0.3, 0.3)
+            for b in range(per_route):
+                barangay_id = r * per_route + b + 1
+                barangays[barangay_id] = (r, centre_lat + rng.uniform(-0.05, 0.05), centre_lng + rng.uniform(-0.05, 0.05))
+                route_barangays[r].append(barangay_id)
+
+        jobs_by_route = defaultdict(list)
+        for delivery_id in range(1, options['deliveries'] + 1):
+            r = rng.randrange(routes)
+            jobs_by_route[r].append(routing.Job(delivery_id, rng.choice(route_barangays[r]), rng.randint(1, 10), None, None))
+        slots_by_route = {
+            r: [routing.Slot(r * 100 + v, r * 100 + v, options['stock_limit']) for v in range(options['vehicles_per_route'])]
+            for r in range(routes)
+        }
+
+        dist = routing.DistanceMatrix(barangays)
+        started = time.perf_counter()
+        assignments, unassigned = routing.plan(jobs_by_route, slots_by_route, dist)
+        elapsed = time.perf_counter() - started
+
+        # Compare the planned stop order against visiting stops in barangay id order
+        planned = naive = 0.0
+        for r, route_assignments in assignments.items():
+            by_vehicle = defaultdict(list)
+            for a in sorted(route_assignments, key=lambda a: a.sequence):
+                by_vehicle[a.vehicle_id].append(a.delivery_id)
+            barangay_of = {j.delivery_id: j.barangay_id for j in jobs_by_route[r]}
+            for deliveries in by_vehicle.values():
+                stops = list(dict.fromkeys(barangay_of[d] for d in deliveries))
+                planned += routing.tour_length(stops, dist)
+                naive += routing.tour_length(sorted(stops), dist)
+
+        assigned = sum(len(a) for a in assignments.values())
+        waiting = sum(len(u) for u in unassigned.values())
+        self.stdout.write(
+            f'{options["deliveries"]} deliveries, {routes} routes: planned in {elapsed * 1000:.1f} ms; '
+            f'{assigned} loaded, {waiting} over capacity'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Total distance {planned:.1f} km (unordered: {naive:.1f} km)'
+        ))
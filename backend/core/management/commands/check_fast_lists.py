@@ -0,0 +1,94 @@
+import contextlib
+import io
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from core import query_catalog
+
+ROLES = ('admin', 'staff', 'driver', 'customer')
+
+
+class Command(BaseCommand):
+    help = (
+        'Check that list endpoints with fast_list = True return byte-identical responses from '
+        'the .values() path and the serializer path (core.api.fastlist) for every role and a set '
+        'of query variants on the current database, then time both paths. Run '
+        'generate_synthetic_data first for meaningful numbers.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Requests per path in the benchmark')
+        parser.add_argument('--page-size', type=int, default=200, help='Rows per benchmarked page (keyset lists)')
+        parser.add_argument('--skip-benchmark', action='store_true')
+
+    def handle(self, *args, **options):
+        from core.urls import router
+        endpoints = [(prefix, viewset) for prefix, viewset, basename in router.registry
+                     if getattr(viewset, 'fast_list', False)]
+        clients = {role: query_catalog.api_client(role) for role in ROLES}
+        clients = {role: client for role, client in clients.items() if client is not None}
+        if not clients:
+            raise CommandError('No users in the database; run generate_synthetic_data first')
+
+        mismatches = checked = 0
+        for prefix, viewset in endpoints:
+            for role, client in clients.items():
+                for url in self.variants(prefix, viewset):
+                    slow, fast = self.get(client, url, fast=False), self.get(client, url, fast=True)
+                    checked += 1
+                    if (slow.status_code, slow.content) != (fast.status_code, fast.content):
+                        mismatches += 1
+                        self.stdout.write(self.style.ERROR(
+                            f'DIFFERS  {role} {url}: {self.first_difference(slow, fast)}'
+                        ))
+        if mismatches:
+            raise CommandError(f'{mismatches} of {checked} responses differ between the two paths')
+        self.stdout.write(self.style.SUCCESS(f'{checked} responses identical on both paths'))
+
+        if options['skip_benchmark']:
+            return
+        client = clients.get('admin') or next(iter(clients.values()))
+        self.stdout.write(f"\n{'endpoint':<48}{'serializer':>12}{'values()':>12}{'speedup':>9}{'queries':>10}")
+        for prefix, viewset in endpoints:
+            url = f'/api/{prefix}/'
+            if getattr(viewset, 'keyset_fields', None):
+                url += f"?cursor=&page_size={options['page_size']}"
+            slow, slow_queries = self.time(client, url, False, options['iterations'])
+            fast, fast_queries = self.time(client, url, True, options['iterations'])
+            self.stdout.write(
+                f'{url:<48}{slow:>10.1f}ms{fast:>10.1f}ms{slow / fast:>8.1f}x{slow_queries:>5} /{fast_queries:>3}'
+            )
+
+    def variants(self, prefix, viewset):
+        fields = list(viewset.serializer_class().fields)
+        urls = [f'/api/{prefix}/', f'/api/{prefix}/?page=2', f"/api/{prefix}/?fields={','.join(fields[::3])}"]
+        if getattr(viewset, 'keyset_fields', None):
+            urls.append(f'/api/{prefix}/?cursor=&page_size=50')
+        return urls
+
+    def get(self, client, url, fast):
+        with override_settings(FAST_LISTS=fast, QUERY_BUDGET={'MODE': 'off'}):
+            with contextlib.redirect_stdout(io.StringIO()):  # views print debug output
+                return client.get(url)
+
+    def time(self, client, url, fast, iterations):
+        """(median milliseconds per request, queries per request)"""
+        self.get(client, url, fast)  # warm up
+        timings = []
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                self.get(client, url, fast)
+                timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), len(captured.captured_queries)
+
+    @staticmethod
+    def first_difference(slow, fast):
+        if slow.status_code != fast.status_code:
+            return f'status {slow.status_code} vs {fast.status_code}'
+        a, b = slow.content.decode(), fast.content.decode()
+        at = next((i for i, (x, y) in enumerate(zip(a, b)) if x != y), min(len(a), len(b)))
+        return f'at byte {at}: ...{a[max(at - 60, 0):at + 60]}... vs ...{b[max(at - 60, 0):at + 60]}...'
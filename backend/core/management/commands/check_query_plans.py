@@ -0,0 +1,146 @@
+import contextlib
+import io
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from core import query_catalog, synthetic
+from core.services import refdata
+from core.models import Order
+
+DEFAULT_BASELINE = Path(__file__).resolve().parents[2] / 'query_baseline.json'
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a large synthetic dataset in a throwaway test database, record the queries each major '
+        'endpoint issues and their EXPLAIN plans, and compare them with the stored baseline: more '
+        'queries or a new sequential scan is a regression'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=200000)
+        parser.add_argument('--customers', type=int, default=5000)
+        parser.add_argument('--municipalities', type=int, default=20)
+        parser.add_argument('--barangays-per-municipality', type=int, default=25)
+        parser.add_argument('--drivers', type=int, default=50)
+        parser.add_argument('--deployments-per-driver', type=int, default=10)
+        parser.add_argument('--walk-ins', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='Store the current results as the baseline for this database vendor')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Keep the seeded test database for the next run (SQLite: a file next to manage.py)')
+        parser.add_argument('--real-costs', action='store_true',
+                            help='PostgreSQL: keep enable_seqscan on when explaining')
+
+    def handle(self, *args, **options):
+        counts = synthetic.Counts(
+            customers=options['customers'], orders=options['orders'], municipalities=options['municipalities'],
+            barangays_per_municipality=options['barangays_per_municipality'], drivers=options['drivers'],
+            deployments_per_driver=options['deployments_per_driver'], walk_ins=options['walk_ins'],
+        )
+        dataset = {'seed': options['seed'], **vars(counts)}
+
+        if connection.vendor == 'sqlite' and options['keepdb']:
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = str(settings.BASE_DIR / 'query_plans.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            with override_settings(ACTIVITY_LOG_SYNC=True, QUERY_BUDGET={'MODE': 'off'}, DASHBOARD_WORKERS=0):
+                if not Order.objects.exists():
+                    self.stdout.write(f'Seeding {counts.orders} orders, {counts.customers} customers...')
+                    synthetic.generate(counts, seed=options['seed'], batch_size=5000,
+                                       log=lambda m: self.stdout.write(f'  {m}'))
+                results = self.measure(options['real_costs'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        self.compare(results, dataset, Path(options['baseline']), options['update_baseline'])
+
+    def measure(self, real_costs):
+        results = {}
+        clients = {}
+        for name, role, path in query_catalog.ENDPOINTS:
+            if role not in clients:
+                clients[role] = self.client_for(role)
+            client = clients[role]
+            with contextlib.redirect_stdout(io.StringIO()):  # views print debug output
+                client.get(path)  # warm per-process caches (revocations, dispatch index)
+                cache.clear()  # but measure the database work behind cached reference data
+                refdata.local.clear()
+                with CaptureQueriesContext(connection) as captured:
+                    response = client.get(path)
+            plans = []
+            scans = set()
+            for query in captured.captured_queries:
+                if not query['sql'].lstrip().upper().startswith('SELECT'):
+                    continue
+                plan = query_catalog.explain_sql(query['sql'], real_costs=real_costs)
+                plans.append(query_catalog.plan_shape(plan))
+                scans.update(query_catalog.sequential_scans(plan))
+            results[name] = {
+                'status': response.status_code,
+                'queries': len(captured.captured_queries),
+                'seq_scans': sorted(scans),
+                'plans': plans,
+            }
+            self.stdout.write(f"  {name}: {response.status_code}, {len(captured.captured_queries)} queries")
+
+        ids = query_catalog.sample_ids()
+        for shape in query_catalog.CATALOG:
+            plan, scans = query_catalog.explain_shape(shape, ids, real_costs=real_costs)
+            results[f'catalog:{shape.name}'] = {'seq_scans': scans, 'plans': [query_catalog.plan_shape(plan)]}
+        return results
+
+    def client_for(self, role):
+        client = query_catalog.api_client(role)
+        if client is None:
+            raise CommandError(f'No {role} in the test database')
+        return client
+
+    def compare(self, results, dataset, path, update):
+        vendor = connection.vendor
+        stored = json.loads(path.read_text()) if path.exists() else {}
+        if update:
+            stored[vendor] = {'dataset': dataset, 'results': results}
+            path.write_text(json.dumps(stored, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Baseline for {vendor} written to {path}'))
+            return
+        if vendor not in stored:
+            raise CommandError(f'No {vendor} baseline in {path}; run with --update-baseline first')
+        baseline = stored[vendor]
+        if baseline['dataset'] != dataset:
+            self.stdout.write(self.style.WARNING(
+                f"Baseline was recorded with a different dataset ({baseline['dataset']}); counts may not compare"
+            ))
+
+        failures = []
+        for name, result in results.items():
+            before = baseline['results'].get(name)
+            if 'status' in result and result['status'] >= 400:
+                failures.append(f"{name}: HTTP {result['status']}")
+            if before is None:
+                self.stdout.write(f'new       {name} (not in the baseline)')
+                continue
+            if 'queries' in result and result['queries'] > before['queries']:
+                failures.append(f"{name}: {result['queries']} queries (baseline {before['queries']})")
+            new_scans = set(result['seq_scans']) - set(before['seq_scans'])
+            if new_scans:
+                failures.append(f"{name}: new sequential scan of {', '.join(sorted(new_scans))}")
+            if result['plans'] != before['plans']:
+                self.stdout.write(f'changed   {name}: plan shape differs from the baseline')
+            if 'queries' in result and result['queries'] < before['queries']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"improved  {name}: {result['queries']} queries (baseline {before['queries']})"
+                ))
+
+        if failures:
+            for failure in failures:
+                self.stdout.write(self.style.ERROR(f'REGRESSED {failure}'))
+            raise CommandError(f'{len(failures)} query regressions against the {vendor} baseline')
+        self.stdout.write(self.style.SUCCESS(f'{len(results)} endpoints and query shapes match the {vendor} baseline'))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from core import query_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN on the app's hot query shapes (core.query_catalog) and report the ones "
+        'that read a table with a sequential scan instead of an index'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Only these catalog entries (default: all)')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan, not only failing ones')
+        parser.add_argument('--real-costs', action='store_true',
+                            help='PostgreSQL: keep enable_seqscan on, so plans reflect the current table sizes')
+        parser.add_argument('--fail', action='store_true', help='Exit with an error when any sequential scan is found')
+
+    def handle(self, *args, **options):
+        shapes = query_catalog.CATALOG
+        if options['names']:
+            known = {shape.name for shape in shapes}
+            unknown = set(options['names']) - known
+            if unknown:
+                raise CommandError(f"Unknown query shapes: {', '.join(sorted(unknown))}")
+            shapes = [shape for shape in shapes if shape.name in options['names']]
+
+        ids = query_catalog.sample_ids()
+        flagged = []
+        for shape in shapes:
+            plan, scans = query_catalog.explain_shape(shape, ids, real_costs=options['real_costs'])
+            if scans:
+                flagged.append(shape.name)
+                self.stdout.write(self.style.WARNING(f"SEQ SCAN  {shape.name}: {', '.join(scans)}  ({shape.description})"))
+            else:
+                self.stdout.write(f'ok        {shape.name}')
+            if scans or options['verbose_plans']:
+                for line in plan.splitlines():
+                    self.stdout.write(f'          {line}')
+
+        if not flagged:
+            self.stdout.write(self.style.SUCCESS(f'{len(shapes)} query shapes use indexes'))
+        elif options['fail']:
+            raise CommandError(f"Sequential scans in {len(flagged)} query shapes: {', '.join(flagged)}")
+        else:
+            self.stdout.write(self.style.WARNING(f'{len(flagged)} of {len(shapes)} query shapes use sequential scans'))
@@ -0,0 +1,51 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from core import synthetic
+from core.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a large synthetic dataset (customers, orders with deliveries, deployments, walk-ins) '
+        'with bulk inserts, for benchmarks and load tests. The same --seed gives the same data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=10000)
+        parser.add_argument('--orders', type=int, default=300000)
+        parser.add_argument('--walk-ins', type=int, default=50000)
+        parser.add_argument('--drivers', type=int, default=50)
+        parser.add_argument('--staff', type=int, default=5)
+        parser.add_argument('--deployments-per-driver', type=int, default=30)
+        parser.add_argument('--municipalities', type=int, default=20)
+        parser.add_argument('--barangays-per-municipality', type=int, default=25)
+        parser.add_argument('--days', type=int, default=365, help='Spread timestamps over this many days before today')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default='synth', help='Prefix of generated usernames and names')
+        parser.add_argument('--signals', action='store_true',
+                            help='Send post_save for generated orders and deployments so the app creates '
+                                 'deliveries, activity logs and events itself (much slower)')
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username=f"{options['prefix']}_admin_1").exists():
+            raise CommandError(f"Data with prefix '{options['prefix']}' already exists; pass another --prefix")
+
+        counts = synthetic.Counts(
+            customers=options['customers'], orders=options['orders'], walk_ins=options['walk_ins'],
+            drivers=options['drivers'], staff=options['staff'],
+            deployments_per_driver=options['deployments_per_driver'],
+            municipalities=options['municipalities'],
+            barangays_per_municipality=options['barangays_per_municipality'], days=options['days'],
+        )
+        started = time.perf_counter()
+
+        def log(message):
+            self.stdout.write(f'[{time.perf_counter() - started:7.1f}s] {message}')
+
+        synthetic.generate(counts, seed=options['seed'], batch_size=options['batch_size'],
+                           prefix=options['prefix'], log=log, signals=options['signals'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {counts.orders} orders, {counts.walk_ins} walk-ins and {counts.customers} customers '
+            f'in {time.perf_counter() - started:.1f}s (login as {options["prefix"]}_admin_1 / {synthetic.PASSWORD})'
+        ))
@@ -0,0 +1,46 @@
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core.services import activity_partitions as partitions
+
+
+class Command(BaseCommand):
+    help = (
+        'Maintain the monthly activity log partitions: create upcoming ones, and archive months '
+        'past the retention period to compressed JSONL with per-day action counts'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-months', type=int,
+                            default=getattr(settings, 'ACTIVITY_LOG_RETENTION_MONTHS', 6),
+                            help='Months kept in the database, including the current one')
+        parser.add_argument('--months-ahead', type=int, default=2,
+                            help='Future months to create partitions for (PostgreSQL)')
+        parser.add_argument('--archive-dir',
+                            default=getattr(settings, 'ACTIVITY_LOG_ARCHIVE_DIR', settings.BASE_DIR / 'archive' / 'activity'))
+        parser.add_argument('--dry-run', action='store_true', help='Only list the months that would be archived')
+
+    def handle(self, *args, **options):
+        storage = partitions.get_storage()
+        keep_months = max(options['keep_months'], 1)
+        cutoff = partitions.add_months(partitions.month_start(timezone.now()), 1 - keep_months)
+
+        if not options['dry_run']:
+            for month in storage.ensure(months_ahead=options['months_ahead']):
+                self.stdout.write(f'Prepared period {month:%Y-%m}')
+
+        expired = [month for month in storage.periods() if month < cutoff]
+        if not expired:
+            self.stdout.write(f'Nothing older than {cutoff:%Y-%m} to archive')
+            return
+        if options['dry_run']:
+            for month in expired:
+                self.stdout.write(f'Would archive {month:%Y-%m}')
+            return
+
+        archive_dir = Path(options['archive_dir'])
+        archive_dir.mkdir(parents=True, exist_ok=True)
+        for month in expired:
+            rows, path = partitions.archive(storage, month, archive_dir)
+            self.stdout.write(self.style.SUCCESS(f'Archived {rows} activity logs from {month:%Y-%m} to {path}'))
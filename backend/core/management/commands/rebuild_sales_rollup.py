@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from core.models import DailySales, CustomerSales
+from core.services import sales
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily sales and customer sales rollups from the order history'
+
+    def handle(self, *args, **options):
+        sales.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Rebuilt sales rollup: {DailySales.objects.count()} daily rows, '
+                f'{CustomerSales.objects.count()} customers'
+            )
+        )
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.8 on 2026-10-17 07:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+
+
+def backfill_sales_rollup(apps, schema_editor):
+    Delivery = apps.get_model('core', 'Delivery')
+    WalkInOrder = apps.get_model('core', 'WalkInOrder')
+    DailySales = apps.get_model('core', 'DailySales')
+    CustomerSales = apps.get_model('core', 'CustomerSales')
+
+    delivered = Delivery.objects.filter(status='delivered', order__product__isnull=False)
+    DailySales.objects.bulk_create([
+        DailySales(date=row['order__created_at__date'], product_id=row['order__product'], channel='delivery',
+                   orders=row['orders'], quantity=row['units'] or 0, total=row['total'] or 0)
+        for row in delivered.values('order__created_at__date', 'order__product').annotate(
+            orders=Count('id'), units=Sum('order__quantity'),
+            total=Sum(F('order__product__price') * F('order__quantity')),
+        )
+    ], batch_size=1000)
+    DailySales.objects.bulk_create([
+        DailySales(date=row['created_at__date'], product_id=row['product'], channel='walk_in',
+                   orders=row['orders'], quantity=row['units'] or 0, total=row['total'] or 0)
+        for row in WalkInOrder.objects.values('created_at__date', 'product').annotate(
+            orders=Count('id'), units=Sum('quantity'),
+            total=Sum(F('product__price') * F('quantity')),
+        )
+    ], batch_size=1000)
+    CustomerSales.objects.bulk_create([
+        CustomerSales(customer_id=row['order__customer'], orders=row['orders'], spend=row['spend'] or 0)
+        for row in delivered.filter(order__customer__isnull=False).values('order__customer').annotate(
+            orders=Count('id'), spend=Sum(F('order__product__price') * F('order__quantity')),
+        )
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0038_walkinorder_returned_containers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orders', models.IntegerField(default=0)),
+                ('spend', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='core.profile')),
+            ],
+            options={
+                'verbose_name_plural': 'Customer sales',
+                'indexes': [models.Index(fields=['-spend'], name='core_custsales_spend_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('channel', models.CharField(choices=[('delivery', 'Delivery'), ('walk_in', 'Walk-in')], max_length=20)),
+                ('orders', models.IntegerField(default=0)),
+                ('quantity', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Daily sales',
+                'ordering': ['-date'],
+                'unique_together': {('date', 'product', 'channel')},
+            },
+        ),
+        migrations.RunPython(backfill_sales_rollup, reverse_code=migrations.RunPython.noop),
+    ]
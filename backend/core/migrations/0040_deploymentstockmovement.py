@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-17 07:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def open_existing_ledgers(apps, schema_editor):
+    # Start the ledger of existing deployments from their current balance
+    Deployment = apps.get_model('core', 'Deployment')
+    DeploymentStockMovement = apps.get_model('core', 'DeploymentStockMovement')
+    DeploymentStockMovement.objects.bulk_create([
+        DeploymentStockMovement(deployment_id=pk, kind='load', quantity=stock, balance_after=stock)
+        for pk, stock in Deployment.objects.values_list('pk', 'stock').iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0039_dailysales_customersales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeploymentStockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('load', 'Load'), ('delivery', 'Delivery'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('quantity', models.IntegerField()),
+                ('returned_containers', models.IntegerField(default=0)),
+                ('balance_after', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.profile')),
+                ('delivery', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='core.delivery')),
+                ('deployment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='core.deployment')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.RunPython(open_existing_ledgers, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-17 07:40
+
+from django.db import migrations
+from django.db.models import Max
+
+
+def create_deployment_id_sequence(apps, schema_editor):
+    # Sequence-backed deployment IDs (core.services.ids) only exist on PostgreSQL; the name
+    # must match SequenceIdGenerator.sequence_name('deployment_id')
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Deployment = apps.get_model('core', 'Deployment')
+    start = (Deployment.objects.filter(deployment_id__lte=2 ** 53 - 1).aggregate(top=Max('deployment_id'))['top'] or 0) + 1
+    schema_editor.execute(f'CREATE SEQUENCE IF NOT EXISTS core_idgen_deployment_id_seq START WITH {int(start)}')
+
+
+def drop_deployment_id_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP SEQUENCE IF EXISTS core_idgen_deployment_id_seq')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0040_deploymentstockmovement'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_deployment_id_sequence, reverse_code=drop_deployment_id_sequence),
+    ]
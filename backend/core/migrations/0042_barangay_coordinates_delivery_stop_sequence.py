@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-17 07:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0041_deployment_id_sequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='barangay',
+            name='latitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='barangay',
+            name='longitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='delivery',
+            name='stop_sequence',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
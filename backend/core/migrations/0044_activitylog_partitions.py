@@ -0,0 +1,112 @@
+# Generated by Django 5.2.8 on 2026-10-17 07:41
+
+import datetime
+
+from django.db import migrations, models
+from django.utils import timezone
+
+# Monthly partitions created ahead of time; core.services.activity_partitions keeps adding them
+MONTHS_AHEAD = 2
+
+
+def _month_bounds(month):
+    following = datetime.date(month.year + month.month // 12, month.month % 12 + 1, 1)
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.datetime.combine(month, datetime.time.min), tz),
+        timezone.make_aware(datetime.datetime.combine(following, datetime.time.min), tz),
+    )
+
+
+def partition_activitylog(apps, schema_editor):
+    # Native partitioning is PostgreSQL only; elsewhere the table stays as it is
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    execute = schema_editor.execute
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT DISTINCT date_trunc(\'month\', "timestamp" AT TIME ZONE %s)::date FROM core_activitylog',
+            [timezone.get_current_timezone_name()],
+        )
+        months = {row[0] for row in cursor.fetchall()}
+    current = timezone.localdate().replace(day=1)
+    for n in range(MONTHS_AHEAD + 1):
+        index = current.year * 12 + current.month - 1 + n
+        months.add(datetime.date(index // 12, index % 12 + 1, 1))
+
+    execute('ALTER TABLE core_activitylog RENAME TO core_activitylog_old')
+    execute('CREATE TABLE core_activitylog (LIKE core_activitylog_old INCLUDING DEFAULTS) PARTITION BY RANGE ("timestamp")')
+    execute('CREATE TABLE core_activitylog_default PARTITION OF core_activitylog DEFAULT')
+    for month in sorted(months):
+        start, end = _month_bounds(month)
+        execute(
+            f'CREATE TABLE core_activitylog_p{month.year:04d}_{month.month:02d} '
+            f'PARTITION OF core_activitylog FOR VALUES FROM (%s) TO (%s)', [start, end]
+        )
+    execute('INSERT INTO core_activitylog SELECT * FROM core_activitylog_old')
+    execute('DROP TABLE core_activitylog_old')
+    # Identity columns cannot be used on partitioned tables before PostgreSQL 17
+    execute('CREATE SEQUENCE core_activitylog_id_seq OWNED BY core_activitylog.id')
+    execute("SELECT setval('core_activitylog_id_seq', COALESCE((SELECT MAX(id) FROM core_activitylog), 0) + 1, false)")
+    execute("ALTER TABLE core_activitylog ALTER COLUMN id SET DEFAULT nextval('core_activitylog_id_seq')")
+    # Unique constraints on a partitioned table must include the partition key
+    execute('ALTER TABLE core_activitylog ADD PRIMARY KEY (id, "timestamp")')
+    execute(
+        'ALTER TABLE core_activitylog ADD CONSTRAINT core_activitylog_actor_id_fk_core_profile_id '
+        'FOREIGN KEY (actor_id) REFERENCES core_profile (id) DEFERRABLE INITIALLY DEFERRED'
+    )
+    execute('CREATE INDEX core_activitylog_actor_id_idx ON core_activitylog (actor_id)')
+
+
+def unpartition_activitylog(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    execute = schema_editor.execute
+    execute('ALTER TABLE core_activitylog RENAME TO core_activitylog_old')
+    execute('CREATE TABLE core_activitylog (LIKE core_activitylog_old)')
+    execute('INSERT INTO core_activitylog SELECT * FROM core_activitylog_old')
+    execute('DROP TABLE core_activitylog_old CASCADE')
+    execute('CREATE SEQUENCE core_activitylog_id_seq OWNED BY core_activitylog.id')
+    execute("SELECT setval('core_activitylog_id_seq', COALESCE((SELECT MAX(id) FROM core_activitylog), 0) + 1, false)")
+    execute("ALTER TABLE core_activitylog ALTER COLUMN id SET DEFAULT nextval('core_activitylog_id_seq')")
+    execute('ALTER TABLE core_activitylog ADD PRIMARY KEY (id)')
+    execute(
+        'ALTER TABLE core_activitylog ADD CONSTRAINT core_activitylog_actor_id_fk_core_profile_id '
+        'FOREIGN KEY (actor_id) REFERENCES core_profile (id) DEFERRABLE INITIALLY DEFERRED'
+    )
+    execute('CREATE INDEX core_activitylog_actor_id_idx ON core_activitylog (actor_id)')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0043_activitylog_event_timestamp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityDailyCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('action', models.CharField(max_length=64)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-date', 'action'],
+            },
+        ),
+        migrations.RunPython(partition_activitylog, reverse_code=unpartition_activitylog),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['-timestamp', '-id'], name='core_actlog_ts_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['actor', '-timestamp', '-id'], name='core_actlog_actor_ts_id_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='activitydailycount',
+            unique_together={('date', 'action')},
+        ),
+    ]
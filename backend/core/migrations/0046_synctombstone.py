@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-17 07:44
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0045_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(max_length=32)),
+                ('object_id', models.BigIntegerField()),
+                ('removed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.profile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['profile', 'entity', 'removed_at'], name='core_tombstone_profile_idx'), models.Index(fields=['removed_at'], name='core_tombstone_removed_idx')],
+            },
+        ),
+    ]
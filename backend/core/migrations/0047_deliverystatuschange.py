@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-17 07:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0046_synctombstone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryStatusChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64)),
+                ('status', models.CharField(max_length=20)),
+                ('delivered_quantity', models.PositiveIntegerField(blank=True, null=True)),
+                ('returned_containers', models.PositiveIntegerField(blank=True, null=True)),
+                ('captured_at', models.DateTimeField(blank=True, null=True)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('outcome', models.CharField(choices=[('applied', 'Applied'), ('conflict', 'Conflict')], max_length=20)),
+                ('detail', models.CharField(blank=True, max_length=255)),
+                ('delivery', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='status_changes', to='core.delivery')),
+                ('submitted_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.profile')),
+            ],
+            options={
+                'ordering': ['-received_at'],
+                'unique_together': {('submitted_by', 'key')},
+            },
+        ),
+    ]
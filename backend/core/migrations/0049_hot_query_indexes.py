@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-17 07:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0048_idempotencyrecord'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='core_delivery_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['driver', 'status'], name='core_delivery_drv_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deployment',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['driver', 'product', '-created_at'], name='core_deploy_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-sent_at'], name='core_notif_user_sent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['role'], name='core_profile_role_idx'),
+        ),
+    ]
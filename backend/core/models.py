@@ -1,7 +1,73 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 
 
+class TrackedFieldsMixin:
+    """
+    Remembers field values as they were loaded from (or last saved to) the database,
+    so save() can see what changed without re-reading the row.
+
+    Updates of tracked instances write only the changed columns (plus auto_now fields).
+    Values are compared with ==, so in-place changes to mutable values (JSON dicts)
+    are not detected.
+    """
+    _loaded_values = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def _loaded_attnames(self):
+        deferred = self.get_deferred_fields()
+        return [f.attname for f in self._meta.concrete_fields if f.attname not in deferred]
+
+    def _snapshot(self, attnames=None):
+        if self._loaded_values is None:
+            self._loaded_values = {}
+        for attname in attnames or self._loaded_attnames():
+            self._loaded_values[attname] = getattr(self, attname)
+
+    def get_loaded_value(self, field):
+        """Value of `field` (attname) as stored in the database, or None for unsaved objects"""
+        if self.pk is None:
+            return None
+        if self._loaded_values is None or field not in self._loaded_values:
+            # Built by hand rather than loaded: read the stored row once
+            attnames = self._loaded_attnames()
+            stored = type(self)._base_manager.filter(pk=self.pk).values(*attnames).first()
+            self._loaded_values = {**stored, **(self._loaded_values or {})} if stored else {}
+        return self._loaded_values.get(field)
+
+    def get_dirty_fields(self):
+        """{attname: loaded value} for every loaded field whose current value differs"""
+        if self._state.adding or not self._loaded_values:
+            return {}
+        return {
+            attname: old for attname, old in self._loaded_values.items()
+            if getattr(self, attname) != old
+        }
+
+    def has_changed(self, field):
+        return field in self.get_dirty_fields()
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._snapshot(fields and [self._meta.get_field(f).attname for f in fields])
+
+    def save(self, *args, **kwargs):
+        if (not args and kwargs.get('update_fields') is None and not kwargs.get('force_insert')
+                and not self._state.adding and self._loaded_values):
+            dirty = self.get_dirty_fields()
+            if dirty and self._meta.pk.attname not in dirty:
+                auto_now = [f.attname for f in self._meta.concrete_fields if getattr(f, 'auto_now', False)]
+                kwargs['update_fields'] = list(dict.fromkeys([*dirty, *auto_now]))
+        super().save(*args, **kwargs)
+        self._snapshot()
+
+
 class User(AbstractUser):
     pass
 
@@ -19,6 +85,10 @@ class Profile(models.Model):
     last_name = models.CharField(max_length=150, blank=True)
     phone = models.CharField(max_length=30, blank=True)
     address = models.ForeignKey('Address', on_delete=models.SET_NULL, null=True, blank=True)
+
+    class Meta:
+        # Customer/staff/driver lists and the driver pickers filter on role
+        indexes = [models.Index(fields=['role'], name='core_profile_role_idx')]
     
     def __str__(self):
         return f"{self.user.username} ({self.role})"
@@ -32,6 +102,9 @@ class Municipality(models.Model):
 class Barangay(models.Model):
     municipality = models.ForeignKey(Municipality, on_delete=models.CASCADE)
     name = models.CharField(max_length=100)
+    # Optional centre point, used by core.services.routing to order stops
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     
     class Meta:
         unique_together = ('municipality', 'name')
@@ -51,7 +124,7 @@ class Address(models.Model):
     def __str__(self):
         return f"{self.full_address}, {self.barangay}"
 
-class Product(models.Model):
+class Product(TrackedFieldsMixin, models.Model):
     name = models.CharField(max_length=100)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     liters = models.DecimalField(max_digits=5, decimal_places=2, default=1.0)
@@ -59,17 +132,30 @@ class Product(models.Model):
     def __str__(self):
         return self.name
 
-class Order(models.Model):
+class Order(TrackedFieldsMixin, models.Model):
     product = models.ForeignKey(Product, on_delete=models.PROTECT, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     quantity = models.PositiveIntegerField(default=1)
     free_items = models.PositiveIntegerField(default=0)
     customer = models.ForeignKey(Profile, on_delete=models.PROTECT, limit_choices_to={'role':'customer'}, null=True, blank=True)
+
+    class Meta:
+        # Keyset pagination (core.api.pagination) seeks on (created_at, id)
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='core_order_created_id_idx'),
+            models.Index(fields=['customer', '-created_at', '-id'], name='core_order_cust_created_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         # Calculate free items (buy 10 get 1 free)
         self.free_items = self.quantity // 10
+        # Edits of an already delivered order change its sales (core.services.sales)
+        sold = {name: old for name, old in self.get_dirty_fields().items()
+                if name in ('product_id', 'quantity', 'customer_id')}
         super().save(*args, **kwargs)
+        if sold:
+            from core.services.sales import record_order_change
+            record_order_change(self, sold)
 
     @property
     def customer_name(self):
@@ -85,7 +171,16 @@ class WalkInOrder(models.Model):
     def save(self, *args, **kwargs):
         # Calculate free items (buy 10 get 1 free)
         self.free_items = self.quantity // 10
+        
+        # Keep the previous row so the sales rollup can apply the difference
+        old_instance = None
+        if self.pk:
+            old_instance = WalkInOrder.objects.select_related('product').filter(pk=self.pk).first()
+        
         super().save(*args, **kwargs)
+        
+        from core.services.sales import record_walkin
+        record_walkin(self, old_instance)
     
     @property
     def total_quantity(self):
@@ -108,7 +203,7 @@ class Vehicle(models.Model):
     def __str__(self):
         return f"{self.name} ({self.plate_number})"
 
-class Deployment(models.Model):
+class Deployment(TrackedFieldsMixin, models.Model):
     STATUS_CHOICES = [
         ('active', 'Active'),
         ('returned', 'Returned'),
@@ -126,6 +221,14 @@ class Deployment(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
     created_at = models.DateTimeField(auto_now_add=True)
     returned_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # A driver's newest active deployment of a product (core.services.inventory);
+            # only active rows, so the index stays small as deployments pile up
+            models.Index(fields=['driver', 'product', '-created_at'], condition=models.Q(status='active'),
+                         name='core_deploy_active_idx'),
+        ]
     
     def __str__(self):
         return f"Deployment {self.deployment_id}: {self.driver} - {self.vehicle} - {self.route}"
@@ -147,13 +250,9 @@ class Deployment(models.Model):
     def save(self, *args, **kwargs):
         # Generate deployment_id if it's a new deployment
         if not self.deployment_id:
-            # Generate a simple numeric deployment ID
-            from django.utils import timezone
-            import random
-            # Use last 6 digits of timestamp + 3 random digits
-            timestamp_part = int(timezone.now().timestamp()) % 1000000
-            random_part = random.randint(100, 999)
-            self.deployment_id = int(f'{timestamp_part}{random_part}')
+            # Take the next number from the ID generator (sequence or time-ordered, never reused)
+            from core.services.ids import next_id
+            self.deployment_id = next_id('deployment_id', Deployment, 'deployment_id')
             
             # Set initial stock to the current stock when creating a new deployment
             if self.initial_stock is None:
@@ -165,7 +264,35 @@ class Deployment(models.Model):
             self.returned_at = timezone.now()
         
         self.clean()
+        adding = self._state.adding
         super().save(*args, **kwargs)
+        
+        # Open the stock ledger with the loaded stock
+        if adding:
+            from core.services.inventory import record_load
+            record_load(self)
+
+class DeploymentStockMovement(models.Model):
+    """Append-only ledger of changes to a deployment's stock (written by core.services.inventory)"""
+    KIND_CHOICES = [
+        ('load', 'Load'),
+        ('delivery', 'Delivery'),
+        ('adjustment', 'Adjustment')
+    ]
+    deployment = models.ForeignKey(Deployment, on_delete=models.CASCADE, related_name='stock_movements')
+    delivery = models.ForeignKey('Delivery', on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    quantity = models.IntegerField()  # signed change to stock
+    returned_containers = models.IntegerField(default=0)
+    balance_after = models.IntegerField()
+    actor = models.ForeignKey(Profile, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Deployment {self.deployment_id} {self.kind} {self.quantity:+d}"
 
 class OrderHistory(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
@@ -176,6 +303,7 @@ class OrderHistory(models.Model):
     class Meta:
         ordering = ['-timestamp']
         verbose_name_plural = "Order histories"
+        indexes = [models.Index(fields=['-timestamp', '-id'], name='core_orderhist_ts_id_idx')]
     
     def __str__(self):
         return f"Order {self.order.id} - {self.status}"
@@ -194,7 +322,7 @@ class CancelledOrder(models.Model):
     def __str__(self):
         return f"Cancelled Order {self.order.id}"
 
-class Delivery(models.Model):
+class Delivery(TrackedFieldsMixin, models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('assigned', 'Assigned'),
@@ -209,24 +337,29 @@ class Delivery(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     delivered_quantity = models.PositiveIntegerField(null=True, blank=True)
     returned_containers = models.PositiveIntegerField(null=True, blank=True)
+    stop_sequence = models.PositiveIntegerField(null=True, blank=True)  # position in the vehicle's planned route
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     delivered_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        # Keyset pagination (core.api.pagination) seeks on (created_at, id)
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='core_delivery_created_id_idx'),
+            models.Index(fields=['driver', '-created_at', '-id'], name='core_delivery_drv_created_idx'),
+            # Status lists (dispatch queue, staff views) and a driver's open deliveries
+            models.Index(fields=['status', '-created_at', '-id'], name='core_delivery_status_idx'),
+            models.Index(fields=['driver', 'status'], name='core_delivery_drv_status_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         # Ensure delivered_at is set for delivered orders
         print(f"Saving delivery with status: {self.status}, delivered_at: {self.delivered_at}")
         
-        # Check if this is a transition to 'delivered' status
-        old_status = None
-        old_delivered_quantity = None
-        if self.pk:  # This is an update, not a new object
-            try:
-                old_instance = Delivery.objects.get(pk=self.pk)
-                old_status = old_instance.status
-                old_delivered_quantity = old_instance.delivered_quantity
-            except Delivery.DoesNotExist:
-                pass
+        # Check if this is a transition to 'delivered' status (values as loaded, no extra query)
+        old_status = self.get_loaded_value('status')
+        old_delivered_quantity = self.get_loaded_value('delivered_quantity')
+        old_driver_id = self.get_loaded_value('driver_id')
         
         # Handle delivered status transition
         if self.status == 'delivered' and self.delivered_at is None:
@@ -238,60 +371,84 @@ class Delivery(models.Model):
         super().save(*args, **kwargs)
         print(f"Delivery saved with ID: {self.id}, status: {self.status}")
         
+        # The previous driver's app should drop a delivery that was reassigned away from them
+        if old_driver_id and old_driver_id != self.driver_id:
+            from core.services.tombstones import record_removed
+            record_removed('delivery', [(self.id, old_driver_id)])
+        
+        # Keep the daily sales rollup and the dispatch load counters in step
+        if old_status != self.status:
+            from core.services.sales import record_delivery_transition
+            record_delivery_transition(self, old_status)
+            
+            from core.services.dispatch import OPEN_DELIVERY_STATUSES, delivery_closed
+            if old_status in OPEN_DELIVERY_STATUSES and self.status not in OPEN_DELIVERY_STATUSES:
+                delivery_closed(self)
+        
         # Update deployment stock if this is a transition to 'delivered' status
         if (old_status != self.status and self.status == 'delivered') or \
            (self.status == 'delivered' and old_delivered_quantity != self.delivered_quantity):
             print(f"Processing deployment stock update for delivery {self.id}")
-            self.update_deployment_stock()
+            self.update_deployment_stock(rebook=old_status == 'delivered')
 
-    def update_deployment_stock(self):
-        """Update deployment stock when delivery is marked as delivered"""
+    def update_deployment_stock(self, rebook=False):
+        """Update deployment stock when delivery is marked as delivered (or its quantity changes with rebook=True)"""
         # Update deployment stock if driver has a deployment
-        if self.driver and self.order and self.order.product:
+        if self.driver_id and self.order and self.order.product_id:
             try:
-                from core.models import Deployment
-                print(f"Looking for deployment for driver {self.driver.id} and product {self.order.product.id}")
-                # Look for an active deployment for this driver and product, ordered by creation date
-                deployments = Deployment.objects.filter(
-                    driver=self.driver, 
-                    product=self.order.product
-                ).exclude(status__in=['returned', 'completed']).order_by('-created_at')
-                deployment = deployments.first()
-                print(f"Found {deployments.count()} deployments, selected deployment ID: {deployment.id if deployment else 'None'}")
-                if deployment:
-                    # Use delivered_quantity if available, otherwise fallback to order quantity
-                    delivered_quantity = self.delivered_quantity if self.delivered_quantity is not None else self.order.quantity
-                    print(f"Found deployment with stock {deployment.stock}")
-                    if deployment.stock >= delivered_quantity:
-                        deployment.stock -= delivered_quantity
-                        
-                        # Accumulate returned containers in the deployment
-                        if self.returned_containers is not None and self.returned_containers > 0:
-                            if deployment.returned_containers is None:
-                                deployment.returned_containers = 0
-                            deployment.returned_containers += self.returned_containers
-                        
-                        # Automatically change status to completed when stock reaches zero
-                        if deployment.stock == 0:
-                            deployment.status = 'completed'
-                        deployment.save()
-                        print(f"Reduced deployment stock by {delivered_quantity}. New stock: {deployment.stock}")
-                        if self.returned_containers is not None and self.returned_containers > 0:
-                            print(f"Added {self.returned_containers} returned containers to deployment. Total returned: {deployment.returned_containers}")
-                        if deployment.stock == 0:
-                            print(f"Deployment stock reached zero, marked as completed")
-                    else:
-                        print(f"Insufficient stock in deployment. Available: {deployment.stock}, Needed: {delivered_quantity}")
-                        # Don't fail the delivery if stock is insufficient, just log it
+                from core.services import inventory
+                # Use delivered_quantity if available, otherwise fallback to order quantity
+                delivered_quantity = self.delivered_quantity if self.delivered_quantity is not None else self.order.quantity
+                returned_containers = self.returned_containers or 0
+                
+                # Only book the difference when this delivery was already taken from stock
+                already_delivered, already_returned = inventory.delivered_from_stock(self) if rebook else (0, 0)
+                quantity = delivered_quantity - already_delivered
+                returned = max(returned_containers - already_returned, 0)
+                if quantity == 0 and returned == 0:
+                    return
+                
+                movement = inventory.consume_for_delivery(self, quantity, returned)
+                if movement:
+                    print(f"Reduced deployment {movement.deployment_id} stock by {quantity}. New stock: {movement.balance_after}")
+                    if movement.balance_after == 0:
+                        print(f"Deployment stock reached zero, marked as completed")
                 else:
-                    print(f"No deployment found for driver {self.driver.id} and product {self.order.product.id}")
-                    # Don't fail the delivery if no deployment is found, just log it
+                    # Don't fail the delivery if no deployment is found or stock is insufficient, just log it
+                    print(f"No deployment with enough stock for driver {self.driver_id} and product {self.order.product_id} (needed {quantity})")
             except Exception as e:
                 print(f"Error updating deployment stock: {e}")
                 import traceback
                 traceback.print_exc()
                 # Don't fail the delivery if there's an error updating deployment stock, just log it
 
+class DeliveryStatusChange(models.Model):
+    """
+    A delivery status change captured by a driver's app (possibly while offline) and
+    submitted through the bulk sync endpoint; `key` makes resubmissions idempotent
+    """
+    OUTCOME_CHOICES = [
+        ('applied', 'Applied'),
+        ('conflict', 'Conflict')
+    ]
+    key = models.CharField(max_length=64)
+    submitted_by = models.ForeignKey(Profile, on_delete=models.CASCADE)
+    delivery = models.ForeignKey(Delivery, on_delete=models.SET_NULL, null=True, related_name='status_changes')
+    status = models.CharField(max_length=20)
+    delivered_quantity = models.PositiveIntegerField(null=True, blank=True)
+    returned_containers = models.PositiveIntegerField(null=True, blank=True)
+    captured_at = models.DateTimeField(null=True, blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    outcome = models.CharField(max_length=20, choices=OUTCOME_CHOICES)
+    detail = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        unique_together = ('submitted_by', 'key')
+        ordering = ['-received_at']
+
+    def __str__(self):
+        return f"{self.key}: delivery {self.delivery_id} -> {self.status} ({self.outcome})"
+
 class Notification(models.Model):
     TYPE = [('sms','SMS'),('email','Email'),('inapp','In-App')]
     user = models.ForeignKey(Profile, on_delete=models.CASCADE)
@@ -300,15 +457,126 @@ class Notification(models.Model):
     sent_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [models.Index(fields=['user', '-sent_at'], name='core_notif_user_sent_idx')]
+
 class ActivityLog(models.Model):
     actor = models.ForeignKey(Profile, on_delete=models.SET_NULL, null=True)
     action = models.CharField(max_length=64)
     entity = models.CharField(max_length=64)
     meta = models.JSONField(default=dict)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the event happens, not when the buffered writer gets to it (core.services.activity)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         ordering = ['-timestamp']
         verbose_name_plural = "Activity logs"
+        # On PostgreSQL the table is range-partitioned by month on timestamp (core.services.activity_partitions)
+        indexes = [
+            models.Index(fields=['-timestamp', '-id'], name='core_actlog_ts_id_idx'),
+            models.Index(fields=['actor', '-timestamp', '-id'], name='core_actlog_actor_ts_id_idx'),
+        ]
+
+class ActivityDailyCount(models.Model):
+    """Per-day action counts of activity logs that were archived (see the prune_activity_logs command)"""
+    date = models.DateField()
+    action = models.CharField(max_length=64)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('date', 'action')
+        ordering = ['-date', 'action']
+
+    def __str__(self):
+        return f"{self.date} {self.action}: {self.count}"
+
+
+class SyncTombstone(models.Model):
+    """
+    Marks an object as gone for one profile (deleted, or no longer assigned to them), so
+    delta sync clients can drop it (see core.api.sync)
+    """
+    entity = models.CharField(max_length=32)
+    object_id = models.BigIntegerField()
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE)
+    removed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['profile', 'entity', 'removed_at'], name='core_tombstone_profile_idx'),
+            models.Index(fields=['removed_at'], name='core_tombstone_removed_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.entity} {self.object_id} removed for {self.profile_id}"
+
+
+class IdempotencyRecord(models.Model):
+    """Stored response of a POST made with an Idempotency-Key header (see core.api.idempotency)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)  # None while the request is running
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
 
+    class Meta:
+        unique_together = ('user', 'key')
+        indexes = [models.Index(fields=['expires_at'], name='core_idem_expires_idx')]
+
+    def __str__(self):
+        return f"{self.method} {self.path} [{self.key}] -> {self.status_code}"
+
+
+class DailySales(models.Model):
+    """Pre-aggregated sales per day, product and channel (maintained by core.services.sales)"""
+    CHANNEL_CHOICES = [
+        ('delivery', 'Delivery'),
+        ('walk_in', 'Walk-in')
+    ]
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    channel = models.CharField(max_length=20, choices=CHANNEL_CHOICES)
+    orders = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('date', 'product', 'channel')
+        ordering = ['-date']
+        verbose_name_plural = "Daily sales"
+
+    def __str__(self):
+        return f"{self.date} {self.product} ({self.channel}): {self.total}"
 
+class CustomerSales(models.Model):
+    """Lifetime delivered spend per customer (maintained by core.services.sales)"""
+    customer = models.OneToOneField(Profile, on_delete=models.CASCADE)
+    orders = models.IntegerField(default=0)
+    spend = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['-spend'], name='core_custsales_spend_idx')]
+        verbose_name_plural = "Customer sales"
+
+    def __str__(self):
+        return f"{self.customer}: {self.spend}"
+
+class ReferenceVersion(models.Model):
+    """Version of one reference data model's cached responses (maintained by core.services.refdata)"""
+    label = models.CharField(max_length=100, unique=True)
+    version = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.label} v{self.version}"
+
+class IdCounter(models.Model):
+    """Last number handed out for one name (core.services.ids, databases without sequences)"""
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
@@ -0,0 +1,208 @@
+"""
+Catalog of the app's hot query shapes, with EXPLAIN helpers.
+
+Each QueryShape builds the queryset a real code path runs (list endpoints include the
+joins and columns of their serializer's plan, see core.api.prefetch), from sample ids
+taken from the database. explain_shape() returns the database's plan and the tables it
+reads with a sequential scan, so a dropped or unusable index shows up as a named table:
+
+  PostgreSQL  "Seq Scan on core_delivery" (enable_seqscan is turned off for the check by
+              default, so a small development database still shows which indexes are usable)
+  SQLite      "SCAN core_delivery" without "USING ... INDEX"
+
+ENDPOINTS lists the major API endpoints with the role that calls them; together with the
+catalog they make up the baseline of the check_query_plans regression check.
+
+Used by the explain_queries and check_query_plans management commands.
+"""
+import re
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+from core.models import (
+    ActivityLog, Delivery, Deployment, Notification, Order, OrderHistory, Product, Profile, SyncTombstone,
+)
+
+PG_SEQ_SCAN_RE = re.compile(r'Seq Scan on (\w+)')
+PG_COSTS_RE = re.compile(r'\s*\((?:cost|actual)=[^)]*\)')
+SQLITE_SCAN_RE = re.compile(r'\bSCAN (\w+)\b(?! USING)')
+PAGE = 20
+
+
+class QueryShape:
+    def __init__(self, name, build, description=''):
+        self.name = name
+        self.build = build
+        self.description = description
+
+    def queryset(self, ids):
+        return self.build(ids)
+
+
+def _planned(queryset, serializer_class, keyset=('created_at', 'id')):
+    from core.api.prefetch import apply_plan, plan_for
+    return apply_plan(queryset, plan_for(serializer_class), load_only=True, extra_columns=keyset)
+
+
+def _delivery_list(queryset):
+    from core.api.serializers import DeliverySerializer
+    return _planned(queryset, DeliverySerializer).order_by('-created_at', '-id')[:PAGE]
+
+
+def _order_list(queryset):
+    from core.api.serializers import OrderSerializer
+    return _planned(queryset, OrderSerializer).order_by('-created_at', '-id')[:PAGE]
+
+
+def _activity_list(queryset):
+    from core.api.serializers import ActivityLogSerializer
+    since = timezone.now() - timedelta(days=31)
+    return _planned(queryset.filter(timestamp__gte=since), ActivityLogSerializer,
+                    keyset=('timestamp', 'id')).order_by('-timestamp', '-id')[:PAGE]
+
+
+CATALOG = [
+    QueryShape('deliveries.admin_list', lambda ids: _delivery_list(Delivery.objects.all()),
+               'DeliveryViewSet.list for admin'),
+    QueryShape('deliveries.by_status', lambda ids: _delivery_list(Delivery.objects.filter(status='pending')),
+               'Deliveries in one status (dispatch queue)'),
+    QueryShape('deliveries.driver_open', lambda ids: _delivery_list(
+        Delivery.objects.filter(driver_id=ids['driver']).exclude(status__in=['delivered', 'cancelled'])),
+               "DeliveryViewSet.list for a driver: their open deliveries"),
+    QueryShape('deliveries.driver_status', lambda ids: Delivery.objects.filter(
+        driver_id=ids['driver'], status='assigned').values_list('id', flat=True),
+               "A driver's deliveries in one status"),
+    QueryShape('deliveries.customer_list', lambda ids: _delivery_list(
+        Delivery.objects.filter(order__customer_id=ids['customer'])),
+               'my-deliveries for a customer'),
+    QueryShape('orders.admin_list', lambda ids: _order_list(Order.objects.all()),
+               'OrderViewSet.list for admin/staff'),
+    QueryShape('orders.customer_list', lambda ids: _order_list(Order.objects.filter(customer_id=ids['customer'])),
+               'OrderViewSet.list for a customer'),
+    QueryShape('deployments.active_for_driver_product', lambda ids: Deployment.objects.filter(
+        driver_id=ids['driver'], product_id=ids['product'], status='active',
+    ).order_by('-created_at').values_list('pk', 'stock', 'status', 'driver_id')[:1],
+               'inventory.consume_for_delivery: newest active deployment'),
+    QueryShape('deployments.driver_current', lambda ids: Deployment.objects.filter(
+        driver_id=ids['driver'], status='active').order_by('-created_at')[:1],
+               'DeploymentViewSet.my_deployment'),
+    QueryShape('activity.recent', lambda ids: _activity_list(ActivityLog.objects.all()),
+               'ActivityLogViewSet.list'),
+    QueryShape('activity.actor_recent', lambda ids: _activity_list(ActivityLog.objects.filter(actor_id=ids['driver'])),
+               'ActivityLogViewSet.my_logs'),
+    QueryShape('notifications.user_recent', lambda ids: Notification.objects.filter(
+        user_id=ids['customer']).order_by('-sent_at')[:PAGE],
+               "NotificationViewSet.list: a user's latest notifications"),
+    QueryShape('profiles.by_role', lambda ids: Profile.objects.filter(role='driver').order_by('id'),
+               'DriverViewSet.list and driver pickers'),
+    QueryShape('order_history.recent', lambda ids: OrderHistory.objects.order_by('-timestamp', '-id')[:PAGE],
+               'OrderHistoryViewSet.list'),
+    QueryShape('tombstones.since', lambda ids: SyncTombstone.objects.filter(
+        profile_id=ids['driver'], entity='delivery', removed_at__gt=timezone.now() - timedelta(days=1)),
+               'Delta sync: deliveries removed from a driver'),
+]
+
+
+# (name, role of the caller, path)
+ENDPOINTS = [
+    ('orders.list.admin', 'admin', '/api/orders/'),
+    ('orders.list.customer', 'customer', '/api/orders/'),
+    ('deliveries.list.admin', 'admin', '/api/deliveries/'),
+    ('deliveries.list.staff', 'staff', '/api/deliveries/'),
+    ('deliveries.list.driver', 'driver', '/api/deliveries/'),
+    ('deliveries.mine.driver', 'driver', '/api/deliveries/my-deliveries/'),
+    ('deliveries.mine.customer', 'customer', '/api/deliveries/my-deliveries/'),
+    ('deployments.list.admin', 'admin', '/api/deployments/'),
+    ('deployments.mine.driver', 'driver', '/api/deployments/my-deployment/'),
+    ('walk_in_orders.list.staff', 'staff', '/api/walk-in-orders/'),
+    ('activity.list.admin', 'admin', '/api/activity/'),
+    ('activity.mine.driver', 'driver', '/api/activity/my_logs/'),
+    ('order_history.list.admin', 'admin', '/api/order-history/'),
+    ('customers.list.admin', 'admin', '/api/customers/'),
+    ('drivers.list.admin', 'admin', '/api/drivers/'),
+    ('routes.list.admin', 'admin', '/api/routes/'),
+    ('barangays.list.admin', 'admin', '/api/barangays/'),
+    ('notifications.list.customer', 'customer', '/api/notifications/'),
+    ('reports.admin', 'admin', '/api/reports/'),
+    ('me.customer', 'customer', '/api/me/'),
+    ('dashboard.admin', 'admin', '/api/dashboard/'),
+    ('dashboard.staff', 'staff', '/api/dashboard/'),
+    ('dashboard.driver', 'driver', '/api/dashboard/'),
+    ('dashboard.customer', 'customer', '/api/dashboard/'),
+]
+
+
+def api_client(role):
+    """APIClient with a token of a user with `role`; customers and drivers with the newest data"""
+    from rest_framework.test import APIClient
+    from core.api.serializers import MyTokenObtainPairSerializer
+    profile = Profile.objects.filter(role=role).select_related('user')
+    if role in ('customer', 'driver'):
+        field = 'order__created_at' if role == 'customer' else 'delivery__created_at'
+        profile = profile.filter(**{f'{field}__isnull': False}).order_by(f'-{field}')
+    profile = profile.first()
+    if profile is None:
+        return None
+    client = APIClient()
+    token = MyTokenObtainPairSerializer.get_token(profile.user).access_token
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    return client
+
+
+def sample_ids():
+    """Ids to put in the catalog's queries; 0 where the table is empty"""
+    def first(queryset):
+        return queryset.values_list('pk', flat=True).first() or 0
+    return {
+        'driver': first(Profile.objects.filter(role='driver')),
+        'customer': first(Profile.objects.filter(role='customer')),
+        'product': first(Product.objects.all()),
+    }
+
+
+def sequential_scans(plan, vendor=None):
+    """Tables read by a sequential scan in an EXPLAIN output"""
+    vendor = vendor or connection.vendor
+    pattern = PG_SEQ_SCAN_RE if vendor == 'postgresql' else SQLITE_SCAN_RE
+    return sorted(set(pattern.findall(plan)))
+
+
+def plan_shape(plan, vendor=None):
+    """EXPLAIN output without costs, row estimates and conditions, for comparing plans"""
+    vendor = vendor or connection.vendor
+    lines = []
+    for line in plan.splitlines():
+        if vendor == 'postgresql':
+            if ':' in line:
+                continue  # Filter:, Index Cond:, Sort Key: ...
+            line = PG_COSTS_RE.sub('', line).replace('->', '')
+        else:
+            line = re.sub(r'^\d+ \d+ \d+ ', '', line.strip())
+        line = ' '.join(line.split())
+        if line:
+            lines.append(line)
+    return ' | '.join(lines)
+
+
+def explain_sql(sql, real_costs=False):
+    """EXPLAIN of a captured statement (parameters already inlined), as text"""
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql' and not real_costs:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+        rows = cursor.fetchall()
+    if connection.vendor == 'sqlite':
+        return '\n'.join(f'{row[0]} {row[1]} 0 {row[-1]}' for row in rows)
+    return '\n'.join(str(row[0]) for row in rows)
+
+
+def explain_shape(shape, ids, real_costs=False):
+    """(plan text, [tables scanned sequentially]) for one catalog entry"""
+    queryset = shape.queryset(ids)
+    with transaction.atomic():
+        if connection.vendor == 'postgresql' and not real_costs:
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = queryset.explain()
+    return plan, sequential_scans(plan)
@@ -0,0 +1,136 @@
+"""
+Buffered ActivityLog writer.
+
+log() builds the ActivityLog row and hands it to an in-process queue once the current
+transaction commits (immediately outside a transaction). A background thread writes
+the queue with bulk_create whenever ACTIVITY_LOG_BATCH_SIZE rows are waiting or
+ACTIVITY_LOG_FLUSH_INTERVAL seconds have passed, and once more at interpreter exit.
+
+When the queue is full, log() waits up to ACTIVITY_LOG_BLOCK_SECONDS for room and then
+drops the event; both are counted in stats(). Set ACTIVITY_LOG_SYNC = True (e.g. in
+test settings) to write every row immediately instead.
+"""
+import atexit
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from core.models import ActivityLog
+
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_BLOCK_SECONDS = 0.05
+
+
+class ActivityLogWriter:
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 max_queue=DEFAULT_QUEUE_SIZE, block_seconds=DEFAULT_BLOCK_SECONDS):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_seconds = block_seconds
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._stats = {
+            'enqueued': 0, 'written': 0, 'dropped': 0, 'blocked': 0,
+            'flushes': 0, 'errors': 0, 'max_queue_depth': 0,
+        }
+
+    def stats(self):
+        return {**self._stats, 'queue_depth': self._queue.qsize()}
+
+    def _start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='activity-log-writer', daemon=True)
+                self._thread.start()
+
+    def enqueue(self, entry):
+        self._start()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            # Backpressure: give the writer a moment to drain before dropping the event
+            self._stats['blocked'] += 1
+            try:
+                self._queue.put(entry, timeout=self.block_seconds)
+            except queue.Full:
+                self._stats['dropped'] += 1
+                return False
+        self._stats['enqueued'] += 1
+        self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], self._queue.qsize())
+        return True
+
+    def _take_batch(self, timeout):
+        batch = []
+        deadline = time.monotonic() + timeout
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=max(remaining, 0)) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            ActivityLog.objects.bulk_create(batch, batch_size=self.batch_size)
+            self._stats['written'] += len(batch)
+        except Exception as e:
+            self._stats['errors'] += 1
+            print(f"Failed to write {len(batch)} activity logs: {e}")
+        self._stats['flushes'] += 1
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._take_batch(self.flush_interval)
+            if batch:
+                with self._flush_lock:
+                    close_old_connections()
+                    self._write(batch)
+        close_old_connections()
+
+    def flush(self):
+        """Write everything queued so far from the calling thread"""
+        with self._flush_lock:
+            while True:
+                batch = self._take_batch(0)
+                if not batch:
+                    break
+                self._write(batch)
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 1)
+        self.flush()
+
+
+writer = ActivityLogWriter(
+    batch_size=getattr(settings, 'ACTIVITY_LOG_BATCH_SIZE', DEFAULT_BATCH_SIZE),
+    flush_interval=getattr(settings, 'ACTIVITY_LOG_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL),
+    max_queue=getattr(settings, 'ACTIVITY_LOG_QUEUE_SIZE', DEFAULT_QUEUE_SIZE),
+    block_seconds=getattr(settings, 'ACTIVITY_LOG_BLOCK_SECONDS', DEFAULT_BLOCK_SECONDS),
+)
+atexit.register(writer.stop)
+
+
+def log(actor, action, entity, meta=None):
+    """Record an activity log entry; written in the background unless ACTIVITY_LOG_SYNC is set"""
+    entry = ActivityLog(actor=actor, action=action, entity=entity, meta=meta or {}, timestamp=timezone.now())
+    if getattr(settings, 'ACTIVITY_LOG_SYNC', False):
+        entry.save()
+        return entry
+    transaction.on_commit(lambda: writer.enqueue(entry))
+    return entry
@@ -0,0 +1,168 @@
+"""
+Monthly storage periods for ActivityLog.
+
+On PostgreSQL core_activitylog is range-partitioned by timestamp (migration 0044): one
+partition per month, named core_activitylog_pYYYY_MM, plus core_activitylog_default for
+anything outside them. ensure() creates the partitions for the coming months.
+
+SQLite has no partitioning: every row stays in core_activitylog (so the API keeps seeing
+them until they are archived), and a period is simply the month's range of timestamps.
+
+Either way, archive() writes one period to gzip-compressed JSONL, stores its per-day
+action counts in ActivityDailyCount and drops the period (see the prune_activity_logs
+command).
+"""
+import datetime
+import gzip
+import json
+import re
+from collections import Counter
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+from core.models import ActivityLog, ActivityDailyCount
+
+TABLE = ActivityLog._meta.db_table
+PERIOD_TABLE_RE = re.compile(r'^' + TABLE + r'_p(\d{4})_(\d{2})$')
+
+
+def month_start(value):
+    """First day of the month containing `value` (a date or datetime)"""
+    if isinstance(value, datetime.datetime):
+        value = timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    return value.replace(day=1)
+
+
+def add_months(month, n):
+    index = month.year * 12 + month.month - 1 + n
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def period_table(month):
+    return f'{TABLE}_p{month.year:04d}_{month.month:02d}'
+
+
+def period_bounds(month):
+    """Aware datetimes [start, end) of the month"""
+    tz = timezone.get_current_timezone()
+    start = datetime.datetime.combine(month, datetime.time.min)
+    end = datetime.datetime.combine(add_months(month, 1), datetime.time.min)
+    return timezone.make_aware(start, tz), timezone.make_aware(end, tz)
+
+
+class PostgresPartitions:
+    """Native range partitions of core_activitylog"""
+    def periods(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT c.relname FROM pg_inherits i '
+                'JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent '
+                'WHERE p.relname = %s', [TABLE]
+            )
+            names = [row[0] for row in cursor.fetchall()]
+        return sorted(
+            datetime.date(int(m.group(1)), int(m.group(2)), 1)
+            for m in map(PERIOD_TABLE_RE.match, names) if m
+        )
+
+    def ensure(self, months_ahead=2):
+        """
+        Create partitions from the current month through `months_ahead` months from now, and
+        for any month whose rows ended up in the default partition
+        """
+        existing = set(self.periods())
+        current = month_start(timezone.now())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT DISTINCT date_trunc(\'month\', "timestamp" AT TIME ZONE %s)::date FROM "{TABLE}_default"',
+                [timezone.get_current_timezone_name()],
+            )
+            months = {row[0] for row in cursor.fetchall()}
+        months.update(add_months(current, n) for n in range(months_ahead + 1))
+        created = []
+        for month in sorted(months):
+            if month not in existing:
+                self._create(month)
+                created.append(month)
+        return created
+
+    def _create(self, month):
+        table = period_table(month)
+        start, end = period_bounds(month)
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Rows that already landed in the default partition move into the new one, which
+            # is then attached (a plain PARTITION OF would fail on them)
+            cursor.execute(f'CREATE TABLE "{table}" (LIKE "{TABLE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM "{TABLE}_default" WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *) '
+                f'INSERT INTO "{table}" SELECT * FROM moved', [start, end]
+            )
+            cursor.execute(
+                f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{table}" FOR VALUES FROM (%s) TO (%s)', [start, end]
+            )
+
+    def entries(self, month):
+        return ActivityLog.objects.raw(f'SELECT * FROM "{period_table(month)}" ORDER BY "timestamp", "id"')
+
+    def drop(self, month):
+        table = period_table(month)
+        with connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{table}"')
+            cursor.execute(f'DROP TABLE "{table}"')
+
+
+class SingleTable:
+    """Periods as timestamp ranges of the one core_activitylog table"""
+    def periods(self):
+        return sorted({month_start(dt) for dt in ActivityLog.objects.datetimes('timestamp', 'month')})
+
+    def ensure(self, months_ahead=2):
+        return []  # nothing to prepare
+
+    def entries(self, month):
+        start, end = period_bounds(month)
+        return ActivityLog.objects.filter(timestamp__gte=start, timestamp__lt=end).order_by('timestamp', 'id')
+
+    def drop(self, month):
+        start, end = period_bounds(month)
+        ActivityLog.objects.filter(timestamp__gte=start, timestamp__lt=end).delete()
+
+
+def month_day(dt):
+    return timezone.localtime(dt).date() if timezone.is_aware(dt) else dt.date()
+
+
+def get_storage():
+    return PostgresPartitions() if connection.vendor == 'postgresql' else SingleTable()
+
+
+def archive(storage, month, archive_dir):
+    """
+    Write one period to <archive_dir>/activity-YYYY-MM.jsonl.gz, store its per-day action
+    counts and drop it. Returns (rows archived, path).
+    """
+    path = archive_dir / f'activity-{month:%Y-%m}.jsonl.gz'
+    counts = Counter()
+    rows = 0
+    with gzip.open(path, 'wt', encoding='utf-8') as out:
+        for entry in storage.entries(month).iterator():
+            out.write(json.dumps({
+                'id': entry.id,
+                'actor_id': entry.actor_id,
+                'action': entry.action,
+                'entity': entry.entity,
+                'meta': entry.meta,
+                'timestamp': entry.timestamp,
+            }, cls=DjangoJSONEncoder) + '\n')
+            counts[(month_day(entry.timestamp), entry.action)] += 1
+            rows += 1
+
+    with transaction.atomic():
+        # A day lives in exactly one period, so its counts are replaced rather than added to
+        ActivityDailyCount.objects.bulk_create(
+            [ActivityDailyCount(date=day, action=action, count=n) for (day, action), n in counts.items()],
+            update_conflicts=True, unique_fields=['date', 'action'], update_fields=['count'],
+        )
+        storage.drop(month)
+    return rows, path
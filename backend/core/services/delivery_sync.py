@@ -0,0 +1,112 @@
+"""
+Bulk application of delivery status changes queued on drivers' devices.
+
+apply_changes() runs a whole batch in one transaction, each change in its own savepoint
+so a failing change does not undo the others, and reports one result per change:
+
+  applied    saved through Delivery.save (stock ledger, rollups, dispatch counters, activity log)
+  duplicate  the key was submitted before; its stored outcome is repeated and nothing re-runs
+  conflict   the delivery was delivered/cancelled on the server and the change disagrees,
+             or it was edited on the server after the state the device based the change on
+  not_found, forbidden, error
+"""
+from django.db import transaction
+from core.models import Delivery, DeliveryStatusChange
+
+MAX_BATCH_SIZE = 200
+FINAL_STATUSES = ('delivered', 'cancelled')
+
+
+def _conflict(delivery, change, server_updated_at):
+    if delivery.status not in FINAL_STATUSES:
+        # The driver's observation at the door wins over open-state edits made meanwhile
+        return None
+    if change['status'] != delivery.status:
+        return f'Delivery is already {delivery.status}'
+    base = change.get('base_updated_at')
+    if base is not None and server_updated_at > base:
+        return 'Delivery was changed on the server after this change was captured'
+    return None
+
+
+def _apply(delivery, change):
+    delivery.status = change['status']
+    if change.get('delivered_quantity') is not None:
+        delivery.delivered_quantity = change['delivered_quantity']
+    if change.get('returned_containers') is not None:
+        delivery.returned_containers = change['returned_containers']
+    if delivery.status == 'delivered' and delivery.delivered_at is None and change.get('captured_at'):
+        # Record when it was actually delivered, not when the device got signal again
+        delivery.delivered_at = change['captured_at']
+    if delivery.get_dirty_fields():
+        delivery.save()
+
+
+def apply_changes(profile, changes):
+    """
+    Apply validated changes (dicts as produced by DeliveryStatusChangeSerializer) in order on
+    behalf of `profile`. Drivers may only change their own deliveries.
+    Returns (results, {delivery id: Delivery}) with the deliveries in their final state.
+    """
+    keys = [change['key'] for change in changes]
+    delivery_ids = {change['delivery'] for change in changes}
+    results = []
+    with transaction.atomic():
+        submitted = {
+            record.key: record
+            for record in DeliveryStatusChange.objects.filter(submitted_by=profile, key__in=keys)
+        }
+        deliveries = {
+            delivery.id: delivery
+            for delivery in Delivery.objects.select_for_update(of=('self',)).select_related(
+                'order__product', 'order__customer__user', 'order__customer__address__barangay__municipality',
+                'driver__user', 'vehicle', 'route',
+            ).filter(id__in=delivery_ids)
+        }
+        # Compare against updated_at from before this batch, so a device's consecutive changes
+        # to the same delivery don't conflict with each other
+        server_updated_at = {pk: delivery.updated_at for pk, delivery in deliveries.items()}
+        for change in changes:
+            result = {'key': change['key'], 'delivery': change['delivery']}
+            results.append(result)
+
+            previous = submitted.get(change['key'])
+            if previous is not None:
+                result['result'] = 'duplicate'
+                result['outcome'] = previous.outcome
+                if previous.detail:
+                    result['detail'] = previous.detail
+                continue
+
+            delivery = deliveries.get(change['delivery'])
+            if delivery is None:
+                result['result'] = 'not_found'
+                continue
+            if profile.role == 'driver' and delivery.driver_id != profile.id:
+                result['result'] = 'forbidden'
+                continue
+
+            detail = _conflict(delivery, change, server_updated_at[delivery.id])
+            try:
+                with transaction.atomic():
+                    if detail is None:
+                        _apply(delivery, change)
+                    submitted[change['key']] = DeliveryStatusChange.objects.create(
+                        key=change['key'], submitted_by=profile, delivery=delivery,
+                        status=change['status'],
+                        delivered_quantity=change.get('delivered_quantity'),
+                        returned_containers=change.get('returned_containers'),
+                        captured_at=change.get('captured_at'),
+                        outcome='applied' if detail is None else 'conflict',
+                        detail=detail or '',
+                    )
+            except Exception as e:
+                print(f"Error applying synced change {change['key']} to delivery {delivery.id}: {e}")
+                delivery.refresh_from_db()
+                result['result'] = 'error'
+                result['detail'] = str(e)
+                continue
+            result['result'] = 'applied' if detail is None else 'conflict'
+            if detail:
+                result['detail'] = detail
+    return results, deliveries
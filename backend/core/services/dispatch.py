@@ -0,0 +1,134 @@
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from core.models import Deployment, Delivery, Profile
+
+# Deliveries in these states count towards a driver's load and reserve deployment stock
+OPEN_DELIVERY_STATUSES = ('pending', 'assigned', 'in_route')
+
+# Rebuild from the database at least this often, to pick up changes made by other processes
+INDEX_TTL_SECONDS = 60
+
+
+class DispatchIndex:
+    """
+    In-memory index of active deployments by (barangay, product), with each driver's
+    open delivery count and the stock already promised to open deliveries.
+
+    Built from two queries and then kept current in place: assignments and completed
+    deliveries adjust the counters once their transaction commits (a rolled back one leaves
+    them alone); deployment and route changes invalidate it. Units are order quantities,
+    as taken from deployment stock by core.services.inventory.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built_at = None
+        self._deployments = {}              # deployment pk -> (driver_id, product_id)
+        self._by_area = defaultdict(set)    # (barangay_id, product_id) -> {deployment pk}
+        self._stock = Counter()             # (driver_id, product_id) -> stock on active deployments
+        self._load = Counter()              # driver_id -> open deliveries
+        self._reserved = Counter()          # (driver_id, product_id) -> units on open deliveries
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def _ensure_built(self):
+        if self._built_at is not None and time.monotonic() - self._built_at < INDEX_TTL_SECONDS:
+            return
+        deployments = {}
+        by_area = defaultdict(set)
+        stock = Counter()
+        rows = Deployment.objects.filter(status='active').values_list(
+            'pk', 'driver_id', 'product_id', 'stock', 'route__barangays'
+        )
+        for pk, driver_id, product_id, units, barangay_id in rows:
+            if pk not in deployments:  # one row per barangay of the route
+                deployments[pk] = (driver_id, product_id)
+                stock[(driver_id, product_id)] += units
+            if barangay_id is not None:
+                by_area[(barangay_id, product_id)].add(pk)
+
+        load = Counter()
+        reserved = Counter()
+        open_deliveries = Delivery.objects.filter(
+            status__in=OPEN_DELIVERY_STATUSES, driver__isnull=False
+        ).values_list('driver_id', 'order__product_id').annotate(n=Count('id'), units=Sum('order__quantity'))
+        for driver_id, product_id, n, units in open_deliveries:
+            load[driver_id] += n
+            reserved[(driver_id, product_id)] += units or 0
+
+        self._deployments, self._by_area, self._stock = deployments, by_area, stock
+        self._load, self._reserved = load, reserved
+        self._built_at = time.monotonic()
+
+    def _remaining(self, pk):
+        # Reservations are per driver and product, like the stock they are taken from
+        # (core.services.inventory), so compare them with all of that driver's deployments
+        key = self._deployments[pk]
+        return self._stock[key] - self._reserved[key]
+
+    def assign(self, barangay_id, product_id, quantity):
+        """
+        Pick the least-loaded driver whose active deployment covers the barangay and still has
+        `quantity` units of the product, and count the delivery against them. Returns the
+        driver's profile id, or None when no deployment qualifies.
+        """
+        with self._lock:
+            self._ensure_built()
+            candidates = [
+                pk for pk in self._by_area.get((barangay_id, product_id), ())
+                if self._remaining(pk) >= quantity
+            ]
+            if not candidates:
+                return None
+            pk = min(candidates, key=lambda pk: (self._load[self._deployments[pk][0]], -self._remaining(pk), pk))
+            driver_id = self._deployments[pk][0]
+        transaction.on_commit(lambda: self._count(driver_id, product_id, 1, quantity))
+        return driver_id
+
+    def release(self, driver_id, product_id, quantity, delivered_quantity=0):
+        """A delivery left the open states; `delivered_quantity` units left the driver's stock"""
+        transaction.on_commit(lambda: self._count(driver_id, product_id, -1, -quantity, -delivered_quantity))
+
+    def _count(self, driver_id, product_id, deliveries, units, stock=0):
+        with self._lock:
+            if self._built_at is None:
+                return
+            key = (driver_id, product_id)
+            self._load[driver_id] = max(self._load[driver_id] + deliveries, 0)
+            self._reserved[key] = max(self._reserved[key] + units, 0)
+            if stock:
+                self._stock[key] = max(self._stock[key] + stock, 0)
+
+
+index = DispatchIndex()
+
+
+def customer_barangay_id(customer_id):
+    if customer_id is None:
+        return None
+    return Profile.objects.filter(pk=customer_id).values_list('address__barangay_id', flat=True).first()
+
+
+def choose_driver(order):
+    """Driver profile id for a new order, or None to leave the delivery pending"""
+    if not order.product_id:
+        return None
+    barangay_id = customer_barangay_id(order.customer_id)
+    if barangay_id is None:
+        return None
+    return index.assign(barangay_id, order.product_id, order.quantity)
+
+
+def delivery_closed(delivery):
+    """Called when a delivery moves from an open state to delivered or cancelled"""
+    if not delivery.driver_id or not delivery.order.product_id:
+        return
+    delivered = 0
+    if delivery.status == 'delivered':
+        delivered = delivery.delivered_quantity if delivery.delivered_quantity is not None else delivery.order.quantity
+    index.release(delivery.driver_id, delivery.order.product_id, delivery.order.quantity, delivered)
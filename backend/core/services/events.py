@@ -0,0 +1,122 @@
+"""
+In-process publish/subscribe for change events (deliveries, deployments, orders).
+
+Model signals publish a small event once the transaction commits; the SSE endpoint
+(core.api.events) subscribes one queue per connected client and filters events by the
+client's role. The broker is pluggable through settings.EVENTS_BROKER (a dotted path to a
+class with publish(event) and subscribe(loop) -> Subscription); the default
+InProcessBroker only reaches clients connected to the same process, so deployments with
+several ASGI workers should plug in a broker that fans out between them.
+"""
+import asyncio
+import itertools
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Events a slow client has not read yet; further events to it are dropped
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+class Subscription:
+    def __init__(self, broker, loop):
+        self.broker = broker
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.dropped = 0
+
+    def deliver(self, event):
+        # Runs on the subscriber's event loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def get(self, timeout=None):
+        """Next event, or None after `timeout` seconds without one"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._ids = itertools.count(1)
+
+    def subscribe(self, loop):
+        subscription = Subscription(self, loop)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event):
+        """Thread-safe: may be called from sync request threads"""
+        event = {**event, 'id': next(self._ids)}
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # The subscriber's loop has shut down
+                self.unsubscribe(subscription)
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(getattr(settings, 'EVENTS_BROKER', 'core.services.events.InProcessBroker'))()
+    return _broker
+
+
+def publish(kind, action, obj_id, status=None, driver_id=None, customer_id=None, previous_driver_id=None):
+    """
+    Publish a change event. driver_id / customer_id (profile ids) say whose views it
+    concerns; previous_driver_id lets a driver hear about a delivery taken off them.
+    """
+    get_broker().publish({
+        'kind': kind,
+        'action': action,
+        'object_id': obj_id,
+        'status': status,
+        'driver_id': driver_id,
+        'customer_id': customer_id,
+        'previous_driver_id': previous_driver_id,
+    })
+
+
+def visible_to(event, role, profile_id):
+    """Role filtering in line with the viewsets' get_queryset"""
+    if role == 'admin':
+        return True
+    kind = event['kind']
+    if role == 'staff':
+        # Staff see every order and deployment, and every delivery except queued ones
+        return not (kind == 'delivery' and event['status'] == 'queued')
+    if role == 'driver':
+        if kind == 'delivery':
+            return profile_id in (event['driver_id'], event['previous_driver_id'])
+        return kind == 'deployment' and event['driver_id'] == profile_id
+    if role == 'customer':
+        return kind in ('delivery', 'order') and event['customer_id'] == profile_id
+    return False
@@ -0,0 +1,141 @@
+"""
+Generators for human-facing numbers (deployment IDs, and anything else that needs a
+unique, increasing number other than the primary key).
+
+On PostgreSQL each name is backed by its own database sequence, created on first use.
+Elsewhere (SQLite) a row per name in IdCounter is incremented inside a transaction, which
+the database serializes across processes. Set ID_GENERATOR = 'sequence', 'counter' or
+'snowflake' in settings to force one.
+
+The snowflake generator (for nodes that share no database sequence) makes time-ordered
+IDs: seconds since EPOCH, then the node ID, then a per-second counter. It needs
+ID_NODE_ID (0-1023), distinct for every process that generates IDs.
+
+Every generator stays below MAX_ID (2**53 - 1, JavaScript's Number.MAX_SAFE_INTEGER), so
+the frontend reads the numbers exactly.
+"""
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.db.models import F, Max
+
+MAX_ID = 2 ** 53 - 1
+EPOCH = 1735689600  # 2025-01-01T00:00:00Z
+TIMESTAMP_BITS = 32  # seconds: until 2161
+NODE_BITS = 10
+COUNTER_BITS = 11  # 2048 IDs per second and node
+
+
+class SequenceIdGenerator:
+    """Numbers from a PostgreSQL sequence per name"""
+    def __init__(self):
+        self._created = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def sequence_name(name):
+        # core_idgen_ prefix: Django names primary key sequences core_<table>_id_seq
+        return 'core_idgen_' + re.sub(r'[^a-z0-9_]', '_', name.lower()) + '_seq'
+
+    def _ensure(self, sequence, start):
+        if sequence in self._created:
+            return
+        with self._lock:
+            if sequence in self._created:
+                return
+            first = start() if callable(start) else start
+            with connection.cursor() as cursor:
+                cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS {sequence} START WITH {int(first or 1)}')
+            # Only remember it once committed: a rolled-back transaction takes the sequence with it
+            transaction.on_commit(lambda: self._created.add(sequence))
+
+    def next(self, name, start=1):
+        sequence = self.sequence_name(name)
+        self._ensure(sequence, start)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT nextval(%s)', [sequence])
+            return cursor.fetchone()[0]
+
+
+class CounterIdGenerator:
+    """Numbers from an IdCounter row per name"""
+    def next(self, name, start=1):
+        from core.models import IdCounter
+        with transaction.atomic():
+            if not IdCounter.objects.filter(name=name).update(value=F('value') + 1):
+                first = start() if callable(start) else start
+                _, created = IdCounter.objects.get_or_create(name=name, defaults={'value': first or 1})
+                if not created:
+                    # Another process created it first
+                    IdCounter.objects.filter(name=name).update(value=F('value') + 1)
+            return IdCounter.objects.filter(name=name).values_list('value', flat=True).get()
+
+
+class SnowflakeIdGenerator:
+    """Time-ordered 53-bit IDs: timestamp | node | counter"""
+    def __init__(self, node_id=None):
+        if node_id is None:
+            node_id = getattr(settings, 'ID_NODE_ID', None)
+        if node_id is None or not 0 <= node_id < (1 << NODE_BITS):
+            raise ImproperlyConfigured(
+                f'ID_GENERATOR = "snowflake" needs ID_NODE_ID (0-{(1 << NODE_BITS) - 1}), distinct per process'
+            )
+        self.node_id = node_id
+        self._lock = threading.Lock()
+        self._last = -1
+        self._counter = 0
+
+    def next(self, name=None, start=None):
+        with self._lock:
+            now = max(int(time.time()), self._last)  # never step backwards with the clock
+            if now == self._last:
+                self._counter = (self._counter + 1) & ((1 << COUNTER_BITS) - 1)
+                if self._counter == 0:
+                    # Counter exhausted for this second: move on to the next one
+                    now = self._last + 1
+                    while time.time() < now:
+                        time.sleep(0.001)
+            else:
+                self._counter = 0
+            self._last = now
+            return ((now - EPOCH) << (NODE_BITS + COUNTER_BITS)) | (self.node_id << COUNTER_BITS) | self._counter
+
+
+_generators = {}
+_generators_lock = threading.Lock()
+
+
+def get_generator():
+    backend = getattr(settings, 'ID_GENERATOR', None)
+    if backend is None:
+        backend = 'sequence' if connection.vendor == 'postgresql' else 'counter'
+    if backend not in _generators:
+        with _generators_lock:
+            if backend not in _generators:
+                if backend == 'sequence':
+                    _generators[backend] = SequenceIdGenerator()
+                elif backend == 'counter':
+                    _generators[backend] = CounterIdGenerator()
+                elif backend == 'snowflake':
+                    _generators[backend] = SnowflakeIdGenerator()
+                else:
+                    raise ValueError(f'Unknown ID_GENERATOR: {backend}')
+    return _generators[backend]
+
+
+def next_id(name, model=None, field=None):
+    """
+    Next number for `name`. When `model` and `field` are given, a new sequence or counter
+    starts above the largest value already stored there so existing numbers are never
+    reused (values above MAX_ID are not counted).
+    """
+    def start():
+        if model is None:
+            return 1
+        stored = model._base_manager.filter(**{f'{field}__lte': MAX_ID})
+        return (stored.aggregate(top=Max(field))['top'] or 0) + 1
+    return get_generator().next(name, start)
@@ -1,6 +1,10 @@
-from core.models import Notification, Profile
+from core.models import Notification, Profile, Deployment, DeploymentStockMovement
+from core.services import dispatch, events
 
 from decimal import Decimal
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
 
 def apply_order_inventory(order):
     total = Decimal('0.00')
@@ -10,3 +14,91 @@ def apply_order_inventory(order):
         # Note: Stock tracking is now done via order-based calculations in the frontend
     order.total_amount = total
     order.save()
+
+
+# --- Deployment stock ledger -------------------------------------------------
+# Every change to Deployment.stock is written as a DeploymentStockMovement. Delivery
+# completions lock the deployment row with select_for_update and decrement it with
+# a single UPDATE ... SET stock = stock - n; admin edits (DeploymentViewSet.perform_update)
+# take the same lock, so neither can overwrite the other.
+
+
+def record_load(deployment, actor=None):
+    """Open the ledger of a new deployment with its loaded stock"""
+    return DeploymentStockMovement.objects.create(
+        deployment=deployment, kind='load', quantity=deployment.stock,
+        balance_after=deployment.stock, actor=actor,
+    )
+
+
+def record_adjustment(deployment, quantity, actor=None):
+    """Record a manual change of `quantity` units (already applied to `deployment.stock`)"""
+    return DeploymentStockMovement.objects.create(
+        deployment=deployment, kind='adjustment', quantity=quantity,
+        balance_after=deployment.stock, actor=actor,
+    )
+
+
+def delivered_from_stock(delivery):
+    """Units and returned containers already booked against deployments for this delivery"""
+    totals = DeploymentStockMovement.objects.filter(delivery=delivery).aggregate(
+        quantity=Coalesce(Sum('quantity'), 0), returned=Coalesce(Sum('returned_containers'), 0)
+    )
+    return -totals['quantity'], totals['returned']
+
+
+def _deployment_changed(deployment_id, status, driver_id):
+    """
+    What the Deployment post_save receivers do, for changes written with .update(): rebuild
+    the dispatch index and push the change to SSE clients, once the transaction commits
+    """
+    def changed():
+        dispatch.index.invalidate()
+        events.publish('deployment', 'updated', deployment_id, status=status, driver_id=driver_id)
+    transaction.on_commit(changed)
+
+
+def consume_for_delivery(delivery, quantity, returned_containers=0):
+    """
+    Take `quantity` units from the driver's newest active deployment of the ordered product
+    and add `returned_containers` to it. A deployment reaching zero stock is marked completed.
+
+    A negative `quantity` (a rebooked delivery that delivered less) goes back to the deployment
+    the delivery was taken from, which becomes active again if it had been completed.
+
+    Returns the ledger movement, or None when there is no such deployment or not enough stock.
+    """
+    with transaction.atomic():
+        if quantity < 0:
+            taken_from = DeploymentStockMovement.objects.filter(
+                delivery=delivery, kind='delivery',
+            ).order_by('-created_at', '-id').values('deployment_id')[:1]
+            deployments = Deployment.objects.select_for_update().filter(pk__in=taken_from)
+        else:
+            deployments = Deployment.objects.select_for_update().filter(
+                # status='active' rather than excluding the inactive ones, so the partial index
+                # core_deploy_active_idx applies
+                driver_id=delivery.driver_id, product_id=delivery.order.product_id, status='active',
+            ).order_by('-created_at')
+        row = deployments.values_list('pk', 'stock', 'status', 'driver_id').first()
+        if row is None:
+            return None
+        deployment_id, stock, status, driver_id = row
+        if stock < quantity:
+            return None
+
+        new_stock = stock - quantity
+        changes = {'stock': F('stock') - quantity}
+        if returned_containers:
+            changes['returned_containers'] = Coalesce(F('returned_containers'), 0) + returned_containers
+        if new_stock == 0:
+            changes['status'] = 'completed'
+        elif status == 'completed':
+            changes['status'] = 'active'
+        Deployment.objects.filter(pk=deployment_id).update(**changes)
+        _deployment_changed(deployment_id, changes.get('status', status), driver_id)
+
+        return DeploymentStockMovement.objects.create(
+            deployment_id=deployment_id, delivery=delivery, kind='delivery', quantity=-quantity,
+            returned_containers=returned_containers, balance_after=new_stock, actor=delivery.driver,
+        )
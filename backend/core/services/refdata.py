@@ -0,0 +1,115 @@
+"""
+Versioned cache of reference data (municipalities, barangays, products, routes, vehicles).
+
+Each model has a version number in the ReferenceVersion table, bumped by the signal
+receivers in core.signals in the same transaction as the change, so every process sees it
+as soon as the change commits. A cached response is stored under the versions of every
+model it reads, so a bump makes the old entries unreachable instead of having to find and
+delete them. Versions start at the current time in milliseconds and only go up, so an
+ETag never comes back with different content.
+
+Reading the versions is one small query per request. Cached data sits in two tiers, a
+small process-local LRU in front of Django's cache; entries are keyed by ETag and never
+change, so any cache backend works, including the default per-process LocMemCache.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from core.models import ReferenceVersion
+
+DATA_KEY = 'refdata:data:{}'
+
+
+def _timeout():
+    return getattr(settings, 'REFDATA_CACHE_TIMEOUT', 24 * 3600)
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def _label(model):
+    return model._meta.label_lower
+
+
+def versions(models):
+    """Current version of each model, as one string ('1718000000000.1718000000004')"""
+    labels = [_label(model) for model in models]
+    found = dict(ReferenceVersion.objects.filter(label__in=labels).values_list('label', 'version'))
+    missing = [label for label in labels if label not in found]
+    if missing:
+        ReferenceVersion.objects.bulk_create(
+            [ReferenceVersion(label=label, version=_now_ms()) for label in missing], ignore_conflicts=True
+        )
+        found.update(ReferenceVersion.objects.filter(label__in=missing).values_list('label', 'version'))
+    return '.'.join(str(found[label]) for label in labels)
+
+
+def bump(model):
+    """New version for `model`: every cached response that read it becomes stale"""
+    label = _label(model)
+    if not ReferenceVersion.objects.filter(label=label).update(version=F('version') + 1):
+        # Never read yet: start above any version a cache could still hold
+        ReferenceVersion.objects.bulk_create([ReferenceVersion(label=label, version=_now_ms())],
+                                             ignore_conflicts=True)
+
+
+def etag(name, version, variant):
+    """Strong ETag for one representation: the view, the data versions and the URL"""
+    digest = hashlib.sha1(f'{name}|{version}|{variant}'.encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+class LocalLRU:
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local = LocalLRU(getattr(settings, 'REFDATA_LOCAL_ENTRIES', 256))
+
+
+def get_or_build(tag, build):
+    """
+    Data cached under `tag` (an ETag, so it already covers versions and URL): the local LRU,
+    then Django's cache, then build(). build() returns None for results that must not be cached.
+    """
+    data = local.get(tag)
+    if data is not None:
+        return data
+    key = DATA_KEY.format(tag.strip('"'))
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        if data is None:
+            return None
+        cache.set(key, data, _timeout())
+    local.set(tag, data)
+    return data
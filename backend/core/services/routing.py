@@ -0,0 +1,305 @@
+"""
+Vehicle routing for DeliveryViewSet.auto_dispatch.
+
+Deliveries are grouped by Route and loaded onto the vehicles of the route's active
+deployments: one slot per vehicle, holding at most min(Vehicle.stock_limit, the stock
+left on its deployments), and a delivery only goes to a driver with enough stock of the
+ordered product left. Each vehicle's stops (one per barangay) are ordered with
+nearest-neighbour followed by 2-opt. The planning functions
+work on plain tuples so they can be benchmarked without a database
+(see the benchmark_routing command).
+"""
+import functools
+import math
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from core.models import Barangay, Delivery, Deployment, Route
+from core.services import dispatch, events, tombstones
+
+Job = namedtuple('Job', 'delivery_id barangay_id quantity driver_id product_id')
+Slot = namedtuple('Slot', 'vehicle_id driver_id capacity')
+Assignment = namedtuple('Assignment', 'delivery_id vehicle_id driver_id sequence')
+
+# Fallback distances (km) between barangays without coordinates
+SAME_MUNICIPALITY_KM = 2.0
+OTHER_MUNICIPALITY_KM = 10.0
+
+TWO_OPT_MAX_PASSES = 20
+
+
+class DistanceMatrix:
+    """Lazily filled barangay-to-barangay distances"""
+    def __init__(self, barangays):
+        # barangays: {barangay_id: (municipality_id, latitude, longitude)}
+        self.barangays = barangays
+        self._cache = {}
+
+    def __call__(self, a, b):
+        if a == b:
+            return 0.0
+        key = (a, b) if a < b else (b, a)
+        if key not in self._cache:
+            self._cache[key] = self._distance(*key)
+        return self._cache[key]
+
+    def _distance(self, a, b):
+        mun_a, lat_a, lng_a = self.barangays.get(a, (None, None, None))
+        mun_b, lat_b, lng_b = self.barangays.get(b, (None, None, None))
+        if None not in (lat_a, lng_a, lat_b, lng_b):
+            lat_a, lng_a, lat_b, lng_b = map(math.radians, map(float, (lat_a, lng_a, lat_b, lng_b)))
+            h = math.sin((lat_b - lat_a) / 2) ** 2 + math.cos(lat_a) * math.cos(lat_b) * math.sin((lng_b - lng_a) / 2) ** 2
+            return 2 * 6371.0 * math.asin(math.sqrt(h))
+        return SAME_MUNICIPALITY_KM if mun_a is not None and mun_a == mun_b else OTHER_MUNICIPALITY_KM
+
+
+def nearest_neighbour(stops, dist):
+    """Visit order starting from the first stop, always moving to the closest unvisited one"""
+    if not stops:
+        return []
+    remaining = list(stops[1:])
+    tour = [stops[0]]
+    while remaining:
+        last = tour[-1]
+        nearest = min(range(len(remaining)), key=lambda i: dist(last, remaining[i]))
+        tour.append(remaining.pop(nearest))
+    return tour
+
+
+def two_opt(tour, dist, max_passes=TWO_OPT_MAX_PASSES):
+    """Improve an open path by reversing segments while that shortens it"""
+    tour = list(tour)
+    n = len(tour)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, n - 1):
+            for k in range(i + 1, n):
+                a, b = tour[i - 1], tour[i]
+                c = tour[k]
+                d = tour[k + 1] if k + 1 < n else None
+                before = dist(a, b) + (dist(c, d) if d is not None else 0.0)
+                after = dist(a, c) + (dist(b, d) if d is not None else 0.0)
+                if after < before - 1e-9:
+                    tour[i:k + 1] = reversed(tour[i:k + 1])
+                    improved = True
+        if not improved:
+            break
+    return tour
+
+
+def order_stops(barangay_ids, dist):
+    stops = sorted(set(barangay_ids))
+    return two_opt(nearest_neighbour(stops, dist), dist)
+
+
+def tour_length(tour, dist):
+    return sum(dist(a, b) for a, b in zip(tour, tour[1:]))
+
+
+def plan_route(jobs, slots, dist, stock=None):
+    """
+    Plan one route. Jobs already held by a slot's driver stay with that vehicle when it has room;
+    the rest are taken in tour order and poured into the vehicles one after another, so each
+    vehicle gets a contiguous stretch of the route. Returns (assignments, unassigned jobs).
+    Without any slots, every job keeps its driver and is sequenced along the route with no vehicle.
+
+    stock: {(driver_id, product_id): units left}, taken from as jobs are loaded; a job only
+    goes to a slot whose driver has its product (None: products are not checked).
+    """
+    tour = order_stops([job.barangay_id for job in jobs], dist)
+    position = {barangay_id: i for i, barangay_id in enumerate(tour)}
+    jobs = sorted(jobs, key=lambda job: (position[job.barangay_id], job.delivery_id))
+
+    if not slots:
+        return [Assignment(job.delivery_id, None, job.driver_id, i + 1) for i, job in enumerate(jobs)], []
+
+    loads = defaultdict(list)
+    free = {i: slot.capacity for i, slot in enumerate(slots)}
+    slot_of_driver = {slot.driver_id: i for i, slot in enumerate(slots)}
+
+    def fits(i, job):
+        if free[i] < job.quantity:
+            return False
+        return stock is None or stock.get((slots[i].driver_id, job.product_id), 0) >= job.quantity
+
+    def load(i, job):
+        loads[i].append(job)
+        free[i] -= job.quantity
+        if stock is not None:
+            stock[(slots[i].driver_id, job.product_id)] -= job.quantity
+
+    rest = []
+    for job in jobs:
+        i = slot_of_driver.get(job.driver_id)
+        if i is not None and fits(i, job):
+            load(i, job)
+        else:
+            rest.append(job)
+
+    unassigned = []
+    current = 0
+    for job in rest:
+        # The current vehicle, else the next one that fits, else an earlier one with the product
+        order = [*range(current, len(slots)), *range(current)]
+        i = next((i for i in order if fits(i, job)), None)
+        if i is None:
+            unassigned.append(job)
+            continue
+        if i >= current:
+            current = i
+        load(i, job)
+
+    assignments = []
+    for i, jobs_for_slot in loads.items():
+        slot = slots[i]
+        stop_order = order_stops([job.barangay_id for job in jobs_for_slot], dist)
+        rank = {barangay_id: n for n, barangay_id in enumerate(stop_order)}
+        jobs_for_slot.sort(key=lambda job: (rank[job.barangay_id], job.delivery_id))
+        assignments.extend(
+            Assignment(job.delivery_id, slot.vehicle_id, slot.driver_id, n + 1) for n, job in enumerate(jobs_for_slot)
+        )
+    return assignments, unassigned
+
+
+def plan(jobs_by_route, slots_by_route, dist, stock=None):
+    """
+    Plan every route; returns ({route_id: [Assignment]}, {route_id: [unassigned Job]}).
+    stock ({(driver_id, product_id): units}) is shared by all routes and not modified.
+    """
+    stock = dict(stock) if stock is not None else None
+    assignments, unassigned = {}, {}
+    for route_id, jobs in jobs_by_route.items():
+        assignments[route_id], unassigned[route_id] = plan_route(
+            jobs, slots_by_route.get(route_id, []), dist, stock)
+    return assignments, unassigned
+
+
+def vehicle_slots(deployments, reserved):
+    """
+    ({route_id: [Slot]}, {(driver_id, product_id): units left}) from active deployments
+    (route_id, vehicle_id, driver_id, product_id, stock, stock_limit), oldest first.
+
+    One slot per vehicle, on the route and with the driver of its oldest deployment; its
+    capacity is the vehicle's stock_limit, or less when that driver has less stock left of
+    the products it carries. `reserved` ({(driver_id, product_id): units}) is stock already
+    promised to deliveries that are not being planned.
+    """
+    stock = defaultdict(int)
+    first = {}
+    products = defaultdict(set)
+    for route_id, vehicle_id, driver_id, product_id, units, stock_limit in deployments:
+        stock[(driver_id, product_id)] += units
+        first.setdefault(vehicle_id, (route_id, driver_id, stock_limit))
+        if driver_id == first[vehicle_id][1]:
+            products[vehicle_id].add(product_id)
+    for key, units in reserved.items():
+        if key in stock:
+            stock[key] = max(stock[key] - units, 0)
+
+    slots_by_route = defaultdict(list)
+    for vehicle_id, (route_id, driver_id, stock_limit) in first.items():
+        left = sum(stock[(driver_id, product_id)] for product_id in products[vehicle_id])
+        capacity = left if stock_limit is None else min(stock_limit, left)
+        slots_by_route[route_id].append(Slot(vehicle_id, driver_id, capacity))
+    return slots_by_route, dict(stock)
+
+
+def auto_dispatch(statuses=('pending', 'assigned')):
+    """Plan and store routes for all open deliveries; returns a summary dict"""
+    rows = Delivery.objects.filter(status__in=statuses).values_list(
+        'id', 'route_id', 'driver_id', 'order__quantity',
+        'order__customer__address__barangay_id', 'order__customer_id', 'order__product_id',
+    )
+
+    # A delivery without a route goes on its driver's deployed route when that serves its
+    # barangay, otherwise on the first route serving the barangay
+    route_of_barangay = {}
+    route_barangays = set()
+    for route_id, barangay_id in Route.barangays.through.objects.order_by('route_id').values_list('route_id', 'barangay_id'):
+        route_of_barangay.setdefault(barangay_id, route_id)
+        route_barangays.add((route_id, barangay_id))
+    active = list(Deployment.objects.filter(status='active').order_by('created_at', 'pk').values_list(
+        'route_id', 'vehicle_id', 'driver_id', 'product_id', 'stock', 'vehicle__stock_limit'))
+    route_of_driver = {}
+    for route_id, _, driver_id, *_ in active:
+        route_of_driver.setdefault(driver_id, route_id)
+
+    jobs_by_route = defaultdict(list)
+    unrouted = 0
+    barangay_ids = set()
+    current_driver = {}
+    customer_of = {}
+    for delivery_id, route_id, driver_id, quantity, barangay_id, customer_id, product_id in rows.iterator():
+        current_driver[delivery_id] = driver_id
+        customer_of[delivery_id] = customer_id
+        if route_id is None and (route_of_driver.get(driver_id), barangay_id) in route_barangays:
+            route_id = route_of_driver[driver_id]
+        route_id = route_id or route_of_barangay.get(barangay_id)
+        if route_id is None or barangay_id is None:
+            unrouted += 1
+            continue
+        barangay_ids.add(barangay_id)
+        jobs_by_route[route_id].append(Job(delivery_id, barangay_id, quantity, driver_id, product_id))
+
+    # Open deliveries that are not re-planned (in_route) keep their units on the driver's stock.
+    # Units are order quantities, as in core.services.dispatch and core.services.inventory
+    reserved = {
+        (row['driver_id'], row['order__product_id']): row['units'] or 0
+        for row in Delivery.objects.filter(
+            status__in=set(dispatch.OPEN_DELIVERY_STATUSES) - set(statuses), driver__isnull=False,
+        ).order_by().values('driver_id', 'order__product_id').annotate(units=Sum('order__quantity'))
+    }
+    slots_by_route, stock = vehicle_slots(active, reserved)
+
+    dist = DistanceMatrix({
+        pk: (municipality_id, lat, lng)
+        for pk, municipality_id, lat, lng in Barangay.objects.filter(id__in=barangay_ids).values_list(
+            'id', 'municipality_id', 'latitude', 'longitude')
+    })
+    assignments, unassigned = plan(jobs_by_route, slots_by_route, dist, stock)
+
+    now = timezone.now()
+    updates = []
+    for route_id, route_assignments in assignments.items():
+        for a in route_assignments:
+            updates.append(Delivery(
+                pk=a.delivery_id, route_id=route_id, vehicle_id=a.vehicle_id, driver_id=a.driver_id,
+                status='assigned' if a.driver_id else 'pending', stop_sequence=a.sequence, updated_at=now,
+            ))
+    for route_id, jobs in unassigned.items():
+        for job in jobs:
+            # No room on this route's vehicles: keep the delivery waiting for the next trip
+            updates.append(Delivery(
+                pk=job.delivery_id, route_id=route_id, vehicle_id=None, driver_id=job.driver_id,
+                status='assigned' if job.driver_id else 'pending', stop_sequence=None, updated_at=now,
+            ))
+    # bulk_update bypasses Delivery.save, so tombstone reassigned deliveries for their old drivers here
+    reassigned = [
+        (u.pk, current_driver[u.pk]) for u in updates
+        if current_driver[u.pk] and current_driver[u.pk] != u.driver_id
+    ]
+    with transaction.atomic():
+        Delivery.objects.bulk_update(
+            updates, ['route', 'vehicle', 'driver', 'status', 'stop_sequence', 'updated_at'], batch_size=500
+        )
+        if reassigned:
+            tombstones.record_removed('delivery', reassigned)
+        # No post_save from bulk_update either: publish the change events here
+        for u in updates:
+            previous = current_driver[u.pk] if current_driver[u.pk] != u.driver_id else None
+            transaction.on_commit(functools.partial(
+                events.publish, 'delivery', 'updated', u.pk, status=u.status, driver_id=u.driver_id,
+                customer_id=customer_of[u.pk], previous_driver_id=previous,
+            ))
+    # Drivers' loads changed wholesale
+    dispatch.index.invalidate()
+
+    return {
+        'assigned': sum(1 for u in updates if u.vehicle_id),
+        'sequenced': sum(1 for u in updates if u.stop_sequence),
+        'waiting': sum(len(jobs) for jobs in unassigned.values()),
+        'unrouted': unrouted,
+        'routes': len(jobs_by_route),
+    }
@@ -0,0 +1,137 @@
+"""
+Daily and per-customer sales rollups behind /api/reports/.
+
+Totals are priced at the product's current price, like the order totals the API shows
+and like rebuild(): recording a sale uses today's price, and a price change re-prices
+the stored rows (reprice_product), so the incremental rollup and a rebuild always agree.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core.models import CustomerSales, DailySales, Delivery, Order, WalkInOrder
+
+
+def _sale_date(dt):
+    # Match the `created_at__date` bucketing the reports have always used
+    return timezone.localtime(dt).date() if timezone.is_aware(dt) else dt.date()
+
+
+def _bump_daily(date, product_id, channel, orders, quantity, total):
+    row, _ = DailySales.objects.get_or_create(date=date, product_id=product_id, channel=channel)
+    DailySales.objects.filter(pk=row.pk).update(
+        orders=F('orders') + orders,
+        quantity=F('quantity') + quantity,
+        total=F('total') + total,
+    )
+
+
+def _bump_customer(customer_id, orders, spend):
+    row, _ = CustomerSales.objects.get_or_create(customer_id=customer_id)
+    CustomerSales.objects.filter(pk=row.pk).update(
+        orders=F('orders') + orders,
+        spend=F('spend') + spend,
+    )
+
+
+def _apply_order(order, sign):
+    if not order.product_id:
+        return
+    total = order.product.price * order.quantity * sign
+    with transaction.atomic():
+        _bump_daily(_sale_date(order.created_at), order.product_id, 'delivery', sign, order.quantity * sign, total)
+        if order.customer_id:
+            _bump_customer(order.customer_id, sign, total)
+
+
+def record_delivery_transition(delivery, old_status):
+    """Add or remove a delivery's order from the rollup when it enters or leaves 'delivered'"""
+    if old_status != 'delivered' and delivery.status == 'delivered':
+        _apply_order(delivery.order, 1)
+    elif old_status == 'delivered' and delivery.status != 'delivered':
+        _apply_order(delivery.order, -1)
+
+
+def record_order_change(order, old_values):
+    """
+    A delivered order was edited: take it out with its stored values (`old_values`, the
+    changed attnames as loaded) and put it back with the new ones
+    """
+    if not Delivery.objects.filter(order_id=order.pk, status='delivered').exists():
+        return
+    stored = {name: getattr(order, name) for name in ('product_id', 'quantity', 'customer_id')}
+    stored.update(old_values)
+    old = Order(pk=order.pk, created_at=order.created_at, **stored)
+    with transaction.atomic():
+        _apply_order(old, -1)
+        _apply_order(order, 1)
+
+
+def record_delivery_removed(delivery):
+    if delivery.status == 'delivered':
+        _apply_order(delivery.order, -1)
+
+
+def _apply_walkin(date, product, quantity, sign):
+    _bump_daily(date, product.id, 'walk_in', sign, quantity * sign, product.price * quantity * sign)
+
+
+def record_walkin(walkin, old=None):
+    """Apply a created or edited walk-in order; `old` is the previously stored row for edits"""
+    with transaction.atomic():
+        if old is not None:
+            _apply_walkin(_sale_date(old.created_at), old.product, old.quantity, -1)
+        _apply_walkin(_sale_date(walkin.created_at), walkin.product, walkin.quantity, 1)
+
+
+def record_walkin_removed(walkin):
+    _apply_walkin(_sale_date(walkin.created_at), walkin.product, walkin.quantity, -1)
+
+
+@transaction.atomic
+def reprice_product(product):
+    """Re-price the rollups after `product`'s price changed"""
+    DailySales.objects.filter(product=product).update(total=F('quantity') * Value(product.price))
+    spend = Delivery.objects.filter(
+        status='delivered', order__customer_id=OuterRef('customer_id'), order__product__isnull=False,
+    ).order_by().values('order__customer_id').annotate(
+        spend=Sum(F('order__product__price') * F('order__quantity')),
+    ).values('spend')
+    CustomerSales.objects.filter(
+        customer_id__in=Delivery.objects.filter(status='delivered', order__product=product).values('order__customer_id'),
+    ).update(spend=Coalesce(Subquery(spend), Value(Decimal('0'))))
+
+
+@transaction.atomic
+def rebuild():
+    """Recompute both rollup tables from the order, delivery and walk-in history"""
+    DailySales.objects.all().delete()
+    CustomerSales.objects.all().delete()
+
+    delivered = Delivery.objects.filter(status='delivered', order__product__isnull=False)
+    daily = {}
+    for row in delivered.values('order__created_at__date', 'order__product').annotate(
+        orders=Count('id'), units=Sum('order__quantity'),
+        total=Sum(F('order__product__price') * F('order__quantity')),
+    ):
+        daily[(row['order__created_at__date'], row['order__product'], 'delivery')] = row
+    for row in WalkInOrder.objects.values('created_at__date', 'product').annotate(
+        orders=Count('id'), units=Sum('quantity'),
+        total=Sum(F('product__price') * F('quantity')),
+    ):
+        daily[(row['created_at__date'], row['product'], 'walk_in')] = row
+    DailySales.objects.bulk_create([
+        DailySales(date=date, product_id=product_id, channel=channel,
+                   orders=row['orders'], quantity=row['units'] or 0, total=row['total'] or Decimal('0'))
+        for (date, product_id, channel), row in daily.items()
+    ], batch_size=1000)
+
+    CustomerSales.objects.bulk_create([
+        CustomerSales(customer_id=row['order__customer'], orders=row['orders'], spend=row['spend'] or Decimal('0'))
+        for row in delivered.filter(order__customer__isnull=False).values('order__customer').annotate(
+            orders=Count('id'), spend=Sum(F('order__product__price') * F('order__quantity')),
+        )
+    ], batch_size=1000)
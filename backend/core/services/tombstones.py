@@ -0,0 +1,17 @@
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from core.models import SyncTombstone
+
+# Delta sync tokens older than this can no longer be served and need a full resync
+TOMBSTONE_RETENTION = timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_DAYS', 30))
+
+
+def record_removed(entity, removals):
+    """Tell delta sync clients that objects are gone: `removals` is [(object_id, profile_id)]"""
+    now = timezone.now()
+    SyncTombstone.objects.bulk_create([
+        SyncTombstone(entity=entity, object_id=object_id, profile_id=profile_id, removed_at=now)
+        for object_id, profile_id in set(removals) if profile_id
+    ], batch_size=500)
+    SyncTombstone.objects.filter(removed_at__lt=now - TOMBSTONE_RETENTION).delete()
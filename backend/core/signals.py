@@ -1,6 +1,9 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
-from core.models import User, Profile, Order, Delivery, ActivityLog
+from core.models import User, Profile, Order, Delivery, WalkInOrder, Deployment, Route
+from core.models import Municipality, Barangay, Product, Vehicle
+from core.services import sales, dispatch, activity, tombstones, events, refdata
 
 @receiver(post_save, sender=User)
 def sync_profile(sender, instance, created, **kwargs):
@@ -30,14 +33,14 @@ def create_delivery_for_order(sender, instance, created, **kwargs):
     """Automatically create a delivery when an order is created"""
     if created:
         # Only create delivery for new orders
-        # Get the first available driver
-        driver = Profile.objects.filter(role='driver').first()
+        # Give it to the least-loaded driver whose active deployment covers the customer's barangay
+        driver_id = dispatch.choose_driver(instance)
         
         Delivery.objects.get_or_create(
             order=instance,
             defaults={
-                'status': 'assigned' if driver else 'pending',
-                'driver': driver
+                'status': 'assigned' if driver_id else 'pending',
+                'driver_id': driver_id
             }
         )
 
@@ -61,7 +64,7 @@ def log_order_activity(sender, instance, created, **kwargs):
     if actor:
         try:
             action = "order_created" if created else "order_updated"
-            ActivityLog.objects.create(
+            activity.log(
                 actor=actor,
                 action=action,
                 entity="order",
@@ -95,7 +98,7 @@ def log_delivery_activity(sender, instance, created, **kwargs):
     if actor:
         try:
             action = "delivery_created" if created else "delivery_updated"
-            ActivityLog.objects.create(
+            activity.log(
                 actor=actor,
                 action=action,
                 entity="delivery",
@@ -108,4 +111,106 @@ def log_delivery_activity(sender, instance, created, **kwargs):
             )
         except Exception as e:
             # Silently fail to avoid breaking the delivery process
-            pass
\ No newline at end of file
+            pass
+
+@receiver(post_delete, sender=Delivery)
+def remove_delivery_sales(sender, instance, **kwargs):
+    """Take a deleted delivered order back out of the sales rollup"""
+    sales.record_delivery_removed(instance)
+
+@receiver(post_delete, sender=Delivery)
+def record_delivery_tombstones(sender, instance, **kwargs):
+    """Let the driver's and customer's delta sync drop a deleted delivery"""
+    customer_id = Order.objects.filter(pk=instance.order_id).values_list('customer_id', flat=True).first()
+    tombstones.record_removed('delivery', [(instance.id, instance.driver_id), (instance.id, customer_id)])
+
+@receiver(post_delete, sender=WalkInOrder)
+def remove_walkin_sales(sender, instance, **kwargs):
+    """Take a deleted walk-in order back out of the sales rollup"""
+    sales.record_walkin_removed(instance)
+
+@receiver(post_save, sender=Product)
+def reprice_sales(sender, instance, created, **kwargs):
+    """Sales rollups are priced at the current price (core.services.sales)"""
+    # Still the values as loaded: TrackedFieldsMixin refreshes them after post_save
+    if not created and instance.has_changed('price'):
+        sales.reprice_product(instance)
+
+@receiver(post_save, sender=Deployment)
+@receiver(post_delete, sender=Deployment)
+def refresh_dispatch_index(sender, **kwargs):
+    """Rebuild the dispatch index after deployments change"""
+    dispatch.index.invalidate()
+
+@receiver(m2m_changed, sender=Route.barangays.through)
+def refresh_dispatch_index_for_route(sender, **kwargs):
+    """Rebuild the dispatch index when a route's barangays change"""
+    dispatch.index.invalidate()
+
+def _delivery_customer_id(delivery):
+    if Delivery.order.is_cached(delivery):
+        return delivery.order.customer_id
+    return Order.objects.filter(pk=delivery.order_id).values_list('customer_id', flat=True).first()
+
+@receiver(post_save, sender=Delivery)
+@receiver(post_delete, sender=Delivery)
+def publish_delivery_event(sender, instance, created=False, **kwargs):
+    """Push delivery changes to connected SSE clients (core.api.events)"""
+    if kwargs.get('raw', False):
+        return
+    deleted = kwargs.get('signal') is post_delete
+    # Still the values as loaded: TrackedFieldsMixin refreshes them after post_save
+    previous_driver_id = None if created or deleted else instance.get_loaded_value('driver_id')
+    payload = dict(
+        status=instance.status, driver_id=instance.driver_id, customer_id=_delivery_customer_id(instance),
+        previous_driver_id=previous_driver_id if previous_driver_id != instance.driver_id else None,
+    )
+    action = 'deleted' if deleted else 'created' if created else 'updated'
+    transaction.on_commit(lambda: events.publish('delivery', action, instance.pk, **payload))
+
+@receiver(post_save, sender=Deployment)
+@receiver(post_delete, sender=Deployment)
+def publish_deployment_event(sender, instance, created=False, **kwargs):
+    """Push deployment changes to connected SSE clients (core.api.events)"""
+    if kwargs.get('raw', False):
+        return
+    action = 'deleted' if kwargs.get('signal') is post_delete else 'created' if created else 'updated'
+    payload = dict(status=instance.status, driver_id=instance.driver_id)
+    transaction.on_commit(lambda: events.publish('deployment', action, instance.pk, **payload))
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def publish_order_event(sender, instance, created=False, **kwargs):
+    """Push order changes to connected SSE clients (core.api.events)"""
+    if kwargs.get('raw', False):
+        return
+    action = 'deleted' if kwargs.get('signal') is post_delete else 'created' if created else 'updated'
+    customer_id = instance.customer_id
+    transaction.on_commit(lambda: events.publish('order', action, instance.pk, customer_id=customer_id))
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def refresh_token_revocation(sender, instance, **kwargs):
+    """Re-check tokens of a user whose account or role changed (core.api.authentication)"""
+    from core.api.authentication import revocations
+    revocations.forget(instance.pk if sender is User else instance.user_id)
+
+@receiver(post_save, sender=Municipality)
+@receiver(post_delete, sender=Municipality)
+@receiver(post_save, sender=Barangay)
+@receiver(post_delete, sender=Barangay)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Route)
+@receiver(post_delete, sender=Route)
+@receiver(post_save, sender=Vehicle)
+@receiver(post_delete, sender=Vehicle)
+@receiver(m2m_changed, sender=Route.municipalities.through)
+@receiver(m2m_changed, sender=Route.barangays.through)
+def bump_reference_version(sender, **kwargs):
+    """New version for cached reference data, committed with the change (core.services.refdata)"""
+    if kwargs.get('action', 'post_').startswith('pre_'):
+        return
+    refdata.bump(sender)
@@ -0,0 +1,283 @@
+"""
+Synthetic dataset for benchmarks and query plan checks.
+
+generate() writes geography, products, vehicles, routes, users with profiles, deployments
+with their stock ledger, orders with their deliveries, order history and activity logs, and
+walk-in orders with bulk_create in batches, each batch in its own transaction. No model
+signals run, so the per-row cascades (profile sync, delivery creation, activity logging,
+sales rollups) are reproduced here directly and the rollups are rebuilt once at the end.
+
+With signals=True, post_save(created=True) is sent for every generated order and deployment
+instead, so the app's receivers create the deliveries, activity logs, dispatch index
+refreshes and change events themselves; much slower, for exercising those code paths.
+
+The same seed and counts always give the same rows. Timestamps are spread over the
+`days` before today, so recent-window queries (activity, dispatch) find data.
+"""
+import random
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from django.db.models.signals import post_save
+from core.models import (
+    ActivityLog, Address, Barangay, Delivery, Deployment, DeploymentStockMovement, Municipality, Order,
+    OrderHistory, Product, Profile, Route, User, Vehicle, WalkInOrder,
+)
+from core.services import activity, sales
+from core.services.ids import next_id
+
+PASSWORD = 'Synthetic123!'
+FIRST_NAMES = ['Ana', 'Ben', 'Carla', 'Dante', 'Ella', 'Franco', 'Gina', 'Hector', 'Iris', 'Jose', 'Karen', 'Luis']
+LAST_NAMES = ['Santos', 'Reyes', 'Cruz', 'Bautista', 'Ocampo', 'Garcia', 'Mendoza', 'Torres', 'Flores', 'Ramos']
+PRODUCTS = [('5 Gallon Round', '35.00', '18.90'), ('5 Gallon Slim', '35.00', '18.90'),
+            ('1 Gallon', '15.00', '3.78'), ('500ml Bottle', '10.00', '0.50')]
+
+
+class Counts:
+    def __init__(self, customers=1000, orders=10000, municipalities=10, barangays_per_municipality=20,
+                 drivers=20, staff=5, days=365, walk_ins=0, deployments_per_driver=0):
+        self.customers = customers
+        self.orders = orders
+        self.walk_ins = walk_ins
+        self.deployments_per_driver = deployments_per_driver
+        self.municipalities = municipalities
+        self.barangays_per_municipality = barangays_per_municipality
+        self.drivers = drivers
+        self.staff = staff
+        self.days = days
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk_create keep the given auto_now/auto_now_add values instead of overwriting them"""
+    saved = [(f, f.auto_now, f.auto_now_add) for f in fields]
+    for f in fields:
+        f.auto_now = f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, auto_now, auto_now_add in saved:
+            f.auto_now, f.auto_now_add = auto_now, auto_now_add
+
+
+def _field(model, name):
+    return model._meta.get_field(name)
+
+
+class Generator:
+    def __init__(self, counts, seed=42, batch_size=2000, prefix='synth', log=None, signals=False):
+        self.counts = counts
+        self.signals = signals
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.prefix = prefix
+        self.log = log or (lambda message: None)
+        today = timezone.localdate()
+        self.end = timezone.make_aware(datetime.combine(today, time()))
+        self.password = make_password(PASSWORD, salt=f'{prefix}{seed}')
+
+    def moment(self, days_ago_max=None):
+        """A random time within the last `days`, older times less likely than recent ones"""
+        days = days_ago_max or self.counts.days
+        return self.end - timedelta(seconds=int(self.rng.triangular(0, days * 86400, 0)))
+
+    def bulk(self, model, objects):
+        return model.objects.bulk_create(objects, batch_size=self.batch_size)
+
+    # Reference data
+
+    def geography(self):
+        municipalities = self.bulk(Municipality, [
+            Municipality(name=f'{self.prefix} Municipality {m + 1}') for m in range(self.counts.municipalities)
+        ])
+        barangays = self.bulk(Barangay, [
+            Barangay(municipality=m, name=f'Barangay {b + 1}',
+                     latitude=Decimal('14.5') + Decimal(self.rng.randint(-3000, 3000)) / 10000,
+                     longitude=Decimal('121.0') + Decimal(self.rng.randint(-3000, 3000)) / 10000)
+            for m in municipalities for b in range(self.counts.barangays_per_municipality)
+        ])
+        routes = self.bulk(Route, [Route(route_number=f'R{m.id}') for m in municipalities])
+        Route.municipalities.through.objects.bulk_create([
+            Route.municipalities.through(route_id=r.id, municipality_id=m.id) for r, m in zip(routes, municipalities)
+        ])
+        route_of_municipality = {m.id: r for r, m in zip(routes, municipalities)}
+        Route.barangays.through.objects.bulk_create([
+            Route.barangays.through(route_id=route_of_municipality[b.municipality_id].id, barangay_id=b.id)
+            for b in barangays
+        ], batch_size=self.batch_size)
+        self.log(f'{len(municipalities)} municipalities, {len(barangays)} barangays, {len(routes)} routes')
+        return barangays, routes, route_of_municipality
+
+    def products(self):
+        return self.bulk(Product, [Product(name=name, price=Decimal(price), liters=Decimal(liters))
+                                   for name, price, liters in PRODUCTS])
+
+    def people(self, role, count, barangays=None):
+        """Users with their profiles (what the User post_save signal would create)"""
+        users = self.bulk(User, [
+            User(username=f'{self.prefix}_{role}_{i + 1}', password=self.password, email=f'{self.prefix}_{role}_{i + 1}@example.com')
+            for i in range(count)
+        ])
+        addresses = [None] * count
+        if barangays:
+            addresses = self.bulk(Address, [
+                Address(barangay=self.rng.choice(barangays), full_address=f'{self.rng.randint(1, 999)} Street {i + 1}')
+                for i in range(count)
+            ])
+        profiles = self.bulk(Profile, [
+            Profile(user=user, role=role, first_name=self.rng.choice(FIRST_NAMES), last_name=self.rng.choice(LAST_NAMES),
+                    phone=f'09{self.rng.randint(100000000, 999999999)}', address=address)
+            for user, address in zip(users, addresses)
+        ])
+        self.log(f'{count} {role} users')
+        return profiles
+
+    def send_created(self, model, objects):
+        for instance in objects:
+            post_save.send(sender=model, instance=instance, created=True, update_fields=None, raw=False, using='default')
+
+    # Transactions
+
+    def deployments(self, drivers, vehicle_of_driver, route_of_driver, products):
+        """
+        deployments_per_driver deployments for each driver: the newest one active, older ones
+        returned or completed, each with the 'load' entry of its stock ledger
+        """
+        per_driver = self.counts.deployments_per_driver
+        if not per_driver:
+            return []
+        deployments = []
+        for driver in drivers:
+            for n in range(per_driver):
+                active = n == per_driver - 1
+                created_at = self.end - timedelta(days=per_driver - n - 1, hours=self.rng.randint(1, 8))
+                stock = self.rng.randint(40, 200)
+                deployments.append(Deployment(
+                    deployment_id=next_id('deployment_id', Deployment, 'deployment_id'),
+                    driver=driver, vehicle_id=vehicle_of_driver[driver.id], route_id=route_of_driver[driver.id],
+                    product=self.rng.choice(products), stock=stock if active else 0, initial_stock=stock,
+                    returned_containers=None if active else self.rng.randint(0, stock),
+                    status='active' if active else self.rng.choice(('returned', 'completed')),
+                    created_at=created_at, returned_at=None if active else created_at + timedelta(hours=9),
+                ))
+        with transaction.atomic():
+            with explicit_timestamps(_field(Deployment, 'created_at'), _field(DeploymentStockMovement, 'created_at')):
+                deployments = self.bulk(Deployment, deployments)
+                self.bulk(DeploymentStockMovement, [
+                    DeploymentStockMovement(deployment=d, kind='load', quantity=d.initial_stock,
+                                            balance_after=d.initial_stock, actor=d.driver, created_at=d.created_at)
+                    for d in deployments
+                ])
+            if self.signals:
+                self.send_created(Deployment, deployments)
+        self.log(f'{len(deployments)} deployments')
+        return deployments
+
+    def orders(self, customers, products, drivers, barangay_of_customer, route_of_barangay, vehicle_of_driver):
+        """Orders with their delivery, status history and activity log, in batches"""
+        fields = (_field(Order, 'created_at'), _field(Delivery, 'created_at'), _field(Delivery, 'updated_at'),
+                  _field(OrderHistory, 'timestamp'))
+        created = 0
+        while created < self.counts.orders:
+            size = min(self.batch_size, self.counts.orders - created)
+            with transaction.atomic():
+                with explicit_timestamps(*fields):
+                    orders = []
+                    for _ in range(size):
+                        quantity = self.rng.choice((1, 1, 2, 2, 3, 4, 5, 10, 12))
+                        orders.append(Order(product=self.rng.choice(products), customer=self.rng.choice(customers),
+                                            quantity=quantity, free_items=quantity // 10, created_at=self.moment()))
+                    orders = self.bulk(Order, orders)
+                    if not self.signals:
+                        self.order_rows(orders, drivers, barangay_of_customer, route_of_barangay, vehicle_of_driver)
+                if self.signals:
+                    # The receivers create each order's delivery and activity log
+                    self.send_created(Order, orders)
+            created += size
+            self.log(f'{created} orders')
+        return created
+
+    def order_rows(self, orders, drivers, barangay_of_customer, route_of_barangay, vehicle_of_driver):
+        """Delivery, status history and activity logs of newly created orders"""
+        recent = timedelta(days=2)
+        deliveries, history, logs = [], [], []
+        for order in orders:
+            age = self.end - order.created_at
+            roll = self.rng.random()
+            if age > recent:
+                status = 'cancelled' if roll < 0.04 else 'delivered'
+            else:
+                status = 'pending' if roll < 0.4 else 'assigned' if roll < 0.7 else 'in_route'
+            driver = None if status == 'pending' else self.rng.choice(drivers)
+            updated = order.created_at + timedelta(minutes=self.rng.randint(5, 600))
+            barangay_id = barangay_of_customer[order.customer_id]
+            deliveries.append(Delivery(
+                order=order, status=status, driver=driver,
+                vehicle_id=vehicle_of_driver.get(driver.id) if driver else None,
+                route_id=route_of_barangay.get(barangay_id),
+                delivered_quantity=order.quantity + order.free_items if status == 'delivered' else None,
+                returned_containers=self.rng.randint(0, order.quantity) if status == 'delivered' else None,
+                delivered_at=updated if status == 'delivered' else None,
+                created_at=order.created_at, updated_at=updated,
+            ))
+            history.append(OrderHistory(order=order, status=status, timestamp=updated, updated_by=driver))
+            logs.append(ActivityLog(actor_id=order.customer_id, action='create', entity='order',
+                                    meta={'order_id': order.id, 'quantity': order.quantity},
+                                    timestamp=order.created_at))
+            if driver is not None:
+                logs.append(ActivityLog(actor=driver, action=f'delivery_{status}', entity='delivery',
+                                        meta={'order_id': order.id}, timestamp=updated))
+        self.bulk(Delivery, deliveries)
+        self.bulk(OrderHistory, history)
+        self.bulk(ActivityLog, logs)
+
+    def walk_ins(self, products):
+        created = 0
+        while created < self.counts.walk_ins:
+            size = min(self.batch_size, self.counts.walk_ins - created)
+            walk_ins = []
+            for _ in range(size):
+                quantity = self.rng.choice((1, 1, 1, 2, 3, 5, 10))
+                walk_ins.append(WalkInOrder(product=self.rng.choice(products), quantity=quantity,
+                                            free_items=quantity // 10, returned_containers=self.rng.randint(0, quantity),
+                                            created_at=self.moment()))
+            with explicit_timestamps(_field(WalkInOrder, 'created_at')), transaction.atomic():
+                self.bulk(WalkInOrder, walk_ins)
+            created += size
+            self.log(f'{created} walk-in orders')
+        return created
+
+    def run(self):
+        counts = self.counts
+        with transaction.atomic():
+            barangays, routes, route_of_municipality = self.geography()
+            route_of_barangay = {b.id: route_of_municipality[b.municipality_id].id for b in barangays}
+            products = self.products()
+            self.people('admin', 1)
+            self.people('staff', counts.staff)
+            drivers = self.people('driver', counts.drivers)
+            vehicles = self.bulk(Vehicle, [
+                Vehicle(name=f'{self.prefix} Truck {i + 1}', plate_number=f'SYN {i + 1:04d}', stock_limit=200)
+                for i in range(counts.drivers)
+            ])
+            vehicle_of_driver = {d.id: v.id for d, v in zip(drivers, vehicles)}
+            customers = self.people('customer', counts.customers, barangays)
+            barangay_of_customer = dict(
+                Profile.objects.filter(id__in=[c.id for c in customers]).values_list('id', 'address__barangay_id')
+            )
+        route_of_driver = {d.id: routes[i % len(routes)].id for i, d in enumerate(drivers)}
+        self.deployments(drivers, vehicle_of_driver, route_of_driver, products)
+        self.orders(customers, products, drivers, barangay_of_customer, route_of_barangay, vehicle_of_driver)
+        self.walk_ins(products)
+        if self.signals:
+            activity.writer.flush()
+        sales.rebuild()
+        self.log('Sales rollups rebuilt')
+
+
+def generate(counts=None, seed=42, batch_size=2000, prefix='synth', log=None, signals=False):
+    Generator(counts or Counts(), seed=seed, batch_size=batch_size, prefix=prefix, log=log, signals=signals).run()
@@ -0,0 +1,85 @@
+import contextlib
+import io
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from core import query_catalog, synthetic
+from core.api.fastlist import mapper_for
+from core.api.prefetch import PrefetchPlanMixin
+from core.api.query_budget import QueryBudgetExceeded, QueryRecorder, query_budget
+
+
+@override_settings(QUERY_BUDGET={'MODE': 'off'}, FAST_LISTS=False, ACTIVITY_LOG_SYNC=True)
+class QueryBudgetTests(TestCase):
+    """core.api.query_budget on the delivery list, whose N+1s the serializer's query plan removes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.generate(synthetic.Counts(
+            customers=10, orders=40, municipalities=2, barangays_per_municipality=3, drivers=3, staff=1, days=30,
+        ))
+
+    def setUp(self):
+        self.client = query_catalog.api_client('admin')
+
+    def get(self, path):
+        with contextlib.redirect_stdout(io.StringIO()):  # views print debug output
+            return self.client.get(path)
+
+    def test_delivery_list_without_query_plan_is_an_n_plus_one(self):
+        # Without PrefetchPlanMixin's joins every delivery loads its order, customer, driver... one by one
+        with mock.patch.object(PrefetchPlanMixin, 'plan_queryset', lambda self, queryset, **kwargs: queryset):
+            with self.assertRaises(QueryBudgetExceeded) as raised:
+                with query_budget(10, label='GET /api/deliveries/'):
+                    self.assertEqual(self.get('/api/deliveries/').status_code, 200)
+        self.assertIn('N+1', str(raised.exception))
+        self.assertIn('DeliverySerializer.', str(raised.exception))
+
+    def test_delivery_list_stays_within_budget(self):
+        with query_budget(10, label='GET /api/deliveries/') as recorder:
+            self.assertEqual(self.get('/api/deliveries/').status_code, 200)
+        self.assertEqual(recorder.n_plus_one(), [])
+
+    def test_stacks_are_only_walked_for_repeated_statements(self):
+        with mock.patch.object(PrefetchPlanMixin, 'plan_queryset', lambda self, queryset, **kwargs: queryset):
+            with QueryRecorder(capture_stacks=False, threshold=5) as recorder:
+                self.get('/api/deliveries/')
+        self.assertLess(recorder.stack_walks, recorder.count)
+        self.assertTrue(recorder.n_plus_one(5)[0]['fields'])
+        with QueryRecorder(capture_stacks=False, threshold=5) as recorder:
+            self.get('/api/products/')
+        self.assertEqual(recorder.stack_walks, 0)
+
+
+@override_settings(QUERY_BUDGET={'MODE': 'off'}, ACTIVITY_LOG_SYNC=True)
+class FastListParityTests(TestCase):
+    """Every fast_list endpoint answers the same with FAST_LISTS on and off (core.api.fastlist)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.generate(synthetic.Counts(
+            customers=10, orders=40, municipalities=2, barangays_per_municipality=3, drivers=3, staff=1, days=30,
+        ))
+
+    def get(self, client, url, fast):
+        with override_settings(FAST_LISTS=fast), contextlib.redirect_stdout(io.StringIO()):
+            return client.get(url)
+
+    def test_fast_lists_match_the_serializer_path(self):
+        from core.urls import router
+        endpoints = [(prefix, viewset) for prefix, viewset, basename in router.registry
+                     if getattr(viewset, 'fast_list', False)]
+        self.assertTrue(endpoints)
+        for role in ('admin', 'staff', 'driver', 'customer'):
+            client = query_catalog.api_client(role)
+            for prefix, viewset in endpoints:
+                self.assertIsNotNone(mapper_for(viewset.serializer_class), prefix)
+                fields = list(viewset.serializer_class().fields)
+                urls = [f'/api/{prefix}/', f'/api/{prefix}/?page=2', f"/api/{prefix}/?fields={','.join(fields[::3])}"]
+                if getattr(viewset, 'keyset_fields', None):
+                    urls.append(f'/api/{prefix}/?cursor=&page_size=5')
+                for url in urls:
+                    with self.subTest(role=role, url=url):
+                        slow, fast = self.get(client, url, False), self.get(client, url, True)
+                        self.assertEqual(slow.status_code, fast.status_code)
+                        self.assertEqual(slow.content, fast.content)
@@ -7,8 +7,12 @@ from core.api.views import (
     NotificationViewSet, MeView, DriverViewSet, ActivityLogViewSet, OrderHistoryViewSet, CancelledOrderViewSet, ProfileViewSet, UsersViewSet,
     MunicipalityViewSet, BarangayViewSet, AddressViewSet, WalkInOrderViewSet, RouteViewSet, VehicleViewSet, DeploymentViewSet
 )
-from core.api.export import export_customers, export_staff, export_products
+from core.api.export import export_customers, export_staff, export_products, export_delivered_orders
 from core.api.account import ChangePasswordView, RegisterView
+from core.api.events import event_stream
+from core.api.prefetch import PrefetchPlanView
+from core.api.dashboard import DashboardView
+from core.api.batch import BatchView
 
 router = DefaultRouter()
 router.register(r'products', ProductViewSet, basename='products')
@@ -35,10 +39,15 @@ router.register(r'users', UsersViewSet, basename='users')
 urlpatterns = [
     path('api/', include(router.urls)),
     path('api/reports/', ReportViewSet.as_view()),
+    path('api/events/', event_stream),
     path('api/account/register/', RegisterView.as_view()),
     path('api/account/change-password/', ChangePasswordView.as_view()),
     path('api/me/', MeView.as_view()),
+    path('api/dashboard/', DashboardView.as_view()),
+    path('api/batch/', BatchView.as_view()),
+    path('api/debug/prefetch-plans/', PrefetchPlanView.as_view()),
     path('api/export/customers.csv', export_customers),
     path('api/export/staff.csv', export_staff),
     path('api/export/products.csv', export_products),
+    path('api/export/delivered-orders.csv', export_delivered_orders),
 ]
\ No newline at end of file
@@ -2,6 +2,8 @@
 ASGI config for waterstation project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve through this (e.g. ``uvicorn waterstation.asgi:application``) for the
+long-lived Server-Sent Events stream at /api/events/ (core.api.events).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -49,6 +49,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.api.query_budget.QueryBudgetMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -107,10 +108,10 @@ TEMPLATES = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.api.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'core.api.pagination.HybridPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -195,3 +196,28 @@ SIMPLE_JWT = {
 
 
 
+
+# Per-request query counting / N+1 detection (core.api.query_budget)
+QUERY_BUDGET = {
+    'MODE': 'log',
+    'MAX_QUERIES': 50,
+    'N_PLUS_ONE_THRESHOLD': 5,
+    'HEADER': DEBUG,
+}
+
+# Reference data cache (core.services.refdata): municipalities, barangays, products, routes, vehicles.
+# Browsers revalidate with If-None-Match on every request unless REFDATA_MAX_AGE is set.
+# Versions live in the database, so any CACHES backend works (entries are keyed by ETag).
+REFDATA_MAX_AGE = 0
+REFDATA_CACHE_TIMEOUT = 24 * 3600
+
+# GET /api/dashboard/ (core.api.dashboard): threads for uncached sections, and per-section cache
+# TTLs in seconds, e.g. {'reports': 120}, merged over the defaults in that module
+DASHBOARD_WORKERS = 4
+DASHBOARD_TTLS = {}
+
+# Most sub-requests in one POST /api/batch/ (core.api.batch)
+BATCH_MAX_REQUESTS = 20
+
+# List views with fast_list = True serialize from .values() rows (core.api.fastlist)
+FAST_LISTS = True
@@ -109,23 +109,14 @@ export default function AdminDashboard() {
     return `₱${Number(parseFloat(amount) || 0).toFixed(2)}`;
   };
 
-  // Fetch reports data
-  const { data: reports, isLoading: reportsLoading } = useQuery({
-    queryKey: ['reports'],
-    queryFn: async () => (await api.get('/reports/')).data,
-  })
-
-  // Fetch products for walk-in order
-  const { data: products } = useQuery({
-    queryKey: ['products'],
-    queryFn: async () => (await api.get('/products/')).data.results || (await api.get('/products/')).data || [],
-  })
-
-  // Fetch deliveries for recent delivery display
-  const { data: deliveries } = useQuery({
-    queryKey: ['deliveries'],
-    queryFn: async () => (await api.get('/deliveries/')).data.results || (await api.get('/deliveries/')).data || [],
+  // Reports, products (for walk-in orders) and recent deliveries in one request
+  const { data: dashboard, isLoading: reportsLoading } = useQuery({
+    queryKey: ['dashboard'],
+    queryFn: async () => (await api.get('/dashboard/')).data.sections,
   })
+  const reports = dashboard?.reports
+  const products = dashboard?.products?.results || dashboard?.products
+  const deliveries = dashboard?.deliveries?.results || dashboard?.deliveries
 
   // Helper function to format currency
   const formatCurrency = (amount) => {
@@ -34,6 +34,7 @@ export default function AdminInventory() {
     },
     onSuccess: () => {
       queryClient.invalidateQueries(['products'])
+      queryClient.invalidateQueries(['dashboard'])
       setEditing(null)
     },
     onError: (error) => {
@@ -46,6 +47,7 @@ export default function AdminInventory() {
     mutationFn: (data) => api.post('/products/', data),
     onSuccess: () => {
       queryClient.invalidateQueries(['products'])
+      queryClient.invalidateQueries(['dashboard'])
       setEditing(null)
     },
     onError: (error) => {
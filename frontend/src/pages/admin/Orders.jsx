@@ -152,6 +152,7 @@ export default function AdminOrders() {
     onSuccess: () => {
       queryClient.invalidateQueries(['orders'])
       queryClient.invalidateQueries(['deliveries'])  // Also invalidate deliveries for driver pages
+      queryClient.invalidateQueries(['dashboard'])  // Dashboard totals and recent orders
     },
     onError: (error) => {
       console.error('Failed to update order:', error.response?.data || error.message)
@@ -384,6 +385,7 @@ export default function AdminOrders() {
     onSuccess: () => {
       queryClient.invalidateQueries(['orders']);
       queryClient.invalidateQueries(['deliveries']);  // Also invalidate deliveries for driver pages
+      queryClient.invalidateQueries(['dashboard']);  // Dashboard totals and recent orders
       setShowWalkInReturnModal(false);
       setWalkInOrderData(null);
       // Replace alert with state-based popup
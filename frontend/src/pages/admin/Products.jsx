@@ -51,6 +51,7 @@ export default function AdminProducts() {
     mutationFn: (newProduct) => api.post('/products/', newProduct),
     onSuccess: () => {
       queryClient.invalidateQueries(['products']);
+      queryClient.invalidateQueries(['dashboard']);
       setShowAddForm(false);
       setFormData({ name: '', price: '', liters: '' });
       
@@ -66,6 +67,7 @@ export default function AdminProducts() {
     mutationFn: (updatedProduct) => api.patch(`/products/${updatedProduct.id}/`, updatedProduct),
     onSuccess: () => {
       queryClient.invalidateQueries(['products']);
+      queryClient.invalidateQueries(['dashboard']);
       setEditingProduct(null);
       setFormData({ name: '', price: '', liters: '' });
       
@@ -81,6 +83,7 @@ export default function AdminProducts() {
     mutationFn: (productId) => api.delete(`/products/${productId}/`),
     onSuccess: () => {
       queryClient.invalidateQueries(['products']);
+      queryClient.invalidateQueries(['dashboard']);
       
       createStyledAlert('success', 'Success!', 'Product deleted successfully!');
     },